@@ -0,0 +1,1033 @@
+# AGREGADOS
+
+# Técnicas de agregación para cuando el groupby() "de toda la vida" se queda corto, bien porque el dataset no cabe en memoria o porque hay que repetirlo muchas veces.
+
+# AGREGACIÓN POR BLOQUES (STREAMING)
+
+# Un df.groupby(...).agg(...) necesita tener todo el CSV cargado en memoria.
+# Si el archivo es más grande que la RAM podemos leerlo por bloques (parámetro chunksize de read_csv) e ir acumulando por cada grupo un estado parcial que se pueda combinar:
+
+# - conteo, suma, mínimo y máximo: se combinan directamente
+# - media y dispersión: guardamos la media y la suma de cuadrados de las desviaciones (M2), que se combinan con la fórmula de Chan
+# - cuartiles (solo para describe): guardamos cuántas veces aparece cada valor en cada grupo, que es exacto y ocupa poco si los importes se repiten.
+#   Con variables continuas (casi todos los valores distintos) eso crecería tanto como el archivo, así que pasado un límite se deja de guardar
+
+# Al final convertimos el estado en la misma tabla que devolvería el cálculo en memoria, con una sola pasada secuencial por el archivo.
+
+import itertools
+import warnings
+
+import numpy as np
+import pandas as pd
+
+ESTADISTICOS_BLOQUES = ['count','sum','mean','std','var','min','max']
+
+# Parejas (grupo, valor) distintas que guarda describe_por_bloques para los cuartiles; por encima no se calculan
+FRECUENCIAS_BLOQUES = 1_000_000
+
+
+def _como_lista(x):
+    return [x] if isinstance(x, str) else list(x)
+
+
+def _estado_bloque(bloque, by, columnas):
+    grupos = bloque.groupby(by, sort = False)[columnas]
+    conteo = grupos.count()
+    return {'count': conteo,
+            'sum': grupos.sum(),
+            'mean': grupos.mean(),
+            'm2': grupos.var(ddof = 0) * conteo,
+            'min': grupos.min(),
+            'max': grupos.max()}
+
+
+def _combinar_estados(a, b):
+    niveles = list(range(a['count'].index.nlevels))
+    juntar = lambda clave: pd.concat([a[clave], b[clave]])
+
+    conteo = juntar('count').groupby(level = niveles).sum()
+    suma = juntar('sum').groupby(level = niveles).sum()
+    media = suma / conteo.where(conteo > 0)
+
+    # M2 total = suma de M2 parciales + n_i * (media_i - media_total)^2
+    conteos, medias = juntar('count'), juntar('mean')
+    desvio = (medias - media.reindex(medias.index)) ** 2 * conteos
+    m2 = juntar('m2').groupby(level = niveles).sum() + desvio.groupby(level = niveles).sum()
+
+    return {'count': conteo,
+            'sum': suma,
+            'mean': media,
+            'm2': m2,
+            'min': juntar('min').groupby(level = niveles).min(),
+            'max': juntar('max').groupby(level = niveles).max()}
+
+
+def _frecuencias_bloque(bloque, by, columna):
+    return bloque.groupby(_como_lista(by) + [columna]).size()
+
+
+def _cuartiles(frecuencias, cuantiles):
+    # frecuencias: conteos indexados por (grupo..., valor), ordenados por grupo y valor.
+    # Interpolación lineal igual que Series.quantile(): posición q * (n - 1) dentro de cada grupo
+    niveles_grupo = list(range(frecuencias.index.nlevels - 1))
+    valores = frecuencias.index.get_level_values(-1).to_numpy(dtype = 'float64')
+    acumulado = frecuencias.to_numpy().cumsum()
+
+    por_grupo = frecuencias.groupby(level = niveles_grupo, sort = False).sum()
+    n = por_grupo.to_numpy()
+    inicio = np.concatenate([[0], n.cumsum()[:-1]])
+
+    def valor_en(rango):
+        return valores[np.searchsorted(acumulado, inicio + rango, side = 'right')]
+
+    salida = {}
+    for q in cuantiles:
+        posicion = q * (n - 1)
+        abajo = np.floor(posicion).astype('int64')
+        arriba = np.ceil(posicion).astype('int64')
+        v_abajo, v_arriba = valor_en(abajo), valor_en(arriba)
+        salida[f'{q * 100:g}%'] = v_abajo + (v_arriba - v_abajo) * (posicion - abajo)
+    return pd.DataFrame(salida, index = por_grupo.index)
+
+
+def _leer_bloques(ruta, columnas, chunksize, sep, **kwargs):
+    return pd.read_csv(ruta, sep = sep, usecols = columnas, chunksize = chunksize, **kwargs)
+
+
+def agg_por_bloques(ruta, by, columnas, estadisticos = ('count','mean'), chunksize = 100_000, sep = ';', **kwargs):
+    """Equivalente por bloques de df.groupby(by)[columnas].agg(estadisticos).
+
+    Parámetros más importantes:
+
+    - by: variable o lista de variables de agrupación
+    - columnas: variable o lista de variables de análisis (con una sola variable en texto devuelve el formato de Series.agg)
+    - estadisticos: cualquier combinación de ESTADISTICOS_BLOQUES
+    - chunksize: registros por bloque, es lo que acota la memoria usada
+    - el resto de parámetros se pasan a read_csv
+    """
+    by_lista, columnas_lista = _como_lista(by), _como_lista(columnas)
+    estadisticos = _como_lista(estadisticos)
+    desconocidos = set(estadisticos) - set(ESTADISTICOS_BLOQUES)
+    if desconocidos:
+        raise ValueError(f'Estadísticos no soportados por bloques: {sorted(desconocidos)}')
+
+    estado, tipos = None, None
+    for bloque in _leer_bloques(ruta, by_lista + columnas_lista, chunksize, sep, **kwargs):
+        tipos = bloque[columnas_lista].dtypes
+        parcial = _estado_bloque(bloque, by, columnas_lista)
+        estado = parcial if estado is None else _combinar_estados(estado, parcial)
+    if estado is None:
+        raise ValueError(f'{ruta} no tiene registros')
+
+    conteo = estado['count']
+    con_datos = conteo.where(conteo > 0)
+    calculos = {'count': lambda: conteo.astype('int64'),
+                'sum': lambda: estado['sum'],
+                'mean': lambda: estado['mean'],
+                'var': lambda: estado['m2'] / (con_datos - 1),
+                'std': lambda: np.sqrt(estado['m2'] / (con_datos - 1)),
+                'min': lambda: estado['min'],
+                'max': lambda: estado['max']}
+
+    partes = {}
+    for estadistico in estadisticos:
+        tabla = calculos[estadistico]()
+        if estadistico in ('sum','min','max'):
+            # Recuperamos el tipo original (p.e. enteros) cuando no hay grupos vacíos
+            tabla = tabla.apply(lambda c: c.astype(tipos[c.name]) if c.notna().all() else c)
+        partes[estadistico] = tabla.sort_index()
+
+    resultado = pd.concat(partes, axis = 1).swaplevel(axis = 1)
+    resultado = resultado.reindex(columns = pd.MultiIndex.from_product([columnas_lista, estadisticos]))
+    if isinstance(columnas, str):
+        resultado = resultado[columnas]
+    return resultado
+
+
+def describe_por_bloques(ruta, by, columna, chunksize = 100_000, sep = ';', percentiles = (0.25, 0.5, 0.75),
+                         max_frecuencias = FRECUENCIAS_BLOQUES, **kwargs):
+    """Equivalente por bloques de df.groupby(by)[columna].describe().
+
+    Los cuartiles son exactos: se calculan a partir de la frecuencia de cada valor por grupo.
+    Para que la memoria no crezca con el archivo solo se guardan hasta max_frecuencias parejas (grupo, valor) distintas:
+    en variables continuas con muchos valores distintos los cuartiles salen nulos (con un aviso) y el resto de columnas sí se calcula.
+    """
+    by_lista = _como_lista(by)
+    estado, frecuencias, con_cuartiles = None, None, True
+    for bloque in _leer_bloques(ruta, by_lista + [columna], chunksize, sep, **kwargs):
+        parcial = _estado_bloque(bloque, by, [columna])
+        estado = parcial if estado is None else _combinar_estados(estado, parcial)
+        if con_cuartiles:
+            nuevas = _frecuencias_bloque(bloque, by, columna)
+            frecuencias = nuevas if frecuencias is None else frecuencias.add(nuevas, fill_value = 0)
+            if len(frecuencias) > max_frecuencias:
+                frecuencias, con_cuartiles = None, False
+    if estado is None:
+        raise ValueError(f'{ruta} no tiene registros')
+
+    conteo = estado['count'][columna]
+    resultado = pd.DataFrame({'count': conteo.astype('float64'),
+                              'mean': estado['mean'][columna],
+                              'std': np.sqrt(estado['m2'][columna] / (conteo.where(conteo > 0) - 1)),
+                              'min': estado['min'][columna].astype('float64')}).sort_index()
+    if con_cuartiles:
+        resultado = resultado.join(_cuartiles(frecuencias.sort_index(), percentiles))
+    else:
+        warnings.warn(f'{columna} tiene más de {max_frecuencias} parejas (grupo, valor) distintas: los cuartiles no se calculan por bloques')
+        for q in percentiles:
+            resultado[f'{q * 100:g}%'] = np.nan
+    resultado['max'] = estado['max'][columna].astype('float64')
+    return resultado
+
+
+# TOP N POR GRUPO
+
+# df.groupby('Country')['Funded Amount'].nlargest() o un apply con una función que hace grupo['Funded Date'].nsmallest(2)
+# recorren los grupos uno a uno en Python. Con muchos grupos (p.e. miles de socios locales) eso es lo más lento de todo el análisis.
+
+# Se puede hacer de una vez para todos los grupos:
+
+# - numeramos los grupos (ngroup, que factoriza las variables de agrupación)
+# - ordenamos todos los registros a la vez por grupo, valor y posición (np.lexsort)
+# - nos quedamos con los n primeros de cada grupo, calculando la posición de cada registro dentro de su grupo
+
+
+def _top_n_por_grupo(df, by, columna, n, mayores, keep):
+    if keep not in ('first','last'):
+        raise ValueError("keep debe ser 'first' o 'last'")
+    grupos = df.groupby(by, sort = True)
+    codigos = grupos.ngroup().fillna(-1).to_numpy(dtype = 'int64') # -1: registros con nulos en la agrupación
+    serie = df[columna]
+    nulos = serie.isna().to_numpy()
+
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        valores = pd.DatetimeIndex(serie).asi8
+    elif serie.dtype.kind in 'iub':
+        valores = serie.to_numpy().astype('int64')
+    else:
+        valores = serie.to_numpy(dtype = 'float64', na_value = np.nan)
+    clave = np.where(nulos, 0, valores)
+    if mayores:
+        clave = -clave
+
+    # Como en pandas, los nulos van al final de cada grupo en su orden de aparición.
+    # Los empates se resuelven por orden de aparición, salvo con keep = 'last' en los grupos con más de n registros, que va al revés
+    posiciones = np.arange(len(df))
+    tamanos = np.bincount(codigos[codigos >= 0], minlength = grupos.ngroups)
+    al_reves = (keep == 'last') & ~nulos & (codigos >= 0) & (tamanos[codigos] > n)
+    orden = np.lexsort((np.where(al_reves, -posiciones, posiciones), clave, nulos, codigos))
+    codigos_ordenados = codigos[orden]
+    puesto = posiciones - np.searchsorted(codigos_ordenados, codigos_ordenados, side = 'left')
+    elegidos = orden[(puesto < n) & (codigos_ordenados >= 0)]
+
+    claves = grupos.size().index.take(codigos[elegidos])
+    niveles = [claves.get_level_values(k) for k in range(claves.nlevels)] + [df.index.take(elegidos)]
+    indice = pd.MultiIndex.from_arrays(niveles, names = list(claves.names) + [df.index.name])
+    return pd.Series(serie.array.take(elegidos), index = indice, name = columna)
+
+
+def nlargest_por_grupo(df, by, columna, n = 5, keep = 'first'):
+    """Equivalente vectorizado de df.groupby(by)[columna].nlargest(n): mismo resultado y mismo multiíndice."""
+    return _top_n_por_grupo(df, by, columna, n, True, keep)
+
+
+def nsmallest_por_grupo(df, by, columna, n = 5, keep = 'first'):
+    """Equivalente vectorizado de df.groupby(by)[columna].nsmallest(n).
+
+    También sustituye a df.groupby(by).apply(lambda grupo: grupo[columna].nsmallest(n)).
+    """
+    return _top_n_por_grupo(df, by, columna, n, False, keep)
+
+
+
+# TABLAS CRUZADAS Y DINÁMICAS
+
+# pd.crosstab() y df.pivot_table() pasan por la maquinaria genérica de groupby + unstack, que es lenta si hay que sacar cientos de tablas.
+# Pero una tabla de contingencia es solo un conteo (o una suma) por celda:
+
+# - factorizamos las variables de filas y de columnas a códigos enteros (pd.factorize)
+# - combinamos los dos códigos en el número de celda: fila * número de columnas + columna
+# - contamos y sumamos por celda con np.bincount, que es una sola pasada por los datos
+
+# La media es la suma entre el conteo, y los totales (margins) y los porcentajes (normalize) salen de la propia tabla sin volver a los datos.
+# Como en pandas, los registros con nulos en las variables de filas o columnas no cuentan, y los totales solo cuentan los registros sin nulos en las variables de análisis.
+
+ESTADISTICOS_TABLAS = ['count','sum','mean']
+
+# Hasta cuántas combinaciones posibles de varias variables se numeran con una tabla densa en lugar de con pd.factorize
+COMBINACIONES_DENSAS = 1_000_000
+
+
+def _como_lista_series(x):
+    return [x] if isinstance(x, pd.Series) else list(x)
+
+
+def _factorizar(clave):
+    # Códigos de una variable (-1 para los nulos), sus valores distintos ordenados y su nombre
+    codigos, unicos = pd.factorize(clave, sort = True)
+    return codigos.astype('int64', copy = False), pd.Index(unicos), clave.name
+
+
+def _codificar(claves):
+    # Las claves son series o variables ya factorizadas con _factorizar.
+    # Devuelve el código de cada registro (-1 si tiene algún nulo) y el índice con las combinaciones que aparecen, ordenadas
+    factorizadas = [clave if isinstance(clave, tuple) else _factorizar(clave) for clave in claves]
+    if len(factorizadas) == 1: # los códigos de pd.factorize ya son consecutivos y ordenados
+        codigos, unicos, nombre = factorizadas[0]
+        return codigos, unicos.rename(nombre)
+
+    n = len(factorizadas[0][0])
+    codigos, validos = np.zeros(n, dtype = 'int64'), np.ones(n, dtype = bool)
+    for codigos_clave, unicos_clave, _ in factorizadas:
+        validos &= codigos_clave >= 0
+        codigos = codigos * len(unicos_clave) + codigos_clave
+    tamanos = [len(unicos) for _, unicos, _ in factorizadas]
+    if np.prod(tamanos, dtype = 'float64') <= COMBINACIONES_DENSAS:
+        # Pocas combinaciones posibles: las que aparecen salen de un bincount, sin hashear los códigos
+        presentes = np.bincount(codigos[validos], minlength = int(np.prod(tamanos))) > 0
+        observados = np.flatnonzero(presentes)
+        combinados = (np.cumsum(presentes) - 1)[codigos[validos]]
+    else:
+        combinados, observados = pd.factorize(codigos[validos], sort = True)
+    resultado = np.full(n, -1, dtype = 'int64')
+    resultado[validos] = combinados
+
+    niveles = np.unravel_index(observados, tamanos)
+    return resultado, pd.MultiIndex(levels = [unicos for _, unicos, _ in factorizadas], codes = niveles,
+                                    names = [nombre for _, _, nombre in factorizadas], verify_integrity = False).remove_unused_levels()
+
+
+class _Contingencia:
+    # Registros, conteo de no nulos y suma de cada variable de análisis por celda, como arrays de filas x columnas.
+    # Para los totales se guarda además el conteo y la suma de los registros sin nulos en ninguna variable de análisis
+
+    def __init__(self, filas, columnas, valores):
+        codigos_filas, self.indice_filas = _codificar(filas)
+        codigos_columnas, self.indice_columnas = _codificar(columnas)
+        validos = (codigos_filas >= 0) & (codigos_columnas >= 0)
+        self.forma = (len(self.indice_filas), len(self.indice_columnas))
+        self.celda = codigos_filas[validos] * self.forma[1] + codigos_columnas[validos]
+        self.registros = self._bincount()
+
+        x = [serie.to_numpy(dtype = 'float64', na_value = np.nan)[validos] for serie in valores]
+        nulos = [np.isnan(v) for v in x]
+        self.conteos = [self._bincount(~nulo) for nulo in nulos]
+        self.sumas = [self._bincount(np.where(nulo, 0, v)) for v, nulo in zip(x, nulos)]
+        if len(x) > 1:
+            completos = ~np.logical_or.reduce(nulos)
+            self.conteo_completos = self._bincount(completos)
+            self.sumas_completos = [self._bincount(np.where(completos, v, 0)) for v in x]
+        elif x:
+            self.conteo_completos, self.sumas_completos = self.conteos[0], self.sumas
+
+    def _bincount(self, pesos = None):
+        return np.bincount(self.celda, weights = pesos, minlength = self.forma[0] * self.forma[1]).reshape(self.forma)
+
+    def tabla(self, aggfunc, k):
+        return _estadistico_tabla(aggfunc, self.registros, self.conteos[k], self.sumas[k])
+
+    def totales(self, aggfunc, k):
+        # Total de cada fila, de cada columna y general
+        conteo, suma = self.conteo_completos, self.sumas_completos[k]
+        return [_estadistico_tabla(aggfunc, conteo.sum(axis = eje), conteo.sum(axis = eje), suma.sum(axis = eje)) for eje in (1, 0, None)]
+
+
+def _estadistico_tabla(aggfunc, registros, conteo, suma):
+    # Vale para las celdas y para los totales: nulo donde no hay registros, como en pandas
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        if aggfunc == 'count':
+            return np.where(registros > 0, conteo, np.nan)
+        if aggfunc == 'sum':
+            return np.where(registros > 0, suma, np.nan)
+        if aggfunc == 'mean':
+            return np.where(conteo > 0, suma / np.where(conteo > 0, conteo, 1), np.nan)
+    raise ValueError(f'aggfunc debe ser uno de {ESTADISTICOS_TABLAS}')
+
+
+def _con_totales(tabla, total_filas, total_columnas, total):
+    # Añade la columna y la fila de totales a un array de filas x columnas
+    return np.vstack([np.column_stack([tabla, total_filas]), np.append(total_columnas, total)])
+
+
+def _indice_con_total(indice, nombres, margins_name):
+    total = (margins_name,) + ('',) * (indice.nlevels - 1) if indice.nlevels > 1 else margins_name
+    indice = indice.append(pd.Index([total]))
+    indice.names = nombres
+    return indice
+
+
+def _tipo_agregado(funcion, tipo, valores):
+    # dtype que da groupby().agg(funcion) en una variable de ese tipo cuando los resultados son valores
+    if not isinstance(tipo, np.dtype): # nullable y demás tipos de extensión: como int64 o float64
+        tipo = np.dtype('int64' if tipo.kind in 'iub' else 'float64')
+    if funcion == 'count':
+        return np.dtype('int64')
+    if funcion == 'mean':
+        return tipo if tipo.kind == 'f' else np.dtype('float64')
+    if tipo.kind == 'b':
+        return np.dtype('int64')
+    if tipo.kind in 'iu':
+        # pandas suma en 64 bits y vuelve al tipo de la variable si todos los resultados caben en él
+        finitos = valores[np.isfinite(valores)]
+        limites = np.iinfo(tipo)
+        if finitos.size and (finitos.min() < limites.min or finitos.max() > limites.max):
+            return np.dtype('int64' if tipo.kind == 'i' else 'uint64')
+    return tipo
+
+
+def _tipos_agregados(bloques, tipos, tablas):
+    # _tipo_agregado de cada bloque (funcion, variable). groupby agrega juntas las variables con el mismo dtype,
+    # así que si la suma de una no cabe en su tipo pasan todas a 64 bits
+    propios = [_tipo_agregado(funcion, tipos[k], tabla) for (funcion, k), tabla in zip(bloques, tablas)]
+    return [np.result_type(*[propios[c] for c, (f, j) in enumerate(bloques) if f == funcion and tipos[j] == tipos[k]])
+            for funcion, k in bloques]
+
+
+def _con_nulos(tipo, valores = None):
+    # Los enteros con nulos pasan a float64, los decimales se quedan como están
+    if tipo.kind in 'iub' and (valores is None or np.isnan(valores).any()):
+        return np.dtype('float64')
+    return tipo
+
+
+def _con_fila_de_totales(tipo, valor, tipo_fila):
+    # pandas intenta devolver el total de la fila de totales al tipo de la columna; si no puede, la columna pasa al tipo común
+    if tipo.kind not in 'iu' or (np.isfinite(valor) and valor == np.floor(valor) and np.iinfo(tipo).min <= valor <= np.iinfo(tipo).max):
+        return tipo
+    return np.result_type(tipo, tipo_fila)
+
+
+def _marco(tabla, indice_filas, indice_columnas, tipos):
+    # tipos: el dtype de cada columna (la tabla se calcula en float64)
+    marco = pd.DataFrame(tabla, index = indice_filas, columns = indice_columnas)
+    if any(tipo != np.float64 for tipo in tipos):
+        marco = marco.astype(dict(zip(indice_columnas, tipos)))
+    return marco
+
+
+def _tabla_dinamica(contingencia, funciones, variables, tipos, fill_value, margins, margins_name):
+    bloques = [(funcion, k) for funcion in funciones for k in range(len(variables))]
+    tablas = [contingencia.tabla(funcion, k) for funcion, k in bloques]
+
+    # Como pivot_table con dropna = True: fuera las filas y columnas sin ninguna celda con valor
+    presentes = np.logical_or.reduce([~np.isnan(tabla) for tabla in tablas])
+    filas, columnas = presentes.any(axis = 1), presentes.any(axis = 0)
+    indice_filas, indice_columnas = contingencia.indice_filas[filas], contingencia.indice_columnas[columnas]
+
+    # Mismos dtypes que pandas: el del agregado (ver _tipo_agregado), float64 si es entero y quedan huecos sin rellenar
+    cuerpos = [tabla[filas][:, columnas] for tabla in tablas]
+    tipos_cuerpo = []
+    for tabla, tipo in zip(cuerpos, _tipos_agregados(bloques, tipos, cuerpos)):
+        if np.isnan(tabla).any():
+            if fill_value is None:
+                tipo = _con_nulos(tipo)
+            else:
+                tipo = np.result_type(tipo, fill_value)
+                tabla[np.isnan(tabla)] = fill_value
+        tipos_cuerpo.append(tipo)
+    if not margins:
+        return bloques, [_marco(tabla, indice_filas, indice_columnas, [tipo] * tabla.shape[1]).dropna(axis = 1, how = 'all')
+                         for tabla, tipo in zip(cuerpos, tipos_cuerpo)]
+
+    indice_filas = _indice_con_total(indice_filas, contingencia.indice_filas.names, margins_name)
+    indice_columnas = _indice_con_total(indice_columnas, contingencia.indice_columnas.names, margins_name)
+    totales = []
+    for funcion, k in bloques:
+        total_filas, total_columnas, total = contingencia.totales(funcion, k)
+        totales.append((total_filas[filas], total_columnas[columnas], total))
+
+    # pivot_table hace una tabla por aggfunc, y para añadirle los totales la traspone: el cuerpo de todas sus variables pasa a su tipo común.
+    # La fila de totales se calcula de una vez para todas las variables, con nulos en las columnas de totales hasta rellenarlas
+    tipos_totales = [_con_nulos(tipo, total_filas) for tipo, (total_filas, _, _)
+                     in zip(_tipos_agregados(bloques, tipos, [t[0] for t in totales]), totales)]
+    tipos_fila_bloque = [_con_nulos(tipo, total_columnas) for tipo, (_, total_columnas, _)
+                         in zip(_tipos_agregados(bloques, tipos, [t[1] for t in totales]), totales)]
+    comunes, tipos_fila = {}, {}
+    for funcion in funciones:
+        de_la_funcion = [b for b, (f, _) in enumerate(bloques) if f == funcion]
+        comunes[funcion] = np.result_type(*[tipos_cuerpo[b] for b in de_la_funcion])
+        tipo_fila = np.result_type(*[tipos_fila_bloque[b] for b in de_la_funcion])
+        tipos_fila[funcion] = _con_nulos(tipo_fila) if fill_value is None else np.result_type(tipo_fila, fill_value)
+
+    marcos = []
+    for (funcion, k), tabla, (total_filas, total_columnas, total), tipo_total in zip(bloques, cuerpos, totales, tipos_totales):
+        if fill_value is not None: # en pandas fill_value rellena la fila de totales pero no la columna
+            total_columnas = np.where(np.isnan(total_columnas), fill_value, total_columnas)
+        tabla = _con_totales(tabla, total_filas, total_columnas, total)
+        tipos_columnas = [_con_fila_de_totales(tipo, valor, tipos_fila[funcion])
+                          for tipo, valor in zip([comunes[funcion]] * (tabla.shape[1] - 1) + [tipo_total], tabla[-1])]
+        marcos.append(_marco(tabla, indice_filas, indice_columnas, tipos_columnas).dropna(axis = 1, how = 'all'))
+    return bloques, marcos
+
+
+def _normalizar_tabla(tabla, normalize, margins):
+    # Misma lógica que pandas: se normaliza el cuerpo y los totales se reparten sobre su propia suma
+    cuerpo = tabla[:-1, :-1] if margins else tabla
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        if normalize in (True, 'all'):
+            normalizada = cuerpo / np.nansum(cuerpo)
+        elif normalize == 'index':
+            normalizada = cuerpo / np.nansum(cuerpo, axis = 1, keepdims = True)
+        elif normalize == 'columns':
+            normalizada = cuerpo / np.nansum(cuerpo, axis = 0, keepdims = True)
+        else:
+            raise ValueError("normalize debe ser 'all', 'index' o 'columns'")
+        if margins:
+            total_filas, total_columnas = tabla[:-1, -1], tabla[-1, :-1]
+            normalizada = _con_totales(normalizada, total_filas / np.nansum(total_filas), total_columnas / np.nansum(total_columnas), 1)
+    return np.nan_to_num(normalizada, nan = 0.0)
+
+
+def _tabla_cruzada(contingencia, values, aggfunc, normalize, margins, margins_name):
+    if values is None:
+        registros = contingencia.registros
+        tabla = registros
+        indice_filas, indice_columnas = contingencia.indice_filas, contingencia.indice_columnas
+        if margins:
+            tabla = _con_totales(registros, registros.sum(axis = 1), registros.sum(axis = 0), registros.sum())
+            indice_filas = _indice_con_total(indice_filas, indice_filas.names, margins_name)
+            indice_columnas = _indice_con_total(indice_columnas, indice_columnas.names, margins_name)
+        marco = pd.DataFrame(tabla, index = indice_filas, columns = indice_columnas)
+    else:
+        _, (marco,) = _tabla_dinamica(contingencia, [aggfunc], [values.name], [values.dtype], None, margins, margins_name)
+    if not normalize:
+        return marco
+
+    tabla = _normalizar_tabla(marco.to_numpy(dtype = 'float64', na_value = np.nan), normalize, margins)
+    tipo = 'float32' if (marco.dtypes == np.float32).all() else 'float64' # como en pandas, float32 si la tabla ya lo era
+    marco = pd.DataFrame(tabla.astype(tipo), index = marco.index, columns = marco.columns)
+    if margins and normalize == 'index':
+        return marco.iloc[:, :-1]
+    if margins and normalize == 'columns':
+        return marco.iloc[:-1]
+    return marco
+
+
+def tabla_cruzada(index, columns, values = None, aggfunc = None, normalize = False, margins = False, margins_name = 'All'):
+    """Equivalente a pd.crosstab() calculado con np.bincount.
+
+    Parámetros más importantes:
+
+    - index, columns: la variable (o lista de variables) de filas y de columnas, como series
+    - values: la variable de análisis (opcional)
+    - aggfunc: 'count', 'sum' o 'mean' (obligatorio si hay values)
+    - normalize: 'all' (o True), 'index' o 'columns' para sacarlo en tanto por 1
+    - margins, margins_name: los totales y su nombre
+    """
+    if (values is None) != (aggfunc is None):
+        raise ValueError('values y aggfunc se tienen que indicar juntos')
+    contingencia = _Contingencia(_como_lista_series(index), _como_lista_series(columns), [] if values is None else [values])
+    return _tabla_cruzada(contingencia, values, aggfunc, normalize, margins, margins_name)
+
+
+def tabla_dinamica(df, index, columns, values, aggfunc = 'mean', fill_value = None, margins = False, margins_name = 'All'):
+    """Equivalente a df.pivot_table() para 'count', 'sum' y 'mean', con una sola pasada de np.bincount por variable de análisis.
+
+    Parámetros más importantes:
+
+    - index, columns: variables (una o una lista) a usar en el índice y en las columnas
+    - values: la variable de análisis (o una lista)
+    - aggfunc: 'count', 'sum' o 'mean', o una lista de ellos
+    - fill_value: valor para reemplazar las celdillas que sean nulos
+    - margins, margins_name: los totales y su nombre
+    """
+    contingencia = _Contingencia([df[c] for c in _como_lista(index)], [df[c] for c in _como_lista(columns)], [df[v] for v in _como_lista(values)])
+    return _pivotar(contingencia, df, values, aggfunc, fill_value, margins, margins_name)
+
+
+def _pivotar(contingencia, df, values, aggfunc, fill_value, margins, margins_name):
+    funciones, variables = _como_lista(aggfunc), _como_lista(values)
+    tipos = [df[v].dtype for v in variables]
+    bloques, marcos = _tabla_dinamica(contingencia, funciones, variables, tipos, fill_value, margins, margins_name)
+
+    # pivot_table ordena las variables de análisis (dentro de cada aggfunc, que mantiene su orden)
+    orden = sorted(range(len(bloques)), key = lambda b: (funciones.index(bloques[b][0]), variables[bloques[b][1]]))
+    bloques, marcos = [bloques[b] for b in orden], [marcos[b] for b in orden]
+
+    # Como en pivot_table, un nivel más en las columnas por cada lista de aggfunc o de values
+    claves = [tuple(clave for clave, lista in ((funcion, not isinstance(aggfunc, str)), (variables[k], not isinstance(values, str))) if lista)
+              for funcion, k in bloques]
+    if not claves[0]:
+        return marcos[0]
+    return pd.concat(marcos, axis = 1, keys = claves if len(claves[0]) > 1 else [clave[0] for clave in claves])
+
+
+# VARIOS ESTADÍSTICOS EN UNA PASADA
+
+# df.agg(['count','mean','max','min', nulos]) o groupby().agg(nombre = ('variable','estadistico'), ...) calculan cada estadístico por separado,
+# y las funciones definidas por nosotros (como nulos) se ejecutan en Python grupo a grupo.
+# Pero todos salen del mismo estado por variable: conteo, nulos, suma, mínimo y máximo (y con la media, la suma de cuadrados para la varianza).
+
+# - ordenamos una sola vez los registros por grupo (los códigos de _codificar), así cada grupo queda en un trozo contiguo
+# - recorremos cada variable una vez, reduciendo todos sus trozos a la vez con np.add.reduceat, np.minimum.reduceat...
+# - la máscara de nulos, la suma y el conteo se comparten entre estadísticos
+
+# Las funciones conocidas (la nulos de este módulo, np.sum, np.mean...) se tratan como el estadístico equivalente, y el resto se calcula con pandas.
+
+ESTADISTICOS_UNA_PASADA = ['count','nulos','sum','min','max','mean','var','std']
+
+# Otros nombres (en texto) del estadístico nulos
+ALIAS_ESTADISTICOS = {'nulos': 'nulos', 'n_nulos': 'nulos', 'contar_nulos': 'nulos'}
+
+
+def nulos(x):
+    """Número de nulos, como la función nulos del curso. Con agg_una_pasada se calcula en la misma pasada que el resto."""
+    return x.isna().sum()
+
+
+# Funciones que se tratan como el estadístico equivalente. Se reconocen por identidad y no por nombre:
+# una función nuestra que se llame nulos puede calcular otra cosa, así que esas se calculan con pandas
+_FUNCIONES_CONOCIDAS = {nulos: 'nulos',
+                        np.sum: 'sum', np.nansum: 'sum', np.mean: 'mean', np.nanmean: 'mean',
+                        np.min: 'min', np.nanmin: 'min', np.max: 'max', np.nanmax: 'max'}
+
+
+def _estadistico_conocido(funcion):
+    if isinstance(funcion, str):
+        return ALIAS_ESTADISTICOS.get(funcion, funcion if funcion in ESTADISTICOS_UNA_PASADA else None)
+    try:
+        return _FUNCIONES_CONOCIDAS.get(funcion)
+    except TypeError: # objetos llamables que no se pueden usar de clave
+        return None
+
+
+def _es_lista_funciones(funciones):
+    return not isinstance(funciones, str) and not callable(funciones)
+
+
+def _como_lista_funciones(funciones):
+    return list(funciones) if _es_lista_funciones(funciones) else [funciones]
+
+
+def _nombre_funcion(funcion):
+    return funcion if isinstance(funcion, str) else funcion.__name__
+
+
+class _Trozos:
+    # Los registros ordenados por grupo: orden (posiciones de los registros válidos) e inicio y tamaño de cada grupo
+
+    def __init__(self, n, claves = None):
+        # claves: series o variables factorizadas; sin claves todos los registros son un único grupo
+        if not claves:
+            self.indice, self.orden, self.codigos = None, None, np.zeros(n, dtype = 'int64')
+            self.inicios, self.tamanos = np.array([0]), np.array([n])
+            return
+        self.codigos, self.indice = _codificar(claves)
+        codigos = self.codigos
+        validos = np.flatnonzero(codigos >= 0)
+        # Con los códigos en el entero más pequeño posible, el orden estable de numpy es un radix sort (lineal)
+        self.orden = validos[np.argsort(codigos[validos].astype(np.min_scalar_type(len(self.indice))), kind = 'stable')]
+        self.tamanos = np.bincount(codigos[validos], minlength = len(self.indice))
+        self.inicios = np.concatenate([[0], np.cumsum(self.tamanos)[:-1]])
+
+    def ordenar(self, array):
+        return array if self.orden is None else array[self.orden]
+
+    def reducir(self, ufunc, array):
+        return ufunc.reduceat(array, self.inicios)
+
+    def expandir(self, por_grupo):
+        # Un valor por grupo a un valor por registro (ordenado)
+        return por_grupo[0] if self.orden is None else np.repeat(por_grupo, self.tamanos)
+
+
+def _estadisticos_variable(serie, trozos, pedidos, por_grupos):
+    # Diccionario estadístico -> array por grupo con el tipo que daría pandas (vacío si la variable no es numérica ni fecha)
+    tipo = serie.dtype
+    fecha = pd.api.types.is_datetime64_any_dtype(tipo)
+    if fecha:
+        valores, nulos = pd.DatetimeIndex(serie).asi8, serie.isna().to_numpy()
+        pedidos = [p for p in pedidos if p in ('count','nulos','min','max')]
+    elif isinstance(tipo, np.dtype) and tipo.kind in 'iu':
+        valores, nulos = serie.to_numpy(), None
+    elif isinstance(tipo, np.dtype) and tipo.kind == 'f':
+        valores = serie.to_numpy()
+        nulos = np.isnan(valores)
+    else:
+        return {}
+
+    x = trozos.ordenar(valores)
+    if len(x) == 0: # sin registros (o sin grupos) que lo calcule pandas
+        return {}
+    m = None if nulos is None else trozos.ordenar(nulos)
+    conteo = trozos.tamanos if m is None else trozos.tamanos - np.add.reduceat(m, trozos.inicios, dtype = 'int64')
+    vacios = conteo == 0
+    resultado = {}
+    if 'count' in pedidos:
+        resultado['count'] = conteo.astype('int64')
+    if 'nulos' in pedidos:
+        resultado['nulos'] = (trozos.tamanos - conteo).astype('int64')
+    if fecha:
+        enteros = {'min': (np.minimum, np.iinfo('int64').max), 'max': (np.maximum, np.iinfo('int64').min)}
+        for estadistico in ('min','max'):
+            if estadistico in pedidos:
+                ufunc, neutro = enteros[estadistico]
+                r = trozos.reducir(ufunc, np.where(m, neutro, x))
+                resultado[estadistico] = pd.array(pd.DatetimeIndex(np.where(vacios, np.iinfo('int64').min, r).view(f'M8[{tipo.unit}]')).tz_localize(getattr(tipo, 'tz', None)))
+        return resultado
+
+    entero = tipo.kind in 'iu'
+    flotante = np.dtype('float64') if entero else tipo
+    pedidos = set(pedidos)
+    if pedidos & {'sum','mean','var','std'}:
+        # Con los nulos a 0, que sirve para la suma y para las desviaciones
+        x0 = x.astype('int64') if entero else np.where(m, 0, x).astype('float64', copy = False)
+        suma = trozos.reducir(np.add, x0)
+        if 'sum' in pedidos:
+            resultado['sum'] = suma.astype(tipo if por_grupos or not entero else 'int64')
+    for estadistico, ufunc in (('min', np.fmin), ('max', np.fmax)): # fmin y fmax ignoran los nulos
+        if estadistico in pedidos:
+            resultado[estadistico] = trozos.reducir(ufunc, x)
+    if pedidos & {'mean','var','std'}:
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            media = np.where(vacios, np.nan, suma / np.where(vacios, 1, conteo))
+        if 'mean' in pedidos:
+            resultado['mean'] = media.astype(flotante)
+        if pedidos & {'var','std'}:
+            desvios = x0 - trozos.expandir(media)
+            if m is not None:
+                desvios[m] = 0
+            np.multiply(desvios, desvios, out = desvios)
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                varianza = np.where(conteo < 2, np.nan, trozos.reducir(np.add, desvios) / np.maximum(conteo - 1, 1))
+            if 'var' in pedidos:
+                resultado['var'] = varianza.astype(flotante)
+            if 'std' in pedidos:
+                resultado['std'] = np.sqrt(varianza).astype(flotante)
+    return resultado
+
+
+def _agregar_con_pandas(serie, trozos, funcion):
+    # Para las funciones que no están en _estadisticos_variable: groupby de pandas sobre los códigos de grupo, sin volver a factorizar
+    validos = trozos.codigos >= 0
+    return serie[validos].groupby(trozos.codigos[validos]).agg(funcion).reindex(range(len(trozos.tamanos)))
+
+
+def _tipo_comun(valores):
+    # Tipo de una columna con estadísticos de distinto tipo, como al juntarlos en pandas
+    tipos = [getattr(v, 'dtype', np.asarray(v).dtype) for v in valores]
+    if all(t == tipos[0] for t in tipos):
+        return tipos[0]
+    if all(isinstance(t, np.dtype) and t.kind in 'iufb' for t in tipos):
+        return np.result_type(*tipos)
+    return object
+
+
+def agg_una_pasada(df, funciones = None, by = None, **nombradas):
+    """Equivalente a df.agg(funciones), df.groupby(by)[...].agg(funciones) o df.groupby(by).agg(**nombradas) calculando todos los
+    estadísticos de cada variable en una sola pasada.
+
+    Parámetros más importantes:
+
+    - funciones: un estadístico o una lista ('count', 'nulos', 'sum', 'min', 'max', 'mean', 'var', 'std' o funciones como nulos;
+      las que no sean de este módulo ni de numpy se calculan con pandas)
+      que se aplica a todas las variables de df (menos las de by)
+    - by: la variable (o lista de variables) de agrupación, opcional
+    - nombradas: agregaciones con nombre, nombre = ('variable','estadistico'), como en groupby().agg(); necesitan by
+
+    Por ejemplo:
+
+    agg_una_pasada(df.select_dtypes('number'), ['count','mean','max','min', nulos]).T
+    agg_una_pasada(df, by = 'Sector', media_financiacion = ('Funded Amount','mean'), fecha_mas_reciente = ('Funded Date','max'))
+    """
+    if (funciones is None) == (not nombradas):
+        raise ValueError('hay que indicar funciones o agregaciones con nombre, pero no las dos')
+    if nombradas and by is None:
+        raise ValueError('las agregaciones con nombre necesitan by')
+    by = None if by is None else _como_lista(by)
+    return _agregar(df, by, _Trozos(len(df), None if by is None else [df[c] for c in by]), funciones, nombradas)
+
+
+def _agregar(df, by, trozos, funciones, nombradas, variables = None):
+    # by = None da la forma de df.agg(); con by (aunque sea una lista vacía, un solo grupo) la de groupby().agg()
+    if nombradas:
+        especificaciones = [(nombre, variable, funcion) for nombre, (variable, funcion) in nombradas.items()]
+    else:
+        if variables is None:
+            variables = [c for c in df.columns if by is None or c not in by]
+        especificaciones = [((variable, _nombre_funcion(funcion)), variable, funcion) for variable in variables for funcion in _como_lista_funciones(funciones)]
+
+    pedidos = {}
+    for _, variable, funcion in especificaciones:
+        pedidos.setdefault(variable, set()).add(_estadistico_conocido(funcion))
+    calculados = {variable: _estadisticos_variable(df[variable], trozos, conocidos - {None}, by is not None) for variable, conocidos in pedidos.items()}
+
+    resultados = {}
+    for clave, variable, funcion in especificaciones:
+        conocido = _estadistico_conocido(funcion)
+        if conocido in calculados[variable]:
+            valor = calculados[variable][conocido]
+            if by is not None and not isinstance(funcion, str) and df[variable].dtype.kind in 'iu':
+                valor = valor.astype(df[variable].dtype) # pandas devuelve las funciones agrupadas con el tipo entero de la variable
+            resultados[clave] = valor if by is not None else valor[0]
+        elif by is None: # el resto de funciones las calcula pandas
+            resultados[clave] = df[variable].agg(funcion)
+        elif not by:
+            resultados[clave] = pd.array([df[variable].agg(funcion)])
+        else:
+            resultados[clave] = _agregar_con_pandas(df[variable], trozos, funcion).array
+
+    if by is not None:
+        if not nombradas and not _es_lista_funciones(funciones):
+            resultados = {clave[0]: valor for clave, valor in resultados.items()}
+        return pd.DataFrame(resultados, index = pd.RangeIndex(1) if trozos.indice is None else trozos.indice)
+    if not _es_lista_funciones(funciones):
+        valores = [resultados[(v, _nombre_funcion(funciones))] for v in variables]
+        return pd.Series(valores, index = variables, dtype = _tipo_comun(valores))
+    etiquetas = [_nombre_funcion(f) for f in _como_lista_funciones(funciones)]
+    columnas = {}
+    for variable in variables:
+        valores = [resultados[(variable, etiqueta)] for etiqueta in etiquetas]
+        columnas[variable] = pd.Series(valores, index = etiquetas, dtype = _tipo_comun(valores))
+    return pd.DataFrame(columnas)
+
+
+# FILTRAR GRUPOS (HAVING)
+
+# groupby().filter(lambda x: ...) ejecuta la función en Python para cada grupo y luego concatena los grupos que pasan.
+# Como el HAVING de SQL, la condición solo depende de estadísticos del grupo, así que la podemos escribir de forma declarativa:
+
+# - grupo.count() > 100
+# - grupo.mean('Funded Amount') > 700
+# - (grupo.sum('Paid Amount') / grupo.sum('Funded Amount') > 0.9) & (grupo.count() >= 10)
+
+# Se calculan todos los estadísticos de una vez por grupo (como en agg_una_pasada), se evalúa la condición por grupo,
+# y se lleva a cada registro con su código de grupo, lo que da una máscara booleana en el orden original sin concatenar nada.
+
+
+class _Expresion:
+    # Nodo de una condición sobre grupos: evaluar(contexto) devuelve un array con un valor por grupo
+
+    def _operar(self, funcion, otro, invertido = False):
+        otro = otro if isinstance(otro, _Expresion) else _Constante(otro)
+        return _Operacion(funcion, otro, self) if invertido else _Operacion(funcion, self, otro)
+
+    def __gt__(self, otro): return self._operar(np.greater, otro)
+    def __ge__(self, otro): return self._operar(np.greater_equal, otro)
+    def __lt__(self, otro): return self._operar(np.less, otro)
+    def __le__(self, otro): return self._operar(np.less_equal, otro)
+    def __eq__(self, otro): return self._operar(np.equal, otro)
+    def __ne__(self, otro): return self._operar(np.not_equal, otro)
+    def __add__(self, otro): return self._operar(np.add, otro)
+    def __radd__(self, otro): return self._operar(np.add, otro, True)
+    def __sub__(self, otro): return self._operar(np.subtract, otro)
+    def __rsub__(self, otro): return self._operar(np.subtract, otro, True)
+    def __mul__(self, otro): return self._operar(np.multiply, otro)
+    def __rmul__(self, otro): return self._operar(np.multiply, otro, True)
+    def __truediv__(self, otro): return self._operar(np.true_divide, otro)
+    def __rtruediv__(self, otro): return self._operar(np.true_divide, otro, True)
+    def __and__(self, otro): return self._operar(np.logical_and, otro)
+    def __or__(self, otro): return self._operar(np.logical_or, otro)
+    def __invert__(self): return _Operacion(np.logical_not, self)
+    __hash__ = None
+
+    def hojas(self):
+        return []
+
+
+class _Constante(_Expresion):
+
+    def __init__(self, valor):
+        self.valor = valor
+
+    def evaluar(self, contexto):
+        return self.valor
+
+
+class _Operacion(_Expresion):
+
+    def __init__(self, funcion, *argumentos):
+        self.funcion, self.argumentos = funcion, argumentos
+
+    def evaluar(self, contexto):
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            return self.funcion(*[a.evaluar(contexto) for a in self.argumentos])
+
+    def hojas(self):
+        return [hoja for a in self.argumentos for hoja in a.hojas()]
+
+
+class EstadisticoGrupo(_Expresion):
+    """Un estadístico de una variable por grupo para usar en having(), se crean con grupo: grupo.mean('Funded Amount')."""
+
+    def __init__(self, estadistico, columna = None):
+        self.estadistico, self.columna = estadistico, columna
+
+    def evaluar(self, contexto):
+        return contexto[(self.estadistico, self.columna)]
+
+    def hojas(self):
+        return [self]
+
+    def __repr__(self):
+        return f"grupo.{self.estadistico}({'' if self.columna is None else repr(self.columna)})"
+
+
+class _Grupo:
+    # Constructor de estadísticos por grupo: grupo.count(), grupo.mean('Funded Amount')...
+
+    def size(self):
+        return EstadisticoGrupo('size')
+
+    def count(self, columna = None):
+        """Sin columna cuenta los registros del grupo (como x.Country.count() en el filter del curso)."""
+        return EstadisticoGrupo('size') if columna is None else EstadisticoGrupo('count', columna)
+
+    def __getattr__(self, estadistico):
+        # sum, mean, min, max, var, std, nulos, y cualquier otro que entienda groupby().agg() (median, nunique...)
+        if estadistico.startswith('_'):
+            raise AttributeError(estadistico)
+        return lambda columna: EstadisticoGrupo(estadistico, columna)
+
+
+grupo = _Grupo()
+
+
+def _evaluar_grupos(df, by, condicion):
+    # Evalúa la condición para cada grupo y devuelve los códigos de grupo de cada registro y el resultado por grupo
+    trozos = _Trozos(len(df), [df[c] for c in _como_lista(by)])
+    hojas = condicion.hojas()
+    pedidos = {}
+    for hoja in hojas:
+        if hoja.columna is not None:
+            pedidos.setdefault(hoja.columna, set()).add(ALIAS_ESTADISTICOS.get(hoja.estadistico, hoja.estadistico))
+    calculados = {columna: _estadisticos_variable(df[columna], trozos, estadisticos & set(ESTADISTICOS_UNA_PASADA), True)
+                  for columna, estadisticos in pedidos.items()}
+
+    contexto = {}
+    for hoja in hojas:
+        clave = (hoja.estadistico, hoja.columna)
+        estadistico = ALIAS_ESTADISTICOS.get(hoja.estadistico, hoja.estadistico)
+        if hoja.columna is None:
+            contexto[clave] = trozos.tamanos
+        elif estadistico in calculados[hoja.columna]:
+            contexto[clave] = np.asarray(calculados[hoja.columna][estadistico])
+        else:
+            contexto[clave] = _agregar_con_pandas(df[hoja.columna], trozos, hoja.estadistico).to_numpy()
+    por_grupo = np.asarray(condicion.evaluar(contexto), dtype = bool)
+    return trozos.codigos, por_grupo
+
+
+def having(df, by, condicion):
+    """Máscara booleana (en el orden de df) de los registros cuyo grupo cumple la condición.
+
+    Parámetros más importantes:
+
+    - by: la variable (o lista de variables) de agrupación
+    - condicion: una condición sobre estadísticos del grupo, p.e. grupo.count() > 100 o grupo.mean('Funded Amount') > 700
+
+    Los registros con nulos en las variables de agrupación no pertenecen a ningún grupo y quedan fuera, como en groupby().filter().
+    """
+    codigos, por_grupo = _evaluar_grupos(df, by, condicion)
+    mascara = np.zeros(len(df), dtype = bool)
+    validos = codigos >= 0
+    mascara[validos] = por_grupo[codigos[validos]]
+    return pd.Series(mascara, index = df.index)
+
+
+def filtrar_grupos(df, by, condicion):
+    """Equivalente vectorizado de df.groupby(by).filter(lambda x: ...) con la condición de having().
+
+    Por ejemplo, en lugar de df.groupby('Country').filter(lambda x: x['Funded Amount'].mean() > 700):
+
+    filtrar_grupos(df, 'Country', grupo.mean('Funded Amount') > 700)
+    """
+    return df.loc[having(df, by, condicion).to_numpy()]
+
+
+
+# CONJUNTOS DE AGRUPACIONES (GROUPING SETS, ROLLUP Y CUBE)
+
+# En un informe agrupamos la misma tabla por Country, por Sector, por ['Country','Sector'], por ['Country','Delinquent']...
+# y cada groupby vuelve a factorizar (hashear) las variables de agrupación desde cero, que es lo que más tarda.
+# Agrupaciones factoriza cada dimensión una sola vez y reutiliza sus códigos en todas las agrupaciones:
+
+# - agg(by, ...): un groupby().agg() (con el motor de agg_una_pasada)
+# - grouping_sets([...]): varias agrupaciones de una vez
+# - rollup() y cube(): las agrupaciones con los subtotales de SQL en una sola tabla
+# - crosstab() y pivot_table(): las de tabla_cruzada y tabla_dinamica, con los totales de margins = True
+
+
+class Agrupaciones:
+    """Muchas agrupaciones sobre el mismo dataframe factorizando cada variable de agrupación una sola vez.
+
+    Parámetros más importantes:
+
+    - df: el dataframe
+    - dimensiones: variables a factorizar desde el principio (el resto se factoriza la primera vez que se usa)
+    - margins_name: la etiqueta de los subtotales en rollup y cube
+
+    Por ejemplo:
+
+    agrupaciones = Agrupaciones(df, ['Country','Sector','Delinquent'])
+    agrupaciones.grouping_sets(['Country', 'Sector', ['Country','Sector']], ['count','mean'], columnas = ['Loan Amount','Paid Amount'])
+    agrupaciones.rollup(['Country','Sector'], media = ('Funded Amount','mean'))
+    agrupaciones.crosstab('Country', 'Sector', margins = True)
+    """
+
+    def __init__(self, df, dimensiones = (), margins_name = 'All'):
+        self.df = df
+        self.margins_name = margins_name
+        self._factorizadas = {}
+        for dimension in _como_lista(dimensiones):
+            self._dimension(dimension)
+
+    def _dimension(self, nombre):
+        if nombre not in self._factorizadas:
+            self._factorizadas[nombre] = _factorizar(self.df[nombre])
+        return self._factorizadas[nombre]
+
+    def agg(self, by, funciones = None, columnas = None, **nombradas):
+        """Equivalente a df.groupby(by)[columnas].agg(funciones) o df.groupby(by).agg(**nombradas).
+
+        Con by = [] devuelve el total general en una sola fila.
+        """
+        if (funciones is None) == (not nombradas):
+            raise ValueError('hay que indicar funciones o agregaciones con nombre, pero no las dos')
+        by = _como_lista(by)
+        trozos = _Trozos(len(self.df), [self._dimension(d) for d in by])
+        resultado = _agregar(self.df, by, trozos, funciones, nombradas, None if columnas is None else _como_lista(columnas))
+        if not by:
+            resultado.index = pd.Index([self.margins_name])
+        return resultado
+
+    def grouping_sets(self, conjuntos, funciones = None, columnas = None, **nombradas):
+        """Diccionario agrupación (tupla de variables) -> resultado de agg() para cada agrupación de conjuntos."""
+        return {tuple(_como_lista(by)): self.agg(by, funciones, columnas, **nombradas) for by in conjuntos}
+
+    def _subtotales(self, dimensiones, conjuntos, funciones, columnas, nombradas):
+        # Junta los resultados de varias agrupaciones en una tabla indexada por todas las dimensiones, con margins_name en las que no agrupan
+        partes = []
+        for by, resultado in self.grouping_sets(conjuntos, funciones, columnas, **nombradas).items():
+            niveles = [resultado.index.get_level_values(by.index(d)) if d in by else [self.margins_name] * len(resultado) for d in dimensiones]
+            resultado = resultado.copy()
+            resultado.index = pd.MultiIndex.from_arrays(niveles, names = dimensiones) if len(dimensiones) > 1 else pd.Index(niveles[0], name = dimensiones[0])
+            partes.append(resultado)
+        return pd.concat(partes)
+
+    def rollup(self, dimensiones, funciones = None, columnas = None, **nombradas):
+        """Como GROUP BY ROLLUP de SQL: para ['Country','Sector'] agrupa por (Country, Sector), por Country y el total general."""
+        dimensiones = _como_lista(dimensiones)
+        conjuntos = [dimensiones[:k] for k in range(len(dimensiones), -1, -1)]
+        return self._subtotales(dimensiones, conjuntos, funciones, columnas, nombradas)
+
+    def cube(self, dimensiones, funciones = None, columnas = None, **nombradas):
+        """Como GROUP BY CUBE de SQL: todas las combinaciones de las dimensiones, de la más detallada al total general."""
+        dimensiones = _como_lista(dimensiones)
+        conjuntos = [list(c) for k in range(len(dimensiones), -1, -1) for c in itertools.combinations(dimensiones, k)]
+        return self._subtotales(dimensiones, conjuntos, funciones, columnas, nombradas)
+
+    def crosstab(self, index, columns, values = None, aggfunc = None, normalize = False, margins = False, margins_name = 'All'):
+        """Como tabla_cruzada (pd.crosstab) pero con los nombres de las variables de df."""
+        if (values is None) != (aggfunc is None):
+            raise ValueError('values y aggfunc se tienen que indicar juntos')
+        valores = None if values is None else self.df[values]
+        contingencia = _Contingencia([self._dimension(d) for d in _como_lista(index)], [self._dimension(d) for d in _como_lista(columns)],
+                                     [] if values is None else [valores])
+        return _tabla_cruzada(contingencia, valores, aggfunc, normalize, margins, margins_name)
+
+    def pivot_table(self, index, columns, values, aggfunc = 'mean', fill_value = None, margins = False, margins_name = 'All'):
+        """Como tabla_dinamica (df.pivot_table)."""
+        contingencia = _Contingencia([self._dimension(d) for d in _como_lista(index)], [self._dimension(d) for d in _como_lista(columns)],
+                                     [self.df[v] for v in _como_lista(values)])
+        return _pivotar(contingencia, self.df, values, aggfunc, fill_value, margins, margins_name)
@@ -0,0 +1,147 @@
+print("******************")
+print("BUSINESS ANALYTICS")
+print("******************")
+
+print("**********************************")
+print("BENCHMARK DE CARGA: MOTORES DE CSV")
+print("**********************************")
+
+# Compara el tiempo y la memoria máxima (peak RSS) de las funciones de carga con los dos motores de lectura de CSV:
+
+# - 'c': el de pandas por defecto, de un solo hilo
+# - 'pyarrow': el lector multihilo de Arrow
+
+# Para ver cómo escala generamos versiones sintéticas de los datasets repitiendo sus registros 1, 10 y 100 veces.
+# Los CSV de accidentes y de Renfe no se distribuyen con el curso: si no están en el directorio se genera
+# un CSV con su mismo formato (separador, fechas con el día primero, coma decimal, columnas vacías...) como base.
+# Cada medida se hace en un proceso nuevo, para que la memoria máxima sea solo la de esa carga.
+
+# Uso: python business_analytics_benchmark_carga.py [escala ...]
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from business_analytics_carga import (CABECERA_ACCIDENTES, MOTORES_CSV, RUTA_ACCIDENTES, RUTA_IBEX35, RUTA_KIVA,
+                                      RUTA_RENFE_RRHH)
+
+ESCALAS = [1, 10, 100]
+REPETICIONES = 3
+
+# Registros de los CSV sintéticos de accidentes (aproximadamente los de 2020) y de Renfe
+FILAS_ACCIDENTES = 32_000
+FILAS_RENFE = 500
+
+# Código que ejecuta cada proceso: carga el archivo y devuelve el mejor tiempo y la memoria máxima en MB
+MEDIDA = '''
+import json, resource, sys, time
+import business_analytics_carga as carga
+funcion, ruta, engine, repeticiones = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+argumentos = {'cache': False} if funcion == 'load_kiva' else {}
+tiempos = []
+for _ in range(repeticiones):
+    inicio = time.perf_counter()
+    getattr(carga, funcion)(ruta, engine = engine, **argumentos)
+    tiempos.append(time.perf_counter() - inicio)
+print(json.dumps({'segundos': min(tiempos), 'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+
+def escalar_csv(origen, destino, veces, encoding = 'utf-8'):
+    """Escribe en destino el CSV de origen con sus registros repetidos veces veces."""
+    with open(origen, encoding = encoding) as archivo:
+        cabecera = archivo.readline()
+        registros = archivo.read()
+    if not registros.endswith('\n'):
+        registros += '\n'
+    with open(destino, 'w', encoding = encoding) as archivo:
+        archivo.write(cabecera)
+        for _ in range(veces):
+            archivo.write(registros)
+
+
+def accidentes_sintetico(destino, filas = FILAS_ACCIDENTES, semilla = 0):
+    """Escribe en destino un CSV con el formato de 2020_Accidentalidad.csv y datos aleatorios."""
+    aleatorio = np.random.default_rng(semilla)
+    fechas = pd.Timestamp('2020-01-01') + pd.to_timedelta(aleatorio.integers(0, 366, filas), unit = 'D')
+    elegir = lambda valores: aleatorio.choice(np.array(valores, dtype = object), filas)
+    df = pd.DataFrame({'expediente': [f'2020S{n:06d}' for n in aleatorio.integers(0, filas // 2, filas)],
+                       'fecha': fechas.strftime('%d/%m/%Y'),
+                       'hora': [f'{h}:{m:02d}:00' for h, m in zip(aleatorio.integers(0, 24, filas), aleatorio.integers(0, 60, filas))],
+                       'calle': elegir(['CALL. ALCALA', 'AVDA. AMERICA', 'PASEO. CASTELLANA', 'CALL. MAYOR']),
+                       'numero': np.where(aleatorio.random(filas) < 0.01, None, aleatorio.integers(1, 300, filas).astype(str)),
+                       'distrito': elegir(['CENTRO', 'RETIRO', 'USERA', 'SALAMANCA', 'CHAMARTIN', 'TETUAN', None]),
+                       'tipo_accidente': elegir(['Colisión fronto-lateral', 'Alcance', 'Atropello a persona', 'Caída']),
+                       'tiempo': elegir(['Despejado', 'Lluvia débil', 'Nublado', None]),
+                       'vehiculo': elegir(['Turismo', 'Motocicleta hasta 125cc', 'Furgoneta', 'Autobús']),
+                       'persona': elegir(['Conductor', 'Pasajero', 'Peatón']),
+                       'edad': elegir(['De 18 a 20 años', 'De 25 a 29 años', 'De 40 a 44 años', 'Desconocido']),
+                       'sexo': elegir(['Hombre', 'Mujer', None]),
+                       'lesividad': np.where(aleatorio.random(filas) < 0.4, np.nan, aleatorio.integers(1, 15, filas)),
+                       'unamed1': None, 'unamed2': None})
+    df.columns = [c.upper() for c in CABECERA_ACCIDENTES]
+    df.to_csv(destino, sep = ';', index = False)
+
+
+def renfe_sintetico(destino, filas = FILAS_RENFE, semilla = 0):
+    """Escribe en destino un CSV con el formato de Renfe_rrhh.csv (cabeceras con acentos y %, coma decimal) y datos aleatorios."""
+    aleatorio = np.random.default_rng(semilla)
+    df = pd.DataFrame({'Año': 2000 + np.arange(filas) % 24,
+                       'Número de empleados (a 31/12)': aleatorio.integers(10_000, 16_000, filas),
+                       'Número de mujeres en plantilla': aleatorio.integers(1_000, 3_000, filas),
+                       'Número de hombres en plantilla': aleatorio.integers(8_000, 13_000, filas),
+                       'Índice de rotación de la plantilla mujeres (%)': aleatorio.random(filas) * 10,
+                       'Índice de rotación de la plantilla hombres (%)': aleatorio.random(filas) * 10,
+                       'Inversión en formación (miles de euros)': aleatorio.random(filas) * 20_000,
+                       'Antigüedad media de los empleados hombres  (años)': aleatorio.random(filas) * 30})
+    df.to_csv(destino, sep = ';', decimal = ',', index = False)
+
+
+def medir(funcion, ruta, engine, repeticiones = REPETICIONES):
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    salida = subprocess.run([sys.executable, '-c', MEDIDA, funcion, ruta, engine, str(repeticiones)],
+                            cwd = directorio, capture_output = True, text = True, check = True)
+    return json.loads(salida.stdout)
+
+
+def benchmark(escalas = ESCALAS, repeticiones = REPETICIONES):
+    """Devuelve una tabla con el tiempo y la memoria máxima por dataset, escala y motor."""
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    filas = []
+    with tempfile.TemporaryDirectory() as temporal:
+        datasets = {'load_kiva': (os.path.join(directorio, RUTA_KIVA), 'utf-8'),
+                    'load_ibex35': (os.path.join(directorio, RUTA_IBEX35), 'utf-8-sig'),
+                    'load_accidents': (os.path.join(directorio, RUTA_ACCIDENTES), 'utf-8'),
+                    'load_renfe_rrhh': (os.path.join(directorio, RUTA_RENFE_RRHH), 'utf-8')}
+        for funcion, sintetico in [('load_accidents', accidentes_sintetico), ('load_renfe_rrhh', renfe_sintetico)]:
+            origen = datasets[funcion][0]
+            if not os.path.exists(origen):
+                origen = os.path.join(temporal, 'base_' + os.path.basename(origen))
+                sintetico(origen)
+                datasets[funcion] = (origen, 'utf-8')
+
+        for funcion, (origen, encoding) in datasets.items():
+            for escala in escalas:
+                ruta = os.path.join(temporal, f'{escala}x_{os.path.basename(origen)}')
+                escalar_csv(origen, ruta, escala, encoding)
+                for engine in MOTORES_CSV:
+                    medida = medir(funcion, ruta, engine, repeticiones)
+                    filas.append({'funcion': funcion, 'escala': escala, 'engine': engine,
+                                  'mb_archivo': os.path.getsize(ruta) / 2**20, **medida})
+                os.remove(ruta)
+
+    resultado = pd.DataFrame(filas).set_index(['funcion','escala','engine'])
+    resultado['aceleracion'] = (resultado.segundos.groupby(level = ['funcion','escala']).transform('first')
+                                / resultado.segundos)
+    return resultado.round(3)
+
+
+if __name__ == '__main__':
+    escalas = [int(e) for e in sys.argv[1:]] or ESCALAS
+    print(f'Núcleos disponibles: {os.cpu_count()}')
+    print(benchmark(escalas).to_string())
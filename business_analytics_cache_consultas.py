@@ -0,0 +1,604 @@
+# CACHÉ DE CONSULTAS
+
+# En las consultas interactivas lanzamos una y otra vez las mismas expresiones de query(), cambiando como mucho el valor de una variable
+# (`Funded Amount` > @media, lesividad < @lesividad_media...).
+
+# Cada df.query() vuelve a trocear el texto, a construir el árbol de la expresión y a decidir cómo evaluarlo.
+# Con dataframes pequeños o medianos eso cuesta más que el propio filtro.
+
+# PLANES COMPILADOS
+
+# cached_query() hace ese trabajo una sola vez por expresión:
+
+# - analiza el texto y lo convierte en un plan: una función que evalúa la expresión directamente con operaciones vectorizadas de pandas
+# - guarda el plan en una caché LRU, usando como clave la expresión normalizada (sin espacios de más, mismo formato para comparaciones...)
+# - las variables con @ no forman parte del plan: se sustituyen en cada ejecución
+
+# Si numexpr está instalado y el dataframe es grande, las expresiones solo numéricas se evalúan con numexpr (multihilo y sin temporales).
+# Las expresiones que el plan no sabe evaluar (p.e. con métodos como .str.contains()) se pasan tal cual a df.query().
+
+# El plan también se puede traducir a un filtro de pyarrow (filtro_arrow()) para aplicarlo al leer de Parquet, ver scan_kiva().
+
+# CACHÉ DE RESULTADOS
+
+# Mientras exploramos también repetimos consultas enteras: df.Country.value_counts(), df['Funded Amount'].mean(), el mismo groupby().agg()...
+# cached_eval() guarda el resultado de cada expresión en una caché por dataframe (CacheResultados):
+
+# - la clave es la expresión normalizada más el valor de las variables que usa (salvo df)
+# - la caché lleva un número de versión del dataframe: si el dataframe cambia (df['Devuelto'] = ..., drop(..., inplace = True), df.loc[...] = ...)
+#   sube la versión y se descartan todos los resultados guardados
+# - para detectar esos cambios hace falta pandas 3 o pandas 2 con pd.options.mode.copy_on_write = True: sin Copy-on-Write
+#   la caché no guarda nada y cached_eval() calcula siempre, antes que arriesgarse a devolver un resultado obsoleto
+# - cuando hay demasiados resultados o ocupan demasiado se descartan los que llevan más tiempo sin usarse (LRU)
+
+import ast
+import collections
+import datetime
+import functools
+import numbers
+import re
+import sys
+import weakref
+
+import numpy as np
+import pandas as pd
+from pandas.errors import UndefinedVariableError
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+except ImportError: # sin pyarrow no se pueden empujar filtros a la lectura
+    pa = ds = None
+
+TAMANO_CACHE_CONSULTAS = 256
+
+# A partir de cuántas filas compensa usar numexpr
+FILAS_NUMEXPR = 100_000
+
+# Límites de la caché de resultados de cada dataframe: número de resultados y memoria que pueden ocupar
+RESULTADOS_CACHE = 128
+BYTES_CACHE = 256 * 1024 ** 2
+
+# Textos entre comillas (que no se tocan), variables entre acentos inversos, parámetros con @ y operadores & |
+_PIEZAS_EXPRESION = re.compile(r'''('[^']*'|"[^"]*")|`([^`]+)`|@([A-Za-z_][A-Za-z0-9_]*)|([&|])''')
+_NOMBRES_INTERNOS = re.compile(r'\b__(col|param)_(\w+?)__\b')
+
+_COMPARACIONES = {ast.Eq: lambda a, b: a == b, ast.NotEq: lambda a, b: a != b,
+                  ast.Lt: lambda a, b: a < b, ast.LtE: lambda a, b: a <= b,
+                  ast.Gt: lambda a, b: a > b, ast.GtE: lambda a, b: a >= b}
+
+_ARITMETICA = {ast.Add: lambda a, b: a + b, ast.Sub: lambda a, b: a - b, ast.Mult: lambda a, b: a * b,
+               ast.Div: lambda a, b: a / b, ast.FloorDiv: lambda a, b: a // b, ast.Mod: lambda a, b: a % b,
+               ast.Pow: lambda a, b: a ** b}
+
+_SIMBOLOS_NUMEXPR = {ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=',
+                     ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.Mod: '%', ast.Pow: '**',
+                     ast.And: '&', ast.Or: '|'}
+
+
+class _NoSoportado(Exception):
+    pass
+
+
+def _preparar(expresion):
+    # Deja la expresión en Python válido: `Funded Amount` -> __col_0__, @media -> __param_media__
+    # Como en df.query(), & y | tienen la misma prioridad que and y or (a > 1 & b < 2 es (a > 1) and (b < 2))
+    columnas = []
+
+    def sustituir(pieza):
+        texto, columna, parametro, operador = pieza.groups()
+        if texto is not None:
+            return texto
+        if operador is not None:
+            return ' and ' if operador == '&' else ' or '
+        if columna is not None:
+            if columna not in columnas:
+                columnas.append(columna)
+            return f'__col_{columnas.index(columna)}__'
+        return f'__param_{parametro}__'
+
+    return _PIEZAS_EXPRESION.sub(sustituir, expresion.strip()), columnas
+
+
+def _normalizar(expresion):
+    preparada, columnas = _preparar(expresion)
+    texto = ast.unparse(ast.parse(preparada, mode = 'eval'))
+    restaurar = lambda m: f'`{columnas[int(m.group(2))]}`' if m.group(1) == 'col' else f'@{m.group(2)}'
+    return _NOMBRES_INTERNOS.sub(restaurar, texto)
+
+
+class PlanConsulta:
+    """Expresión de query() ya analizada. Se ejecuta con plan(df, parametros)."""
+
+    def __init__(self, expresion):
+        self.expresion = expresion
+        preparada, self._columnas_acentos = _preparar(expresion)
+        self.columnas, self.parametros = set(), set()
+        self._alias_numexpr = {}
+        self.arbol = arbol = ast.parse(preparada, mode = 'eval').body
+        for nodo in ast.walk(arbol):
+            if isinstance(nodo, ast.Name):
+                self._nombre(nodo.id)
+        try:
+            self._evaluar = self._compilar(arbol)
+        except _NoSoportado:
+            self._evaluar = None
+        try:
+            self.fuente_numexpr = self._numexpr(arbol) if numexpr is not None else None
+        except _NoSoportado:
+            self.fuente_numexpr = None
+
+    def __repr__(self):
+        modo = 'df.query' if self._evaluar is None else ('numexpr/pandas' if self.fuente_numexpr else 'pandas')
+        return f'PlanConsulta({self.expresion!r}, {modo})'
+
+    # Nombres
+
+    def _nombre(self, identificador):
+        # Devuelve ('columna', nombre) o ('parametro', nombre)
+        interno = _NOMBRES_INTERNOS.fullmatch(identificador)
+        if interno is None:
+            self.columnas.add(identificador)
+            return 'columna', identificador
+        if interno.group(1) == 'col':
+            nombre = self._columnas_acentos[int(interno.group(2))]
+            self.columnas.add(nombre)
+            return 'columna', nombre
+        self.parametros.add(interno.group(2))
+        return 'parametro', interno.group(2)
+
+    # Compilación a operaciones de pandas
+
+    def _compilar(self, nodo):
+        if isinstance(nodo, ast.Constant):
+            valor = nodo.value
+            return lambda df, p: valor
+        if isinstance(nodo, ast.Name):
+            tipo, nombre = self._nombre(nodo.id)
+            if tipo == 'parametro':
+                return lambda df, p: p[nombre]
+            return lambda df, p: _columna(df, nombre)
+        if isinstance(nodo, (ast.List, ast.Tuple)):
+            elementos = [self._compilar(e) for e in nodo.elts]
+            return lambda df, p: [e(df, p) for e in elementos]
+        if isinstance(nodo, ast.BoolOp):
+            partes = [self._compilar(v) for v in nodo.values]
+            combinar = (lambda a, b: a & b) if isinstance(nodo.op, ast.And) else (lambda a, b: a | b)
+            return lambda df, p: functools.reduce(combinar, (parte(df, p) for parte in partes))
+        if isinstance(nodo, ast.UnaryOp):
+            operando = self._compilar(nodo.operand)
+            if isinstance(nodo.op, (ast.Not, ast.Invert)):
+                return lambda df, p: ~operando(df, p)
+            if isinstance(nodo.op, ast.USub):
+                return lambda df, p: -operando(df, p)
+            if isinstance(nodo.op, ast.UAdd):
+                return operando
+        if isinstance(nodo, ast.BinOp) and type(nodo.op) in _ARITMETICA:
+            operar = _ARITMETICA[type(nodo.op)]
+            izquierda, derecha = self._compilar(nodo.left), self._compilar(nodo.right)
+            return lambda df, p: operar(izquierda(df, p), derecha(df, p))
+        if isinstance(nodo, ast.Compare):
+            # 1000 < `Funded Amount` < 2000 equivale a (1000 < `Funded Amount`) & (`Funded Amount` < 2000)
+            terminos = [self._compilar(t) for t in [nodo.left] + nodo.comparators]
+            pares = [(self._comparacion(op), terminos[k], terminos[k + 1]) for k, op in enumerate(nodo.ops)]
+            return lambda df, p: functools.reduce(lambda a, b: a & b,
+                                                  (comparar(izquierda(df, p), derecha(df, p)) for comparar, izquierda, derecha in pares))
+        raise _NoSoportado(ast.dump(nodo))
+
+    @staticmethod
+    def _comparacion(op):
+        # Como en df.query(), == y != con una lista (literal o parámetro) son in y not in
+        if isinstance(op, ast.Eq):
+            return _igual
+        if isinstance(op, ast.NotEq):
+            return lambda a, b: ~_igual(a, b) if isinstance(a, list) or isinstance(b, list) else a != b
+        if type(op) in _COMPARACIONES:
+            return _COMPARACIONES[type(op)]
+        if isinstance(op, ast.In):
+            return lambda a, b: _pertenece(a, b)
+        if isinstance(op, ast.NotIn):
+            return lambda a, b: ~_pertenece(a, b)
+        raise _NoSoportado(type(op).__name__)
+
+    # Traducción a numexpr (solo operaciones numéricas)
+
+    def _numexpr(self, nodo):
+        if isinstance(nodo, ast.Constant) and isinstance(nodo.value, (bool, int, float)):
+            return repr(nodo.value)
+        if isinstance(nodo, ast.Name):
+            # numexpr no admite nombres con __, así que cada variable pasa a ser v0, v1...
+            variable = self._nombre(nodo.id)
+            alias = next((a for a, v in self._alias_numexpr.items() if v == variable), f'v{len(self._alias_numexpr)}')
+            self._alias_numexpr[alias] = variable
+            return alias
+        if isinstance(nodo, ast.BoolOp):
+            return '(' + f' {_SIMBOLOS_NUMEXPR[type(nodo.op)]} '.join(self._numexpr(v) for v in nodo.values) + ')'
+        if isinstance(nodo, ast.UnaryOp):
+            simbolo = {ast.Not: '~', ast.Invert: '~', ast.USub: '-', ast.UAdd: '+'}[type(nodo.op)]
+            return f'({simbolo}{self._numexpr(nodo.operand)})'
+        if isinstance(nodo, ast.BinOp) and type(nodo.op) in _SIMBOLOS_NUMEXPR:
+            return f'({self._numexpr(nodo.left)} {_SIMBOLOS_NUMEXPR[type(nodo.op)]} {self._numexpr(nodo.right)})'
+        if isinstance(nodo, ast.Compare) and all(type(op) in _SIMBOLOS_NUMEXPR for op in nodo.ops):
+            terminos = [self._numexpr(t) for t in [nodo.left] + nodo.comparators]
+            return '(' + ' & '.join(f'({terminos[k]} {_SIMBOLOS_NUMEXPR[type(op)]} {terminos[k + 1]})'
+                                    for k, op in enumerate(nodo.ops)) + ')'
+        raise _NoSoportado(ast.dump(nodo))
+
+    def _variables_numexpr(self, df, parametros):
+        # Arrays para numexpr, o None si alguna variable no es numérica
+        variables = {}
+        for alias, (tipo, nombre) in self._alias_numexpr.items():
+            valor = parametros[nombre] if tipo == 'parametro' else _columna(df, nombre)
+            if isinstance(valor, (pd.Series, pd.Index)):
+                if pd.api.types.is_extension_array_dtype(valor.dtype) or valor.dtype.kind not in 'biuf':
+                    return None
+                valor = valor.to_numpy()
+            elif not isinstance(valor, (bool, int, float)):
+                return None
+            variables[alias] = valor
+        return variables
+
+    # Traducción a filtro de pyarrow, para aplicarlo al leer
+
+    def filtro_arrow(self, esquema, parametros = None, index_col = None):
+        """Filtro de pyarrow.dataset equivalente a la expresión, o None si no se puede traducir nada.
+
+        Nunca deja fuera filas que cumplan la expresión, pero puede dejar pasar filas de más (las partes que no sabe traducir
+        se ignoran), así que después hay que volver a filtrar con el plan.
+
+        - esquema: pa.Schema de los datos a leer
+        - index_col: columna que hace de índice, para las expresiones con index
+        """
+        if ds is None:
+            return None
+        return self._arrow(self.arbol, esquema, parametros or {}, index_col)
+
+    def _arrow(self, nodo, esquema, parametros, index_col):
+        if isinstance(nodo, ast.BoolOp):
+            partes = [self._arrow(v, esquema, parametros, index_col) for v in nodo.values]
+            if isinstance(nodo.op, ast.And):
+                # Quitar una condición de un "y" solo deja pasar filas de más
+                partes = [parte for parte in partes if parte is not None]
+                return functools.reduce(lambda a, b: a & b, partes) if partes else None
+            return None if any(parte is None for parte in partes) else functools.reduce(lambda a, b: a | b, partes)
+        if isinstance(nodo, ast.UnaryOp) and isinstance(nodo.op, (ast.Not, ast.Invert)):
+            operando = self._arrow(nodo.operand, esquema, parametros, index_col)
+            # En pandas la negación de una comparación con nulos es True; en Arrow seguiría siendo nulo
+            return None if operando is None else ~operando | operando.is_null()
+        if isinstance(nodo, ast.Compare):
+            terminos = [self._operando_arrow(t, esquema, parametros, index_col) for t in [nodo.left] + nodo.comparators]
+            nodos = [nodo.left] + nodo.comparators
+            partes = [self._comparacion_arrow(op, terminos[k], terminos[k + 1], nodos[k], nodos[k + 1], parametros)
+                      for k, op in enumerate(nodo.ops)]
+            partes = [parte for parte in partes if parte is not None]
+            return functools.reduce(lambda a, b: a & b, partes) if partes else None
+        operando = self._operando_arrow(nodo, esquema, parametros, index_col)
+        return operando[0] if operando is not None and operando[1] == 'bool' and operando[2] else None
+
+    def _operando_arrow(self, nodo, esquema, parametros, index_col):
+        # Devuelve (expresión, tipo, es_columna) o None
+        if isinstance(nodo, ast.Constant):
+            return _literal_arrow(nodo.value)
+        if isinstance(nodo, ast.Name):
+            tipo, nombre = self._nombre(nodo.id)
+            if tipo == 'parametro':
+                return _literal_arrow(parametros.get(nombre))
+            if nombre not in esquema.names:
+                nombre = index_col if nombre == 'index' else None
+            if nombre is None or nombre not in esquema.names:
+                return None
+            clase = _clase_arrow(esquema.field(nombre).type)
+            return (ds.field(nombre), clase, True) if clase is not None else None
+        if isinstance(nodo, ast.UnaryOp) and isinstance(nodo.op, ast.USub):
+            operando = self._operando_arrow(nodo.operand, esquema, parametros, index_col)
+            if operando is not None and operando[1] == 'numero':
+                return (ds.scalar(0) - operando[0], 'numero', operando[2])
+        if isinstance(nodo, ast.BinOp) and isinstance(nodo.op, (ast.Add, ast.Sub, ast.Mult)):
+            izquierda = self._operando_arrow(nodo.left, esquema, parametros, index_col)
+            derecha = self._operando_arrow(nodo.right, esquema, parametros, index_col)
+            if izquierda is not None and derecha is not None and izquierda[1] == derecha[1] == 'numero':
+                operar = _ARITMETICA[type(nodo.op)]
+                return (operar(izquierda[0], derecha[0]), 'numero', izquierda[2] or derecha[2])
+        return None
+
+    def _es_lista(self, nodo, parametros):
+        if isinstance(nodo, (ast.List, ast.Tuple)):
+            return True
+        return (isinstance(nodo, ast.Name) and self._nombre(nodo.id)[0] == 'parametro'
+                and isinstance(parametros.get(self._nombre(nodo.id)[1]), list))
+
+    def _comparacion_arrow(self, op, izquierda, derecha, nodo_izquierda, nodo_derecha, parametros):
+        if isinstance(op, (ast.Eq, ast.NotEq)):
+            # == y != con una lista son in y not in, con la lista a cualquiera de los dos lados
+            if self._es_lista(nodo_izquierda, parametros):
+                izquierda, nodo_derecha = derecha, nodo_izquierda
+            if self._es_lista(nodo_derecha, parametros):
+                op = ast.In() if isinstance(op, ast.Eq) else ast.NotIn()
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if izquierda is None or not izquierda[2]:
+                return None
+            if isinstance(nodo_derecha, (ast.List, ast.Tuple)):
+                valores = [e.value if isinstance(e, ast.Constant) else None for e in nodo_derecha.elts]
+            elif isinstance(nodo_derecha, ast.Name) and self._nombre(nodo_derecha.id)[0] == 'parametro':
+                valores = parametros.get(self._nombre(nodo_derecha.id)[1])
+                valores = list(valores) if isinstance(valores, (list, tuple, set, pd.Series, pd.Index)) else None
+            else:
+                return None
+            if not valores or any(_literal_arrow(v) is None or _literal_arrow(v)[1] != izquierda[1] for v in valores):
+                return None
+            pertenece = izquierda[0].isin(valores)
+            return pertenece if isinstance(op, ast.In) else ~pertenece | izquierda[0].is_null()
+        if izquierda is None or derecha is None or izquierda[1] != derecha[1] or not (izquierda[2] or derecha[2]):
+            return None
+        comparacion = _COMPARACIONES[type(op)](izquierda[0], derecha[0])
+        # Como en pandas, "distinto de" es True cuando hay nulos
+        return comparacion | comparacion.is_null() if isinstance(op, ast.NotEq) else comparacion
+
+    # Ejecución
+
+    def completar_parametros(self, parametros, marco):
+        """Añade a parametros los que falten, buscándolos entre las variables del marco de quien llama (como df.query())."""
+        parametros = dict(parametros)
+        for nombre in self.parametros - set(parametros):
+            if nombre in marco.f_locals:
+                parametros[nombre] = marco.f_locals[nombre]
+            elif nombre in marco.f_globals:
+                parametros[nombre] = marco.f_globals[nombre]
+        return parametros
+
+    def __call__(self, df, parametros):
+        """Evalúa la expresión sobre df y devuelve el resultado (normalmente una máscara booleana)."""
+        faltan = self.parametros - set(parametros)
+        if faltan:
+            raise UndefinedVariableError(sorted(faltan)[0], is_local = True)
+        if self.fuente_numexpr is not None and len(df) >= FILAS_NUMEXPR:
+            variables = self._variables_numexpr(df, parametros)
+            if variables is not None:
+                return numexpr.evaluate(self.fuente_numexpr, local_dict = variables)
+        return self._evaluar(df, parametros)
+
+
+def _literal_arrow(valor):
+    if isinstance(valor, bool):
+        return ds.scalar(valor), 'bool', False
+    if isinstance(valor, numbers.Real) and not pd.isna(valor):
+        return ds.scalar(valor), 'numero', False
+    if isinstance(valor, str):
+        return ds.scalar(valor), 'texto', False
+    if isinstance(valor, datetime.datetime) and not pd.isna(valor):
+        return ds.scalar(pa.scalar(pd.Timestamp(valor))), 'fecha', False
+    return None
+
+
+def _clase_arrow(tipo):
+    if pa.types.is_dictionary(tipo):
+        tipo = tipo.value_type
+    if pa.types.is_boolean(tipo):
+        return 'bool'
+    if pa.types.is_integer(tipo) or pa.types.is_floating(tipo):
+        return 'numero'
+    if pa.types.is_string(tipo) or pa.types.is_large_string(tipo):
+        return 'texto'
+    if pa.types.is_timestamp(tipo):
+        return 'fecha'
+    return None
+
+
+def _columna(df, nombre):
+    if nombre in df.columns:
+        return df[nombre]
+    if nombre == 'index' or nombre == df.index.name:
+        return df.index
+    raise UndefinedVariableError(nombre)
+
+
+def _pertenece(valores, lista):
+    if not isinstance(lista, (list, tuple, set, pd.Series, pd.Index)):
+        lista = [lista]
+    return valores.isin(lista)
+
+
+def _igual(a, b):
+    if isinstance(b, list):
+        return _pertenece(a, b)
+    if isinstance(a, list):
+        return _pertenece(b, a)
+    return a == b
+
+
+@functools.lru_cache(maxsize = TAMANO_CACHE_CONSULTAS)
+def _plan_normalizado(normalizada):
+    return PlanConsulta(normalizada)
+
+
+@functools.lru_cache(maxsize = TAMANO_CACHE_CONSULTAS)
+def compilar_consulta(expresion):
+    """Devuelve el PlanConsulta de la expresión. Las expresiones equivalentes (p.e. con otros espacios) comparten plan."""
+    return _plan_normalizado(_normalizar(expresion))
+
+
+def cached_query(df, expresion, /, **parametros):
+    """Igual que df.query(expresion), pero analizando cada expresión una sola vez.
+
+    Los parámetros con @ se pueden pasar por nombre (cached_query(df, '`Funded Amount` > @media', media = 1000));
+    si no, se buscan entre las variables de quien llama, como hace df.query().
+    """
+    plan = compilar_consulta(expresion)
+    parametros = plan.completar_parametros(parametros, sys._getframe(1))
+    if plan._evaluar is None:
+        return df.query(expresion, local_dict = parametros)
+
+    mascara = plan(df, parametros)
+    if getattr(mascara, 'dtype', None) == 'boolean':
+        mascara = mascara.fillna(False)
+    return df.loc[mascara]
+
+
+# Caché de resultados
+
+# Para saber si el dataframe ha cambiado guardamos una copia superficial (no copia los datos). Con Copy-on-Write (siempre activo en pandas 3)
+# cualquier escritura en el dataframe tiene que copiar antes los bloques de datos que comparte con esa copia,
+# así que basta con comprobar que el índice, las columnas y los bloques de datos siguen siendo los mismos objetos.
+# Sin Copy-on-Write, o si una versión de pandas deja de tener df._mgr.blocks (es interno), no hay huella y no se guarda nada.
+
+def _copy_on_write():
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True # en pandas 2 puede ser False, 'warn' o True
+    except KeyError: # pandas 1 no tiene la opción
+        return False
+
+
+def _huella(df):
+    bloques = getattr(getattr(df, '_mgr', None), 'blocks', None)
+    if bloques is None or not _copy_on_write():
+        return None
+    return df.index, getattr(df, 'columns', None), tuple(bloque.values for bloque in bloques)
+
+
+def _misma_huella(a, b):
+    if a is None or b is None: # sin huella no se puede comparar: solo es la misma si ninguna de las dos tiene
+        return a is b
+    return (a[0] is b[0] and a[1] is b[1] and len(a[2]) == len(b[2])
+            and all(x is y for x, y in zip(a[2], b[2])))
+
+
+def _tamano(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return int(resultado.memory_usage(deep = True).sum())
+    if isinstance(resultado, (pd.Series, pd.Index)):
+        return int(resultado.memory_usage(deep = True))
+    return getattr(resultado, 'nbytes', sys.getsizeof(resultado))
+
+
+def _sin_compartir(resultado):
+    # Con Copy-on-Write una copia superficial basta para que modificar el resultado devuelto no toque el guardado
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        return resultado.copy(deep = False)
+    if isinstance(resultado, np.ndarray): # arrays de numpy: vista de solo lectura
+        vista = resultado.view()
+        vista.flags.writeable = False
+        return vista
+    return resultado
+
+
+@functools.lru_cache(maxsize = TAMANO_CACHE_CONSULTAS)
+def _compilar_expresion(expresion):
+    # Código compilado, expresión normalizada (el árbol, así que los espacios no cuentan) y variables que usa
+    arbol = ast.parse(expresion.strip(), mode = 'eval')
+    nombres = sorted({nodo.id for nodo in ast.walk(arbol) if isinstance(nodo, ast.Name)} - {'df'})
+    return compile(arbol, '<cached_eval>', 'eval'), ast.dump(arbol), tuple(nombres)
+
+
+class CacheResultados:
+    """Guarda resultados de consultas sobre un dataframe y los descarta cuando el dataframe cambia.
+
+    Parámetros más importantes:
+
+    - df: el dataframe (la caché no lo mantiene vivo)
+    - maxsize: número máximo de resultados guardados
+    - max_bytes: memoria máxima que pueden ocupar los resultados (los que no caben no se guardan)
+
+    Atributos: version (sube cada vez que cambia el dataframe), aciertos, fallos y bytes.
+    Necesita Copy-on-Write (pandas 3, o pandas 2 con pd.options.mode.copy_on_write = True); sin él no guarda nada.
+    """
+
+    def __init__(self, df, maxsize = RESULTADOS_CACHE, max_bytes = BYTES_CACHE):
+        self._df = weakref.ref(df)
+        self.maxsize, self.max_bytes = maxsize, max_bytes
+        self.version, self.aciertos, self.fallos, self.bytes = 0, 0, 0, 0
+        self._resultados = collections.OrderedDict()
+        self._fotografiar(df)
+
+    def _fotografiar(self, df):
+        self._copia = df.copy(deep = False)
+        self._huella = _huella(df)
+
+    def _dataframe(self):
+        # El dataframe, invalidando la caché si ha cambiado desde la última consulta
+        df = self._df()
+        if df is None:
+            raise ReferenceError('el dataframe de la caché ya no existe')
+        if not _misma_huella(self._huella, _huella(df)):
+            self.invalidar()
+            self._fotografiar(df)
+        return df
+
+    def invalidar(self):
+        """Descarta todos los resultados (se hace solo al cambiar el dataframe)."""
+        self.version += 1
+        self._resultados.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._resultados)
+
+    def obtener(self, clave, calcular):
+        """Resultado guardado con esa clave o, si no está, calcular(df), que se guarda para la próxima vez."""
+        df = self._dataframe()
+        if clave in self._resultados:
+            self._resultados.move_to_end(clave)
+            self.aciertos += 1
+            return _sin_compartir(self._resultados[clave][0])
+
+        self.fallos += 1
+        if self._huella is None: # no se pueden detectar los cambios del dataframe
+            return calcular(df)
+        version = self.version
+        resultado = calcular(df)
+        tamano = _tamano(resultado)
+        if self._dataframe() is df and self.version == version and tamano <= self.max_bytes: # no guardar si calcular ha cambiado df
+            self._resultados[clave] = (resultado, tamano)
+            self.bytes += tamano
+            while len(self._resultados) > self.maxsize or self.bytes > self.max_bytes:
+                _, (_, liberados) = self._resultados.popitem(last = False)
+                self.bytes -= liberados
+        return _sin_compartir(resultado)
+
+    def __call__(self, expresion, /, **parametros):
+        return self._evaluar(expresion, parametros, sys._getframe(1))
+
+    def _evaluar(self, expresion, parametros, marco):
+        codigo, normalizada, nombres = _compilar_expresion(expresion)
+        variables = {}
+        for nombre in nombres: # como en df.query(), las variables que no se pasan se buscan entre las de quien llama
+            if nombre in parametros:
+                variables[nombre] = parametros[nombre]
+            elif nombre in marco.f_locals:
+                variables[nombre] = marco.f_locals[nombre]
+            elif nombre in marco.f_globals:
+                variables[nombre] = marco.f_globals[nombre]
+        evaluar = lambda df: eval(codigo, marco.f_globals, {**variables, 'df': df})
+        try:
+            clave = (normalizada, tuple(variables.items()))
+            hash(clave)
+        except TypeError: # con variables que no se pueden usar de clave (listas, otros dataframes...) no se guarda
+            return evaluar(self._dataframe())
+        return self.obtener(clave, evaluar)
+
+
+_CACHES = {}
+
+
+def cache_resultados(df, maxsize = RESULTADOS_CACHE, max_bytes = BYTES_CACHE):
+    """La CacheResultados de df (se crea la primera vez y desaparece con el dataframe)."""
+    cache = _CACHES.get(id(df))
+    if cache is None or cache._df() is not df:
+        cache = _CACHES[id(df)] = CacheResultados(df, maxsize, max_bytes)
+        weakref.finalize(df, _CACHES.pop, id(df), None)
+    return cache
+
+
+def cached_eval(df, expresion, /, **parametros):
+    """Evalúa la expresión de Python (con df como variable) guardando el resultado hasta que df cambie.
+
+    Por ejemplo: cached_eval(df, "df.Country.value_counts()") o cached_eval(df, "df.groupby('Sector')['Funded Amount'].agg(['count','mean'])").
+    Las variables que use la expresión forman parte de la clave; se pueden pasar por nombre o se buscan entre las de quien llama.
+    """
+    return cache_resultados(df)._evaluar(expresion, parametros, sys._getframe(1))
@@ -0,0 +1,572 @@
+# CARGA COMPARTIDA DE DATASETS
+
+# Todos los scripts del curso empiezan leyendo DataSetKivaCreditScoring.csv con pd.read_csv(..., sep = ';', parse_dates = [...]).
+# Con datasets grandes ese parseo del CSV (y sobre todo de las fechas ISO-8601) es lo que más tiempo consume de todo el análisis.
+
+# Aquí centralizamos la carga en una única función, load_kiva(), que:
+
+# - La primera vez lee el CSV y guarda una "foto" tipada en formato columnar (Parquet) en un directorio de caché
+# - Las siguientes veces lee directamente de esa foto, que ya tiene los tipos correctos y permite leer solo las columnas que necesitemos
+# - Si el CSV cambia (tamaño, fecha de modificación o contenido) la foto deja de ser válida y se regenera automáticamente
+
+# Además, con optimizar = True aplica un plan de tipos pensado para ocupar la mínima memoria (ver TIPOS_KIVA).
+
+import functools
+import hashlib
+import os
+import shutil
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError: # sin pyarrow no hay caché columnar y se lee siempre del CSV
+    pa = ds = pq = None
+
+RUTA_KIVA = 'DataSetKivaCreditScoring.csv'
+RUTA_IBEX35 = 'Historico_IBEX35_Diario.csv'
+FECHAS_KIVA = ['Funded Date','Paid Date']
+
+# Plan de tipos para reducir memoria. Se aplica en el propio read_csv, sin copias intermedias en object:
+
+# - category para las dimensiones con pocos valores distintos
+# - bool para Delinquent
+# - enteros y decimales de 32 bits para los importes (el máximo es de unos pocos miles)
+# - Name y Use se quedan en str, el tipo de texto por defecto: con pandas 3 ya va respaldado por Arrow, así que no hay
+#   nada que ahorrar, y category no compensa porque casi todos los valores de Use son distintos
+TIPOS_KIVA = {'id': 'int32',
+              'Funded Amount': 'int32',
+              'Country': 'category',
+              'Country Code': 'category',
+              'Loan Amount': 'int32',
+              'Paid Amount': 'float32',
+              'Activity': 'category',
+              'Sector': 'category',
+              'Delinquent': 'bool',
+              'Name': 'str',
+              'Use': 'str',
+              'Status': 'category'}
+
+DIRECTORIO_CACHE = '.cache_business_analytics'
+
+# Motores de lectura de CSV de todas las funciones load_*:
+
+# - 'c': el de pandas por defecto, usa un solo hilo
+# - 'pyarrow': el lector de Arrow, que reparte el parseo entre todos los núcleos
+MOTORES_CSV = ('c','pyarrow')
+
+# Si cambia la forma de construir la foto hay que subir la versión para invalidar las que ya existan
+VERSION_SNAPSHOT = 4
+
+# Registros por grupo de filas de la foto. Parquet guarda el mínimo y el máximo de cada columna por grupo,
+# así que con grupos más pequeños un filtro (p.e. por id o por fecha) puede saltarse más datos sin leerlos
+FILAS_POR_GRUPO = 100_000
+
+# Las fechas de Kiva vienen en ISO-8601 con la Z de UTC: 2005-03-31T06:27:55Z
+FORMATO_FECHAS_KIVA = 'ISO8601'
+
+# Tipo que da pandas a esas fechas (la unidad cambia entre versiones de pandas), para que todos los motores devuelvan lo mismo
+TIPO_FECHAS_KIVA = pd.to_datetime(pd.Index(['2005-03-31T06:27:55Z']), format = FORMATO_FECHAS_KIVA, utc = True).dtype
+
+# Bytes del principio y del final del archivo que entran en la huella
+_BLOQUE_HUELLA = 1 << 16
+
+
+def _comprobar_motor(engine):
+    if engine not in MOTORES_CSV:
+        raise ValueError(f'engine debe ser uno de {MOTORES_CSV}, no {engine!r}')
+    if engine == 'pyarrow' and pq is None:
+        raise ImportError("engine = 'pyarrow' necesita tener instalado pyarrow")
+
+
+def huella_archivo(ruta):
+    """Devuelve una huella del archivo a partir de su tamaño, fecha de modificación y contenido.
+
+    Para no tener que leer el archivo entero solo se resume el primer y el último bloque.
+    """
+    info = os.stat(ruta)
+    huella = hashlib.blake2b(digest_size = 12)
+    huella.update(f'{VERSION_SNAPSHOT}:{info.st_size}:{info.st_mtime_ns}'.encode())
+    with open(ruta, 'rb') as archivo:
+        huella.update(archivo.read(_BLOQUE_HUELLA))
+        if info.st_size > 2 * _BLOQUE_HUELLA:
+            archivo.seek(-_BLOQUE_HUELLA, os.SEEK_END)
+            huella.update(archivo.read())
+    return huella.hexdigest()
+
+
+def ruta_snapshot(ruta, directorio_cache = None, variante = 'original'):
+    """Ruta de la foto columnar que corresponde al estado actual del CSV.
+
+    Cada variante de tipos ('original' u 'optimizado') tiene su propia foto.
+    """
+    if directorio_cache is None:
+        directorio_cache = os.path.join(os.path.dirname(os.path.abspath(ruta)), DIRECTORIO_CACHE)
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    return os.path.join(directorio_cache, f'{nombre}.{variante}-{huella_archivo(ruta)}.parquet')
+
+
+# FECHAS REPETIDAS
+
+# Muchos préstamos se financian en lote, en el mismo segundo, así que la misma cadena de fecha se repite muchas veces.
+# parse_dates convierte cada registro por separado. Es mucho más rápido factorizar las cadenas (pd.factorize),
+# convertir solo los valores únicos y repartirlos después a cada registro según su código.
+
+class DateCache:
+    """Caché persistente de conversiones texto -> fecha para extracciones que se repiten.
+
+    Se guarda en un Parquet con las columnas texto y fecha. Si no se indica ruta solo vive en memoria.
+    """
+
+    def __init__(self, ruta = None):
+        self.ruta = ruta
+        self.fechas = None
+        self._pendiente = False
+        if ruta is not None and os.path.exists(ruta):
+            guardado = pd.read_parquet(ruta)
+            self.fechas = pd.Series(guardado['fecha'].to_numpy(), index = pd.Index(guardado['texto'], name = 'texto'))
+
+    def resolver(self, textos, formato = FORMATO_FECHAS_KIVA):
+        """Devuelve las fechas de unos textos únicos, convirtiendo solo los que no estén ya en la caché."""
+        textos = pd.Index(textos)
+        nuevos = textos if self.fechas is None else textos[self.fechas.index.get_indexer(textos) == -1]
+        if len(nuevos):
+            convertidos = pd.Series(pd.to_datetime(nuevos, format = formato, utc = True, errors = 'coerce'), index = nuevos)
+            self.fechas = convertidos if self.fechas is None else pd.concat([self.fechas, convertidos])
+            self._pendiente = True
+        return pd.DatetimeIndex(self.fechas.reindex(textos))
+
+    def guardar(self):
+        """Escribe la caché en su archivo si hay conversiones nuevas desde la última vez."""
+        if self.ruta is None or not self._pendiente:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok = True)
+        temporal = f'{self.ruta}.{os.getpid()}.tmp'
+        pd.DataFrame({'texto': self.fechas.index.astype(str), 'fecha': self.fechas.to_numpy()}).to_parquet(temporal, index = False)
+        os.replace(temporal, self.ruta)
+        self._pendiente = False
+
+
+def parse_unique_dates(textos, formato = FORMATO_FECHAS_KIVA, cache = None):
+    """Convierte una Series de textos a fechas (UTC) convirtiendo cada valor distinto una sola vez.
+
+    Los textos que no son fechas válidas quedan como NaT, como hacía parse_dates.
+
+    - cache: un DateCache (o la ruta de su archivo) para reutilizar conversiones entre cargas.
+      Si es una ruta se guarda al terminar; si es un DateCache lo guarda quien lo creó, llamando a guardar()
+    """
+    codigos, unicos = pd.factorize(textos)
+    if cache is None:
+        convertidos = pd.to_datetime(unicos, format = formato, utc = True, errors = 'coerce')
+    elif isinstance(cache, DateCache):
+        convertidos = cache.resolver(unicos, formato)
+    else:
+        cache = DateCache(cache)
+        convertidos = cache.resolver(unicos, formato)
+        cache.guardar()
+    fechas = pd.DatetimeIndex(convertidos).take(codigos, allow_fill = True, fill_value = pd.NaT)
+    return pd.Series(fechas, index = textos.index, name = textos.name)
+
+
+def read_kiva_csv(ruta = RUTA_KIVA, columns = None, optimizar = False, cache_fechas = None, engine = 'c'):
+    """Lectura directa del CSV de Kiva, sin pasar por la caché.
+
+    Con el motor 'c' las fechas se leen como texto y se convierten con parse_unique_dates().
+    Con 'pyarrow' es el propio Arrow quien reconoce las fechas ISO-8601 al leer, en paralelo, y solo ajustamos la unidad.
+    """
+    _comprobar_motor(engine)
+    fechas = [c for c in FECHAS_KIVA if columns is None or c in columns]
+    tipos = {}
+    if optimizar:
+        tipos = {c: t for c, t in TIPOS_KIVA.items() if columns is None or c in columns}
+
+    if engine == 'pyarrow':
+        df = pd.read_csv(ruta, sep = ';', usecols = columns, dtype = tipos or None, engine = engine)
+        pendientes = []
+        for columna in fechas:
+            if pd.api.types.is_datetime64_any_dtype(df[columna]):
+                df[columna] = df[columna].astype(TIPO_FECHAS_KIVA)
+            else:
+                pendientes.append(columna)
+    else:
+        tipos.update({c: 'str' for c in fechas})
+        df = pd.read_csv(ruta, sep = ';', usecols = columns, dtype = tipos, engine = engine)
+        pendientes = fechas
+
+    if pendientes and cache_fechas is not None and not isinstance(cache_fechas, DateCache):
+        cache_fechas = DateCache(cache_fechas)
+    for columna in pendientes:
+        df[columna] = parse_unique_dates(df[columna], cache = cache_fechas)
+    if pendientes and cache_fechas is not None:
+        cache_fechas.guardar()
+    return df
+
+
+def iter_kiva_csv(ruta = RUTA_KIVA, columns = None, chunksize = 100_000, optimizar = False, cache_fechas = None):
+    """Lee el CSV de Kiva por bloques de chunksize registros, con los mismos tipos que read_kiva_csv().
+
+    Con optimizar = True las categorías de cada bloque son solo las que aparecen en él: al juntar bloques hay que volver a pasar a category.
+    """
+    fechas = [c for c in FECHAS_KIVA if columns is None or c in columns]
+    tipos = {}
+    if optimizar:
+        tipos = {c: t for c, t in TIPOS_KIVA.items() if columns is None or c in columns}
+    tipos.update({c: 'str' for c in fechas})
+    if cache_fechas is not None and not isinstance(cache_fechas, DateCache):
+        cache_fechas = DateCache(cache_fechas)
+
+    # La caché se escribe una sola vez al terminar (o al dejar de iterar), no con cada bloque
+    try:
+        for bloque in pd.read_csv(ruta, sep = ';', usecols = columns, dtype = tipos, chunksize = chunksize):
+            for columna in fechas:
+                bloque[columna] = parse_unique_dates(bloque[columna], cache = cache_fechas)
+            yield bloque
+    finally:
+        if cache_fechas is not None:
+            cache_fechas.guardar()
+
+
+def _guardar_snapshot(df, destino):
+    # Escribimos en un temporal y renombramos para que otro proceso nunca lea una foto a medias
+    os.makedirs(os.path.dirname(destino), exist_ok = True)
+    temporal = f'{destino}.{os.getpid()}.tmp'
+    df.to_parquet(temporal, index = False, row_group_size = FILAS_POR_GRUPO)
+    os.replace(temporal, destino)
+
+    # Borramos las fotos antiguas del mismo CSV, ya no son válidas
+    prefijo = os.path.basename(destino).rsplit('-', 1)[0] + '-'
+    directorio = os.path.dirname(destino)
+    for nombre in os.listdir(directorio):
+        if nombre.startswith(prefijo) and nombre.endswith('.parquet') and nombre != os.path.basename(destino):
+            os.remove(os.path.join(directorio, nombre))
+
+
+def kiva_snapshot(ruta = RUTA_KIVA, directorio_cache = None, optimizar = False, cache_fechas = None, engine = 'c'):
+    """Devuelve la ruta de la foto columnar de Kiva, creándola si todavía no existe para el estado actual del CSV."""
+    if pq is None:
+        raise ImportError('La foto columnar necesita pyarrow')
+    destino = ruta_snapshot(ruta, directorio_cache, 'optimizado' if optimizar else 'original')
+    if not os.path.exists(destino):
+        _guardar_snapshot(read_kiva_csv(ruta, optimizar = optimizar, cache_fechas = cache_fechas, engine = engine), destino)
+    return destino
+
+
+def load_kiva(ruta = RUTA_KIVA, columns = None, index_col = 'id', cache = True, directorio_cache = None,
+              optimizar = False, cache_fechas = None, engine = 'c'):
+    """Carga el dataset de Kiva con las fechas ya parseadas.
+
+    Parámetros más importantes:
+
+    - columns: lista de columnas a leer (la del índice se añade sola). Por defecto todas
+    - index_col: variable a usar como índice ('id' por defecto, None para no poner ninguna)
+    - cache: si usar la foto columnar (se crea la primera vez)
+    - directorio_cache: dónde guardar las fotos, por defecto junto al CSV
+    - optimizar: aplicar el plan de tipos TIPOS_KIVA para reducir memoria
+    - cache_fechas: ruta (o DateCache) de la caché persistente de fechas, útil cuando hay que leer el CSV
+    - engine: motor de lectura del CSV (ver MOTORES_CSV)
+    """
+    columnas = None
+    if columns is not None:
+        columnas = list(columns)
+        if index_col is not None and index_col not in columnas:
+            columnas.insert(0, index_col)
+
+    if not cache or pq is None:
+        df = read_kiva_csv(ruta, columnas, optimizar, cache_fechas, engine)
+        if columnas is not None:
+            df = df[columnas]
+    else:
+        destino = kiva_snapshot(ruta, directorio_cache, optimizar, cache_fechas, engine)
+        df = pd.read_parquet(destino, columns = columnas)
+
+    if index_col is not None:
+        df = df.set_index(index_col)
+    return df
+
+
+# DATASET PARTICIONADO POR FECHA
+
+# En series temporales casi siempre consultamos un periodo concreto (dfs.loc['2007'], dfs.loc['2007-03-01':'2007-03-15']...).
+# Si guardamos Kiva partido en carpetas por año y mes de Funded Date (anio=2007/mes=3/...) podemos leer solo las carpetas del periodo pedido
+# en lugar de cargar todo el histórico y filtrar después.
+
+COLUMNAS_PARTICION = ['anio','mes']
+
+
+def _esquema_particion():
+    return ds.partitioning(pa.schema([('anio', pa.int16()), ('mes', pa.int8())]), flavor = 'hive')
+
+
+def ruta_particionado(ruta = RUTA_KIVA, directorio_cache = None, variante = 'original'):
+    """Directorio del dataset particionado que corresponde a un CSV y a una variante de tipos."""
+    if directorio_cache is None:
+        directorio_cache = os.path.join(os.path.dirname(os.path.abspath(ruta)), DIRECTORIO_CACHE)
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    return os.path.join(directorio_cache, f'{nombre}.{variante}.particionado')
+
+
+def write_kiva_partitioned(ruta = RUTA_KIVA, destino = None, optimizar = False):
+    """Escribe Kiva como dataset Parquet particionado por año y mes de Funded Date.
+
+    Los registros sin Funded Date van a la partición por defecto de Hive. Devuelve el directorio destino.
+    """
+    if pq is None:
+        raise ImportError('El dataset particionado necesita pyarrow')
+    if destino is None:
+        destino = ruta_particionado(ruta, variante = 'optimizado' if optimizar else 'original')
+
+    df = load_kiva(ruta, index_col = None, optimizar = optimizar)
+    df['anio'] = df['Funded Date'].dt.year.astype('Int16')
+    df['mes'] = df['Funded Date'].dt.month.astype('Int8')
+
+    # Escribimos en un directorio temporal y lo cambiamos por el anterior entero: si el CSV ha cambiado,
+    # los meses que ya no tienen préstamos no pueden quedarse con particiones antiguas
+    temporal = f'{destino}.{os.getpid()}.tmp'
+    shutil.rmtree(temporal, ignore_errors = True)
+    ds.write_dataset(pa.Table.from_pandas(df, preserve_index = False), temporal,
+                     format = 'parquet',
+                     partitioning = _esquema_particion())
+
+    # Guardamos la huella del CSV de origen para saber si el dataset está al día
+    with open(os.path.join(temporal, '_huella'), 'w') as archivo:
+        archivo.write(huella_archivo(ruta) + ('-optimizado' if optimizar else ''))
+    shutil.rmtree(destino, ignore_errors = True)
+    os.replace(temporal, destino)
+    return destino
+
+
+def _limite(fecha, final):
+    # Igual que el indexado parcial de pandas: '2007-03' como final incluye todo marzo
+    if isinstance(fecha, str):
+        periodo = pd.Period(fecha)
+        fecha = periodo.end_time if final else periodo.start_time
+    fecha = pd.Timestamp(fecha)
+    return fecha.tz_localize('UTC') if fecha.tz is None else fecha.tz_convert('UTC')
+
+
+def _filtro_meses(desde, hasta):
+    # Expresión sobre las columnas de partición, que es lo que permite descartar carpetas sin abrirlas
+    anio, mes = ds.field('anio'), ds.field('mes')
+    filtro = None
+    if desde is not None:
+        filtro = (anio > desde.year) | ((anio == desde.year) & (mes >= desde.month))
+    if hasta is not None:
+        hasta_filtro = (anio < hasta.year) | ((anio == hasta.year) & (mes <= hasta.month))
+        filtro = hasta_filtro if filtro is None else filtro & hasta_filtro
+    return filtro
+
+
+def load_kiva_range(desde = None, hasta = None, columns = None, index_col = 'id', ruta = RUTA_KIVA,
+                    destino = None, optimizar = False):
+    """Carga solo los préstamos con Funded Date dentro de [desde, hasta], leyendo únicamente las particiones necesarias.
+
+    Parámetros más importantes:
+
+    - desde, hasta: límites del periodo (incluidos). En texto funcionan como en dfs.loc['2007-03-01':'2007-03-15']
+    - columns, index_col: como en load_kiva()
+    - destino: directorio del dataset particionado. Si no existe o el CSV ha cambiado se regenera
+
+    Devuelve los registros ordenados por Funded Date.
+    """
+    if destino is None:
+        destino = ruta_particionado(ruta, variante = 'optimizado' if optimizar else 'original')
+    esperada = huella_archivo(ruta) + ('-optimizado' if optimizar else '')
+    marca = os.path.join(destino, '_huella')
+    actual = None
+    if os.path.exists(marca):
+        with open(marca) as archivo:
+            actual = archivo.read()
+    if actual != esperada:
+        write_kiva_partitioned(ruta, destino, optimizar)
+
+    desde = None if desde is None else _limite(desde, final = False)
+    hasta = None if hasta is None else _limite(hasta, final = True)
+
+    dataset = ds.dataset(destino, format = 'parquet', partitioning = _esquema_particion(),
+                         exclude_invalid_files = True)
+    filtro = _filtro_meses(desde, hasta)
+    tipo_fecha = dataset.schema.field('Funded Date').type
+    if desde is not None:
+        filtro = filtro & (ds.field('Funded Date') >= pa.scalar(desde, type = tipo_fecha))
+    if hasta is not None:
+        filtro = filtro & (ds.field('Funded Date') <= pa.scalar(hasta, type = tipo_fecha))
+
+    columnas = None
+    if columns is not None:
+        columnas = list(columns)
+        for necesaria in [index_col, 'Funded Date']:
+            if necesaria is not None and necesaria not in columnas:
+                columnas.append(necesaria)
+    else:
+        columnas = [c for c in dataset.schema.names if c not in COLUMNAS_PARTICION]
+
+    df = dataset.to_table(columns = columnas, filter = filtro).to_pandas()
+    df = df.sort_values('Funded Date', kind = 'stable', ignore_index = True)
+    if columns is not None:
+        df = df[[c for c in columnas if c in columns or c == index_col]]
+    if index_col is not None:
+        df = df.set_index(index_col)
+    return df
+
+
+# HISTÓRICOS DE COTIZACIONES (FORMATO INVESTING.COM)
+
+# Los históricos que se descargan de Investing.com en español vienen con:
+
+# - fechas dd.mm.aaaa
+# - números con punto de miles y coma decimal: 9.632,00
+# - volumen con sufijo de escala: 163,33M
+# - variación en porcentaje: -0,50%
+# - guiones cuando no hay dato
+
+# En lugar de ir limpiando columna a columna con str.replace(...).astype(float) lo hacemos todo de una vez y de forma vectorizada.
+
+ESCALAS_SUFIJO = {'K': 1e3, 'M': 1e6, 'B': 1e9, '%': 1.0}
+
+
+def _a_numero(texto, miles, decimal):
+    # Separamos el sufijo (K/M/B/%) del número, normalizamos los separadores y multiplicamos por la escala
+    texto = texto.str.strip()
+    sufijo = texto.str[-1:]
+    escala = sufijo.map(ESCALAS_SUFIJO)
+    numero = texto.where(escala.isna(), texto.str[:-1])
+    numero = numero.str.replace(miles, '', regex = False).str.replace(decimal, '.', regex = False)
+    return pd.to_numeric(numero, errors = 'coerce').astype('float64') * escala.fillna(1.0).astype('float64')
+
+
+def read_investing_csv(ruta, columna_fecha = 'Fecha', formato_fecha = '%d.%m.%Y', miles = '.', decimal = ',',
+                       na_values = ('-',), engine = 'c'):
+    """Lee un histórico de cotizaciones con formato Investing.com.
+
+    Devuelve todas las columnas en float64 (el volumen ya escalado según su sufijo K/M/B y los porcentajes en puntos porcentuales)
+    con la fecha como índice y ordenado en ascendente.
+    """
+    _comprobar_motor(engine)
+    crudo = pd.read_csv(ruta, dtype = str, na_values = list(na_values), keep_default_na = False,
+                        encoding = 'utf-8-sig', engine = engine)
+    fecha = pd.to_datetime(crudo.pop(columna_fecha), format = formato_fecha)
+    df = pd.DataFrame({columna: _a_numero(crudo[columna], miles, decimal) for columna in crudo.columns})
+    df.index = pd.DatetimeIndex(fecha, name = columna_fecha)
+    return df.sort_index()
+
+
+def load_ibex35(ruta = RUTA_IBEX35, engine = 'c'):
+    """Carga el histórico diario del IBEX35."""
+    return read_investing_csv(ruta, engine = engine)
+
+
+# ACCIDENTES DE TRÁFICO DE MADRID
+
+# El CSV de accidentalidad del Ayuntamiento trae las cabeceras en mayúsculas y dos columnas vacías al final.
+# Antes lo leíamos dos veces (una para verlo y otra con names = cabecera), quitábamos las columnas vacías y después corregíamos tipos y nulos.
+# load_accidents() hace todo eso en una sola lectura, sin pasar por copias intermedias en object.
+
+RUTA_ACCIDENTES = '2020_Accidentalidad.csv'
+
+CABECERA_ACCIDENTES = ['expediente', 'fecha', 'hora', 'calle', 'numero', 'distrito', 'tipo_accidente', 'tiempo',
+                       'vehiculo', 'persona', 'edad', 'sexo', 'lesividad', 'unamed1', 'unamed2']
+
+TIPOS_ACCIDENTES = {'distrito': 'category',
+                    'tipo_accidente': 'category',
+                    'tiempo': 'category',
+                    'vehiculo': 'category',
+                    'persona': 'category',
+                    'edad': 'category',
+                    'sexo': 'category'}
+
+# Variables en las que los nulos pasan a ser una categoría más
+DESCONOCIDO_ACCIDENTES = ['sexo','tiempo']
+
+
+def load_accidents(ruta = RUTA_ACCIDENTES, eliminar_sin_ubicacion = True, engine = 'c', **kwargs):
+    """Carga el dataset de accidentes de Madrid ya limpio.
+
+    - renombra las columnas con CABECERA_ACCIDENTES y descarta las dos vacías
+    - aplica los tipos de TIPOS_ACCIDENTES y parsea la fecha (día primero)
+    - los nulos de sexo y tiempo pasan a la categoría 'Desconocido' y los de lesividad a 0
+    - con eliminar_sin_ubicacion elimina los registros sin numero o sin distrito
+    - engine: motor de lectura del CSV (ver MOTORES_CSV)
+    """
+    _comprobar_motor(engine)
+    columnas = [c for c in CABECERA_ACCIDENTES if not c.startswith('unamed')]
+    if engine == 'c':
+        df = pd.read_csv(ruta, sep = ';', header = 0, names = CABECERA_ACCIDENTES, usecols = columnas,
+                         dtype = TIPOS_ACCIDENTES, parse_dates = ['fecha'], dayfirst = True, **kwargs)
+    else:
+        # El lector de Arrow no admite names junto con usecols ni fechas con el día primero:
+        # renombramos por posición y convertimos tipos y fecha después de leer
+        df = pd.read_csv(ruta, sep = ';', engine = engine, **kwargs)
+        df.columns = CABECERA_ACCIDENTES[:len(df.columns)]
+        df = df[columnas].astype(TIPOS_ACCIDENTES)
+        df['fecha'] = pd.to_datetime(df['fecha'], dayfirst = True)
+
+    if eliminar_sin_ubicacion:
+        df = df.dropna(subset = ['numero','distrito'])
+
+    for columna in DESCONOCIDO_ACCIDENTES:
+        categoria = df[columna]
+        if 'Desconocido' not in categoria.cat.categories:
+            categoria = categoria.cat.add_categories('Desconocido')
+        df[columna] = categoria.fillna('Desconocido')
+    df['lesividad'] = df['lesividad'].fillna(0)
+    return df
+
+
+# NOMBRES DE COLUMNAS
+
+# Las hojas de datos públicas (p.e. Renfe_rrhh.csv) traen cabeceras con mayúsculas, espacios, paréntesis, acentos y %.
+# En lugar de encadenar un str.replace por cada carácter hacemos una única traducción con str.translate().
+# Y como los mismos archivos se cargan una y otra vez, guardamos la traducción de cada cabecera completa (lru_cache).
+
+# NOTA: la ü y la ñ se mantienen a propósito, hay análisis que usan nombres como 'antigüedad_media_de_los_empleados_hombres__años'
+
+TRADUCCION_COLUMNAS = str.maketrans({' ': '_',
+                                     '(': None,
+                                     ')': None,
+                                     '-': None,
+                                     '–': None,
+                                     'á': 'a',
+                                     'é': 'e',
+                                     'í': 'i',
+                                     'ó': 'o',
+                                     'ú': 'u',
+                                     '%': 'percent'})
+
+
+@functools.lru_cache(maxsize = 256)
+def _limpiar_cabecera(cabecera):
+    return tuple(str(columna).lower().translate(TRADUCCION_COLUMNAS) for columna in cabecera)
+
+
+def clean_column_names(df):
+    """Normaliza los nombres de las columnas: minúsculas, espacios a _, sin paréntesis ni guiones, sin tildes y % como percent.
+
+    Modifica df y lo devuelve, para poder encadenarlo.
+    """
+    df.columns = _limpiar_cabecera(tuple(df.columns))
+    return df
+
+
+RUTA_RENFE_RRHH = 'Renfe_rrhh.csv'
+
+
+def load_renfe_rrhh(ruta = RUTA_RENFE_RRHH, engine = 'c'):
+    """Carga el dataset de recursos humanos de Renfe con los nombres de columnas ya limpios."""
+    _comprobar_motor(engine)
+    return clean_column_names(pd.read_csv(ruta, delimiter = ';', decimal = ',', engine = engine))
+
+
+def memory_report(antes, despues):
+    """Compara la memoria por columna (memory_usage(deep = True)) de dos versiones del mismo dataframe.
+
+    Devuelve una tabla en KB con el tipo y la memoria antes y después, el ahorro y una fila de Total.
+    """
+    memoria = pd.DataFrame({'tipo_antes': antes.dtypes.astype(str),
+                            'tipo_despues': despues.dtypes.astype(str),
+                            'kb_antes': antes.memory_usage(deep = True, index = False) / 1024,
+                            'kb_despues': despues.memory_usage(deep = True, index = False) / 1024})
+    memoria.loc['Total', ['kb_antes','kb_despues']] = memoria[['kb_antes','kb_despues']].sum()
+    memoria['ahorro_%'] = (1 - memoria.kb_despues / memoria.kb_antes) * 100
+    return memoria.round(1)
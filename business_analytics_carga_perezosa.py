@@ -0,0 +1,369 @@
+# CARGA PEREZOSA (LAZY)
+
+# Muchas consultas solo usan dos o tres variables de Kiva (p.e. Funded Date, Country y Loan Amount), pero cargamos siempre las 14,
+# incluidos los textos largos de Name y Use, que son los que más ocupan.
+
+# La idea de la carga perezosa es no leer nada hasta que haga falta:
+
+# - lazy_kiva() devuelve un LazyFrame, que se usa igual que un dataframe pero que solo va apuntando las operaciones que le pedimos
+# - con esas operaciones va anotando qué columnas se mencionan (df.Country, df['Loan Amount'], groupby('Sector'), query('`Funded Amount` > 1000')...)
+# - al materializar (collect(), print, len...) lee de la foto columnar solo esas columnas y repite las operaciones sobre ellas
+
+# Solo se lee un subconjunto si el resultado final ya no es el dataframe completo, es decir, si en algún momento se seleccionan columnas
+# (df['Country'], df[['Country','Sector']], df.loc[filtro, ['Country']], df.Country, o un agg con agregaciones con nombre).
+# Si no, p.e. en df.loc[df.Country == 'Kenya'], el resultado tiene que llevar todas las columnas y se cargan todas.
+
+# Tampoco se recorta si alguna operación recibe una función (p.e. una lambda en apply o filter), porque no sabemos qué columnas usa por dentro.
+
+# FILTROS EN LA LECTURA (PREDICATE PUSHDOWN)
+
+# Igual que con las columnas, si lo primero que hacemos es un query() no hace falta leer todos los registros para luego quedarnos con unos pocos.
+# scan_kiva() recibe la consulta y las columnas y las aplica al leer:
+
+# - de la foto Parquet: traduce la consulta a un filtro de Arrow, que usa el mínimo y el máximo de cada grupo de filas para no leer los que no pueden cumplirla
+# - del CSV: lo lee por bloques y filtra cada bloque antes de leer el siguiente, así en memoria solo se queda lo seleccionado
+
+# En un LazyFrame se hace solo: lazy_kiva().query('Sector == "Food"')[['Funded Date','Sector']] lee únicamente esos registros y esas columnas.
+
+import re
+import sys
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # sin pyarrow no hay foto columnar y se lee el CSV por bloques
+    pa = pq = None
+
+from business_analytics_cache_consultas import cached_query, compilar_consulta
+from business_analytics_carga import RUTA_KIVA, TIPOS_KIVA, iter_kiva_csv, kiva_snapshot
+
+# Operaciones que pueden ir antes de seleccionar columnas sin que el resultado dependa de las columnas que no se usan
+_OPERACIONES_POR_FILAS = {'loc','iloc','query','groupby','sort_values','sort_index','set_index','reset_index',
+                          'head','tail','nlargest','nsmallest','sample','assign'}
+
+# Nombres de variables dentro de una expresión de query/eval: entre acentos inversos o identificadores simples
+_NOMBRES_EXPRESION = re.compile(r'`([^`]+)`|([A-Za-z_][A-Za-z0-9_]*)')
+
+# Variables de quien llama dentro de una expresión de query/eval: @media
+_VARIABLES_EXPRESION = re.compile(r'@([A-Za-z_][A-Za-z0-9_]*)')
+
+
+class LazyFrame:
+    """Dataframe diferido: apunta operaciones y columnas usadas, y solo lee esas columnas al materializar.
+
+    Normalmente se crea con lazy_kiva().
+    """
+
+    def __init__(self, origen, pasos = ()):
+        self._origen = origen
+        self._pasos = tuple(pasos)
+
+    # Registro de operaciones
+
+    def _con(self, paso):
+        return LazyFrame(self._origen, self._pasos + (paso,))
+
+    def __getattr__(self, nombre):
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return self._con(('atributo', nombre))
+
+    def __getitem__(self, clave):
+        return self._con(('indexar', clave))
+
+    def __call__(self, *args, **kwargs):
+        if self._pasos and self._pasos[-1] in (('atributo', 'query'), ('atributo', 'eval')) and args and isinstance(args[0], str):
+            # Las variables con @ se buscan ahora entre las de quien llama: al materializar estaríamos en otro marco
+            variables = {}
+            marco = sys._getframe(1)
+            for nombre in _VARIABLES_EXPRESION.findall(args[0]):
+                if nombre in marco.f_locals:
+                    variables[nombre] = marco.f_locals[nombre]
+                elif nombre in marco.f_globals:
+                    variables[nombre] = marco.f_globals[nombre]
+            if variables:
+                kwargs = {**kwargs, 'local_dict': {**variables, **kwargs.get('local_dict', {})}}
+        return self._con(('llamar', args, kwargs))
+
+    __hash__ = None
+
+    # Columnas necesarias
+
+    def columnas_necesarias(self):
+        """Columnas que hay que leer para materializar (None si hacen falta todas)."""
+        disponibles = self._origen.columnas
+        if not self._selecciona_columnas(disponibles):
+            return None
+        usadas = set()
+        for paso in self._pasos:
+            if not self._recoger(paso, disponibles, usadas):
+                return None
+        return [c for c in disponibles if c in usadas]
+
+    def _selecciona_columnas(self, disponibles):
+        # True si la cadena de operaciones se queda con algunas columnas antes de hacer nada que dependa de todas
+        # (p.e. df.dropna()['Country'] no se puede recortar: dropna mira todas las columnas)
+        es_columna = lambda c: isinstance(c, str) and c in disponibles
+        es_lista = lambda c: isinstance(c, list) and len(c) > 0 and all(es_columna(x) for x in c)
+        for posicion, paso in enumerate(self._pasos):
+            if paso[0] == 'atributo':
+                if es_columna(paso[1]):
+                    return True
+                if paso[1] in ('agg','aggregate'):
+                    # agg(nombre = ('variable','estadistico'), ...) solo usa las variables que nombra
+                    siguiente = self._pasos[posicion + 1] if posicion + 1 < len(self._pasos) else None
+                    return (siguiente is not None and siguiente[0] == 'llamar' and not siguiente[1] and len(siguiente[2]) > 0
+                            and all(isinstance(v, tuple) and len(v) == 2 and es_columna(v[0]) for v in siguiente[2].values()))
+                if paso[1] not in _OPERACIONES_POR_FILAS:
+                    return False
+            elif paso[0] == 'indexar':
+                clave = paso[1]
+                if isinstance(clave, tuple) and len(clave) == 2:
+                    clave = clave[1]
+                if es_columna(clave) or es_lista(clave):
+                    return True
+        return False
+
+    def _recoger(self, paso, disponibles, usadas):
+        # Devuelve False si no podemos saber las columnas (hay una función de por medio)
+        # Las variables de local_dict (las @ de query/eval) son valores, no columnas
+        pendientes = [paso[1]] if paso[0] != 'llamar' else list(paso[1]) + [v for k, v in paso[2].items() if k != 'local_dict']
+        while pendientes:
+            valor = pendientes.pop()
+            if isinstance(valor, LazyFrame):
+                if valor._origen is not self._origen:
+                    raise ValueError('No se pueden combinar LazyFrame de orígenes distintos')
+                for paso_interno in valor._pasos:
+                    if not self._recoger(paso_interno, disponibles, usadas):
+                        return False
+            elif callable(valor):
+                return False
+            elif isinstance(valor, str):
+                if valor in disponibles:
+                    usadas.add(valor)
+                else:
+                    # Puede ser una expresión de query()/eval()
+                    for entre_acentos, simple in _NOMBRES_EXPRESION.findall(valor):
+                        nombre = entre_acentos or simple
+                        if nombre in disponibles:
+                            usadas.add(nombre)
+            elif isinstance(valor, dict):
+                pendientes.extend(valor.keys())
+                pendientes.extend(valor.values())
+            elif isinstance(valor, (list, tuple, set, frozenset, slice)):
+                pendientes.extend([valor.start, valor.stop, valor.step] if isinstance(valor, slice) else valor)
+        return True
+
+    # Materialización
+
+    def collect(self):
+        """Lee las columnas (y los registros) necesarios y ejecuta las operaciones apuntadas."""
+        consultas, parametros = self._consultas_y_parametros()
+        base = self._origen.cargar(self.columnas_necesarias(), consultas, parametros)
+        return self._ejecutar(base)
+
+    def consultas_iniciales(self):
+        """Expresiones de los query() con los que empieza la cadena, que se pueden aplicar ya al leer."""
+        return self._consultas_y_parametros()[0]
+
+    def _consultas_y_parametros(self):
+        consultas, parametros = [], {}
+        for posicion in range(0, len(self._pasos) - 1, 2):
+            paso, llamada = self._pasos[posicion], self._pasos[posicion + 1]
+            if paso != ('atributo', 'query') or llamada[0] != 'llamar' or set(llamada[2]) - {'local_dict'} or len(llamada[1]) != 1:
+                break
+            if not isinstance(llamada[1][0], str):
+                break
+            # Las variables con @ van con los valores apuntados; si falta alguna o dos consultas usan el mismo nombre
+            # con valores distintos, esa consulta ya no se adelanta
+            variables = llamada[2].get('local_dict', {})
+            nombres = _VARIABLES_EXPRESION.findall(llamada[1][0])
+            if any(n not in variables or (n in parametros and parametros[n] is not variables[n]) for n in nombres):
+                break
+            parametros.update({n: variables[n] for n in nombres})
+            consultas.append(llamada[1][0])
+        return consultas, parametros
+
+    def _ejecutar(self, base):
+        resolver = lambda valor: self._resolver(valor, base)
+        resultado = base
+        for paso in self._pasos:
+            if paso[0] == 'atributo':
+                resultado = getattr(resultado, paso[1])
+            elif paso[0] == 'indexar':
+                resultado = resultado[resolver(paso[1])]
+            else:
+                args = [resolver(a) for a in paso[1]]
+                kwargs = {k: resolver(v) for k, v in paso[2].items()}
+                resultado = resultado(*args, **kwargs)
+        return resultado
+
+    def _resolver(self, valor, base):
+        # Las expresiones diferidas que van dentro de otra (p.e. df.loc[df.Country == 'Kenya']) se evalúan sobre la misma base
+        if isinstance(valor, LazyFrame):
+            return valor._ejecutar(base)
+        if isinstance(valor, tuple):
+            return tuple(self._resolver(v, base) for v in valor)
+        return valor
+
+    def __repr__(self):
+        return repr(self.collect())
+
+    def _repr_html_(self):
+        resultado = self.collect()
+        return resultado._repr_html_() if hasattr(resultado, '_repr_html_') else None
+
+    def __len__(self):
+        return len(self.collect())
+
+    def __iter__(self):
+        return iter(self.collect())
+
+    def __bool__(self):
+        return bool(self.collect())
+
+    def __float__(self):
+        return float(self.collect())
+
+    def __int__(self):
+        return int(self.collect())
+
+
+def _operador(nombre):
+    def operar(self, *args):
+        return self._con(('atributo', nombre))._con(('llamar', args, {}))
+    operar.__name__ = nombre
+    return operar
+
+
+# Los operadores (comparaciones, &, |, ~, aritmética) también se apuntan, para poder escribir filtros como df.loc[df['Loan Amount'] > 1000]
+for _nombre in ['__eq__','__ne__','__lt__','__le__','__gt__','__ge__',
+                '__and__','__or__','__xor__','__invert__','__neg__','__abs__',
+                '__add__','__sub__','__mul__','__truediv__','__floordiv__','__mod__','__pow__',
+                '__radd__','__rsub__','__rmul__','__rtruediv__']:
+    setattr(LazyFrame, _nombre, _operador(_nombre))
+
+
+class _OrigenKiva:
+    # Sabe qué columnas hay en la foto columnar (o en el CSV si no hay pyarrow) y cómo leer un subconjunto de ellas
+
+    def __init__(self, ruta, index_col, optimizar):
+        self.ruta = ruta
+        self.index_col = index_col
+        self.optimizar = optimizar
+        if pq is None:
+            self.snapshot = None
+            nombres = pd.read_csv(ruta, sep = ';', nrows = 0).columns
+        else:
+            self.snapshot = kiva_snapshot(ruta, optimizar = optimizar)
+            nombres = pq.read_schema(self.snapshot).names
+        self.columnas = [c for c in nombres if c != index_col]
+
+    def cargar(self, columnas, consultas = (), parametros = None):
+        if consultas:
+            # El query se vuelve a ejecutar después sobre estos registros, que ya lo cumplen todos
+            consulta = ' and '.join(f'({c})' for c in consultas)
+            return scan_kiva(consulta, columnas, self.ruta, self.index_col, optimizar = self.optimizar, **(parametros or {}))
+        if self.snapshot is None:
+            return scan_kiva(None, columnas, self.ruta, self.index_col, optimizar = self.optimizar)
+        if columnas is not None and self.index_col is not None:
+            columnas = [self.index_col] + columnas
+        df = pd.read_parquet(self.snapshot, columns = columnas)
+        return df.set_index(self.index_col) if self.index_col is not None else df
+
+
+def lazy_kiva(ruta = RUTA_KIVA, index_col = 'id', optimizar = False):
+    """Versión perezosa de load_kiva(): solo lee de la foto columnar las columnas que use el análisis.
+
+    Por ejemplo:
+
+    df = lazy_kiva()
+    df.groupby('Country')['Loan Amount'].mean().collect() # lee solo id, Country y Loan Amount
+    """
+    return LazyFrame(_OrigenKiva(ruta, index_col, optimizar))
+
+
+def _poner_indice(df, index_col):
+    if index_col is None:
+        return df
+    tipo = df[index_col].dtype
+    df = df.set_index(index_col)
+    # set_index pasa a int64 los enteros consecutivos (p.e. los id de 50 < index < 100)
+    if df.index.dtype != tipo:
+        df.index = df.index.astype(tipo)
+    return df
+
+
+def _leer_parquet(ruta, columnas, filtro):
+    if filtro is not None:
+        try:
+            return pd.read_parquet(ruta, columns = columnas, filters = filtro)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            pass # p.e. tipos que Arrow no sabe comparar: se lee todo y se filtra después
+    return pd.read_parquet(ruta, columns = columnas)
+
+
+def scan_kiva(consulta = None, columns = None, ruta = RUTA_KIVA, index_col = 'id', formato = 'parquet',
+              chunksize = 100_000, optimizar = False, **parametros):
+    """Carga de Kiva solo los registros que cumplen la consulta y solo las columnas pedidas, aplicando ambas cosas al leer.
+
+    Parámetros más importantes:
+
+    - consulta: expresión con la misma sintaxis que df.query() (None para no filtrar)
+    - columns: columnas que queremos en el resultado (None para todas)
+    - formato: 'parquet' para leer de la foto columnar o 'csv' para leer el CSV por bloques (sin pyarrow siempre se lee el CSV)
+    - chunksize: registros por bloque al leer el CSV
+    - el resto de parámetros son las variables con @ de la consulta; las que no se pasen se buscan entre las variables de quien llama
+
+    Por ejemplo, el equivalente de load_kiva().query('50 < index < 100')[['Funded Date','Sector']] sería:
+
+    scan_kiva('50 < index < 100', ['Funded Date','Sector'])
+    """
+    if formato not in ('parquet','csv'):
+        raise ValueError("formato debe ser 'parquet' o 'csv'")
+    plan = compilar_consulta(consulta) if consulta is not None else None
+    if plan is not None:
+        parametros = plan.completar_parametros(parametros, sys._getframe(1))
+
+    lectura = None
+    if columns is not None:
+        # Hay que leer también las columnas que usa la consulta y la del índice
+        lectura = list(dict.fromkeys(([index_col] if index_col is not None else []) + list(columns)
+                                     + sorted(plan.columnas - {'index'} if plan is not None else [])))
+
+    if formato == 'parquet' and pq is not None:
+        snapshot = kiva_snapshot(ruta, optimizar = optimizar)
+        filtro = None
+        if plan is not None:
+            esquema = pq.read_schema(snapshot)
+            lectura = None if lectura is None else [c for c in lectura if c in esquema.names]
+            filtro = plan.filtro_arrow(esquema, parametros, index_col)
+        df = _poner_indice(_leer_parquet(snapshot, lectura, filtro), index_col)
+        if plan is not None:
+            df = cached_query(df, consulta, **parametros)
+    else:
+        if lectura is not None:
+            cabecera = pd.read_csv(ruta, sep = ';', nrows = 0).columns
+            lectura = [c for c in lectura if c in cabecera]
+        seleccionados, tipos, categorias = [], None, {}
+        for bloque in iter_kiva_csv(ruta, lectura, chunksize, optimizar):
+            tipos = bloque.dtypes
+            # Las categorías del resultado tienen que ser las de todo el archivo, no solo las de los registros seleccionados
+            for columna in tipos.index[tipos == 'category']:
+                categorias.setdefault(columna, set()).update(bloque[columna].cat.categories)
+            if plan is not None:
+                bloque = cached_query(_poner_indice(bloque, index_col), consulta, **parametros)
+                bloque = bloque.reset_index() if index_col is not None else bloque
+            seleccionados.append(bloque)
+        df = pd.concat(seleccionados, ignore_index = index_col is not None)
+        # Al indexar y juntar bloques pandas puede ensanchar los enteros (int32 -> int64) y las categorías pasan a texto
+        if optimizar:
+            df = df.astype({c: t for c, t in TIPOS_KIVA.items() if c in df.columns and c not in categorias})
+            df = df.astype({c: pd.CategoricalDtype(sorted(valores)) for c, valores in categorias.items()})
+        df = _poner_indice(df, index_col)
+
+    if columns is not None:
+        df = df[list(columns)]
+    return df
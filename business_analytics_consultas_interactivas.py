@@ -11,13 +11,16 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from business_analytics_carga import load_kiva
+
 # %matplotlib inline. Es para decirle cómo tiene que sacar los gráficos.
 # En este caso significa que los saque como gráficos estáticos integrados en el propio notebook (de tal forma que se guarde y distribuya más fácilmente).
 
 pd.options.display.min_rows = 6
 
-df = pd.read_csv('DataSetKivaCreditScoring.csv', sep = ';', index_col = 'id',
-                parse_dates = ['Funded Date','Paid Date'])
+# Cargamos Kiva con load_kiva(): la primera vez lee el CSV y a partir de ahí tira de una copia en Parquet mucho más rápida
+
+df = load_kiva('DataSetKivaCreditScoring.csv')
 print(df)
 print(df.head())
 print(df.info())
@@ -32,6 +35,12 @@ print(df.info())
 # Python es muy buen lenguaje para esto, ya que al trabajar en memoria los tiempos de respuestas para datasets de tamaño razonable son casi instantáneos.
 # Para que aterrices todo eso, preguntas típicas pueden ser: ¿cuales son los productos más vendidos?, ¿en qué tiendas?, ¿qué clientes realizan más devoluciones?, ¿y son iguales para todos los productos o dependen de su tipo? por poner algunos ejemplos
 
+# TÉCNICA PRO: si las preguntas llegan desde fuera (p.e. un front-end de BI) no tiene sentido cargar el dataset en cada una.
+# business_analytics_servidor.py deja Kiva y accidentes cargados e indexados y responde las consultas de este script por HTTP, en JSON o Arrow:
+
+# python business_analytics_servidor.py kiva
+# curl -X POST localhost:8765/kiva/crosstab -d '{"index": "Country", "columns": "Sector", "normalize": "index"}'
+
 # En módulos futuros veremos mas sobre el "arte" de hacer consultas interactivas, pero de momento aquí vas a aprender las técnicas que necesitas dominar.
 # En proyectos de este tipo tendremos que hacer cientos de consultas, y dominar estas técnias nos dará precisión de cirujano para obtener justo lo que queremos, solo lo que queremos, cuando lo queremos y con el menor código y esfuerzo posible.
 
@@ -98,6 +107,14 @@ print(df.loc[df.Country.isin(paises_de_interes)])
 
 print(df.loc[~df.Country.isin(paises_de_interes)])
 
+# TÉCNICA PRO: si el dataframe se queda en memoria y lanzamos muchos filtros sobre las mismas dimensiones (p.e. desde un cuadro de mando)
+# podemos precalcular un índice bitmap por cada valor de Country, Country Code, Sector, Activity, Status y Delinquent.
+# Los filtros se combinan con &, | y ~ sin volver a recorrer las columnas.
+
+# from business_analytics_indices import BitmapIndex
+# indice = BitmapIndex(df)
+# print(indice.select(df, indice.notin('Country', paises_de_interes) & indice.eq('Sector', 'Food')))
+
 # FILTRAR REGISTROS ENTRE CIERTOS VALORES
 
 # Hasta ahora para filtrar registros entre dos valore lo que hacíamos era definir un criterio compuesto y usar indexación booleana.
@@ -118,6 +135,14 @@ print(df.loc[criterio])
 
 print(df.loc[df['Loan Amount'].between(1000,2000)])
 
+# TÉCNICA PRO: con un índice ordenado sobre los importes los rangos se resuelven con búsqueda binaria,
+# y nlargest()/nsmallest() no necesitan volver a ordenar. Se puede combinar con los filtros del índice bitmap.
+
+# from business_analytics_indices import SortedIndex
+# rangos = SortedIndex(df)
+# print(rangos.select(df, rangos.between('Loan Amount', 1000, 2000)))
+# print(rangos.nlargest(df, 5, 'Funded Amount'))
+
 # EL MÉTODO QUERY
 
 # Ya sabíamos filtrar registros usando loc e iloc.
@@ -169,6 +194,20 @@ print(df.query('`Country Code` not in ["UG", "GZ"]'))
 media = df['Funded Amount'].mean()
 print(df.query('`Funded Amount` > @media'))
 
+# TÉCNICA PRO: si lanzamos muchas veces las mismas consultas (p.e. en un bucle o un cuadro de mando) cambiando solo las variables con @,
+# cached_query() analiza cada expresión una sola vez y guarda el plan para las siguientes.
+
+# from business_analytics_cache_consultas import cached_query
+# print(cached_query(df, '`Funded Amount` > @media'))
+# print(cached_query(df, '`Funded Amount` > @media', media = 1500))
+
+# Si lo que se repite es el resultado entero (value_counts, medias, agregaciones...) cached_eval() lo guarda hasta que el dataframe cambie:
+# al hacer df['Devuelto'] = ... o drop(..., inplace = True) se descartan los resultados guardados y se vuelven a calcular.
+
+# from business_analytics_cache_consultas import cached_eval
+# print(cached_eval(df, "df.Country.value_counts()"))
+# print(cached_eval(df, "df[df['Funded Amount'] > media].Sector.value_counts()"))
+
 # Podemos usar directamente la palabra index para trabajar con el índice.
 
 print(df.query('50 < index < 100'))
@@ -180,6 +219,12 @@ print(df.query('50 < index < 100'))
 
 print(df.query('50 < index < 100')[['Funded Date','Sector']])
 
+# TÉCNICA PRO: si solo queremos unos pocos registros y columnas no hace falta cargar todo Kiva para luego filtrar.
+# scan_kiva() aplica la consulta y la selección de columnas al leer (de la foto Parquet o del CSV por bloques).
+
+# from business_analytics_carga_perezosa import scan_kiva
+# print(scan_kiva('50 < index < 100', ['Funded Date','Sector']))
+
 # NOTA: sobre todas las consultas anteriores podríamos seguir operando para realizar análisis sobre lo que devuelve query.
 # Cosas como: conteos, medias, etc. Pero de momento nos quedamos con la idea de que query no solo sirve para seleccionar registros, si no que después podremos hacer cosas directamente sobre ellos.
 # Y dar respuesta a consultas como "¿Cual es la media de financiación de las operaciones del sector Food que además sean de Uganda o de Kenya?"
@@ -338,6 +383,11 @@ print(df.nsmallest(n = 5, columns = 'Funded Amount'))
 print(df.groupby('Country')['Funded Amount'].nlargest())
 print(df.groupby('Country')['Funded Amount'].nsmallest())
 
+# TÉCNICA PRO: con muchos grupos es más rápido nlargest_por_grupo() / nsmallest_por_grupo(), que devuelven exactamente lo mismo.
+
+# from business_analytics_agregados import nlargest_por_grupo, nsmallest_por_grupo
+# print(nlargest_por_grupo(df, 'Country', 'Funded Amount'))
+
 # Pero, ¿cómo hacemos si queremos sacar simplemente los N valores más frecuentes por grupo?
 # Ya que para usar la anterior estructura necesitamos una variable de análisis, y con los conteos no tenemos.
 
@@ -413,6 +463,17 @@ print(df.groupby(['Country','Sector'])[['Loan Amount','Paid Amount']] \
           var_name = ['Variable','Metrica'],
           value_name = 'Valor'))
 
+# TÉCNICA PRO: en un informe es normal agrupar la misma tabla de muchas formas (por Country, por Sector, por ['Country','Sector']...)
+# y cada groupby vuelve a factorizar las variables de agrupación desde cero. Agrupaciones de business_analytics_agregados las factoriza
+# una sola vez y las reutiliza en todas las agrupaciones, incluidos los subtotales de ROLLUP y CUBE de SQL y los totales de crosstab:
+
+# from business_analytics_agregados import Agrupaciones
+# agrupaciones = Agrupaciones(df, ['Country','Sector','Delinquent'])
+# informe = agrupaciones.grouping_sets(['Country', 'Sector', ['Country','Sector']], ['count','mean'], columnas = ['Loan Amount','Paid Amount'])
+# print(informe[('Country','Sector')])
+# print(agrupaciones.rollup(['Country','Sector'], ['count','mean'], columnas = ['Loan Amount'])) # con los subtotales por país y el total ('All')
+# print(agrupaciones.crosstab('Country', 'Delinquent', margins = True))
+
 # FLEXIBILIDAD DEL FSC
 
 # Este framework es muy flexible, así que hay que dedicarle varias horas de trabajo para exprimir todo su pontencial.
@@ -440,6 +501,13 @@ print(df.groupby('Country', as_index = False)['Loan Amount'].agg('count'))
 
 print(df.groupby('Country')['Loan Amount'].describe())
 
+# TÉCNICA PRO: si el CSV es más grande que la memoria disponible podemos hacer estas mismas agregaciones leyéndolo por bloques.
+# Las funciones de business_analytics_agregados devuelven exactamente las mismas tablas que groupby().
+
+# from business_analytics_agregados import agg_por_bloques, describe_por_bloques
+# agg_por_bloques('DataSetKivaCreditScoring.csv', ['Country','Sector'], ['Loan Amount','Paid Amount'], ['count','mean'])
+# describe_por_bloques('DataSetKivaCreditScoring.csv', 'Country', 'Loan Amount')
+
 # Si no le incluímos el componente de las variables de análisis aplicará los estadísticos sobre todas las variables de análisis del dataset para cada valor de la variable de agregación, lo cual nos puede dar mucha eficiencia.
 
 # print(df.groupby('Country').agg(['count','mean','max','min'])) # hay que controlar que sean variables numéricas
@@ -462,6 +530,14 @@ print(df.select_dtypes('number').agg(['count','mean','max','min', nulos]).T)
 print(df.groupby('Sector').agg(media_financiacion = ('Funded Amount','mean'),
                         fecha_mas_reciente = ('Funded Date', 'max')))
 
+# TÉCNICA PRO: cada estadístico de agg() es una pasada por los datos, y las funciones nuestras como nulos se ejecutan en Python.
+# agg_una_pasada de business_analytics_agregados devuelve lo mismo calculando conteo, nulos, suma, mínimo, máximo, media y varianza
+# de cada variable a la vez (con su propia función nulos, que calcula como un estadístico más). Se nota sobre todo con datasets con muchas variables.
+
+# from business_analytics_agregados import agg_una_pasada, nulos
+# print(agg_una_pasada(df.select_dtypes('number'), ['count','mean','max','min', nulos]).T)
+# print(agg_una_pasada(df, by = 'Sector', media_financiacion = ('Funded Amount','mean'), fecha_mas_reciente = ('Funded Date', 'max')))
+
 # CONTEOS AGRUPADOS DE VALORES DE VARIAS VARIABLES
 
 # Ya conocemos value_counts() para conteos de una variable.
@@ -514,6 +590,14 @@ print(df.groupby('Country').filter(lambda x: x.Country.count() > 100).Country.un
 (print(df.groupby('Country').filter(lambda x: x['Funded Amount'].mean() > 700)
     .groupby('Country')['Funded Amount'].max()))
 
+# TÉCNICA PRO: filter() ejecuta la lambda en Python para cada grupo y después concatena los grupos, lo que con miles de grupos es muy lento.
+# Con having() de business_analytics_agregados escribimos la condición sobre los estadísticos del grupo (como el HAVING de SQL)
+# y se calcula de una vez para todos los grupos, devolviendo una máscara en el orden original:
+
+# from business_analytics_agregados import having, filtrar_grupos, grupo
+# print(filtrar_grupos(df, 'Country', grupo.count() > 100).groupby('Country')['Funded Amount'].mean())
+# print(df.loc[having(df, 'Country', grupo.mean('Funded Amount') > 700)].groupby('Country')['Funded Amount'].max())
+
 # PRIMER O ÚLTIMO VALOR DE UNA VARIABLE POR GRUPO
 
 # Podemos extraer el primer valor de una variable de análisis para cada valor de otra variable de agrupación con la siguiente estructura:
@@ -595,6 +679,14 @@ print(df.pivot_table(index = ['Country','Delinquent'],
                aggfunc = ['count','mean'],
                fill_value=0))
 
+# TÉCNICA PRO: si hay que sacar muchas tablas (p.e. cientos por informe) crosstab y pivot_table son lentos porque pasan por groupby + unstack.
+# En business_analytics_agregados están tabla_cruzada y tabla_dinamica, con los mismos parámetros y el mismo resultado para 'count', 'sum' y 'mean',
+# que cuentan y suman por celda con np.bincount en una sola pasada y sacan medias, totales y porcentajes de la propia tabla:
+
+# from business_analytics_agregados import tabla_cruzada, tabla_dinamica
+# print(tabla_cruzada(df.Country, df.Sector, normalize = 'all', margins = True, margins_name = 'Total'))
+# print(tabla_dinamica(df, index = ['Country','Delinquent'], columns = ['Sector','Status'], values = 'Funded Amount', aggfunc = ['count','mean'], fill_value = 0))
+
 
 # RESALTAR INFORMACIÓN
 
@@ -635,6 +727,14 @@ def mayor_que(dato,criterio = 400):
 
 df2[['Funded Amount']].style.applymap(mayor_que)
 
+# TÉCNICA PRO: con tablas grandes style llama a mayor_que celda a celda y genera el HTML de todas las filas, con una regla CSS por celda.
+# EstiloVectorizado evalúa las reglas por columnas con NumPy (mayor_que se expresa como una condición) y renderiza solo las filas visibles.
+
+# from business_analytics_estilos import EstiloVectorizado
+# EstiloVectorizado(df.groupby('Sector')[['Funded Amount']].mean()).highlight_max().highlight_min(color = 'red')
+# estilo = EstiloVectorizado(df[['Funded Amount']]).where(lambda x: x > 400, 'background-color: lightgreen', 'color: red')
+# estilo.guardar_html('informe.html', filas_por_pagina = 1000)
+
 # MINICUBOS
 
 # Los "cubos" son una técnica muy usada en business intelligence (no confundir con business analytics) que consiste básicamente en organizar la información en métricas (lo que se quiere analizar) y dimensiones (las vistas de análisis).
@@ -675,6 +775,22 @@ print(minicubo)
 minicubo = minicubo.groupby(['variable','value'])['Funded Amount'].agg(conteo = 'count', media = 'mean')
 print(minicubo)
 
+# TÉCNICA PRO: con datasets grandes el melt multiplica la memoria por el número de dimensiones.
+# La clase Cubo precalcula las métricas por dimensión (y si queremos por cruces de dimensiones) directamente sobre df, sin melt,
+# y se puede guardar en disco para consultarlo después sin volver a los datos.
+
+# from business_analytics_cubos import Cubo
+# cubo = Cubo(df, dimensiones, metrica, orden = 2)
+# print(cubo.minicubo()) # el mismo resultado que arriba
+# print(cubo.tabla(['Sector'], filtros = {'Country': 'Uganda'})) # y cruces que el minicubo no tiene
+# cubo.guardar('cubo_kiva.pkl')
+
+# Y cuando lleguen préstamos nuevos (o cambien de Status) se actualiza sumando y restando solo esos registros, sin reconstruirlo:
+
+# cubo.append(nuevos)
+# cubo.update(antes, despues)
+# print(cubo.pivot_table('Country', 'Sector')) # también sirve de tabla dinámica siempre al día
+
 # A partir de aquí podemos usar el minicubo para obtener insights de forma muy rápida.
 # Por ejemplo: analiza el número de operaciones y la financiación media en cada sector.
 
@@ -716,4 +832,12 @@ print(financiacion_df)
 # Calculamos la financiación esperada de la operación
 print(financiacion_df.media.mean())
 
+# TÉCNICA PRO: si hay que estimar muchas operaciones, filtrar el minicubo una a una es muy lento.
+# El scorecard del Cubo busca las medias de cada valor de forma vectorizada para todo un dataframe de perfiles a la vez:
+
+# scorecard = cubo.scorecard() # con ponderado = True pondera cada media por su número de operaciones
+# print(scorecard.score_values(criterios)) # lo mismo que arriba
+# perfiles = pd.DataFrame({'Activity': ['Beauty Salon','Farming'], 'Country': ['Uganda','Kenya'], 'Status': ['paid','paid']})
+# print(scorecard.score(perfiles)) # una estimación por fila, cada valor se busca solo en su dimensión
+
 
@@ -24,54 +24,17 @@ ruta_csv = os.path.join(directorio_actual, "2020_Accidentalidad.csv")
 
 # Importa el archivo en el objeto df y visualizalo por pantalla.
 
-df = pd.read_csv(ruta_csv, sep=';', parse_dates=['FECHA'])
+# load_accidents() lo hace todo en una sola lectura:
 
-print(df.head(2))
-df.info()
+# - Renombra las columnas (cabecera) y descarta las dos columnas vacías del final (unamed1 y unamed2)
+# - Corrige los tipos de datos: distrito, tipo_accidente, tiempo, vehiculo, persona, edad y sexo como category
+# - Elimina los registros sin 'numero' o sin 'distrito'
+# - Crea una categoría "Desconocido" para los nulos en 'sexo' y 'tiempo' (estado metereológico)
+# - Sustituye los nulos en 'lesividad' con cero
 
-# Eliminar registros duplicados
-df.drop_duplicates(inplace=True)
+from business_analytics_carga import load_accidents
 
-# Renombrar las columnas
-cabecera = ['expediente', 'fecha', 'hora', 'calle', 'numero', 'distrito', 'tipo_accidente', 'tiempo',
-            'vehiculo', 'persona', 'edad', 'sexo', 'lesividad', 'unamed1', 'unamed2']
-
-df.columns = cabecera[:len(df.columns)]
-
-df = pd.read_csv(ruta_csv, delimiter=";", 
-    header=0, 
-    names=cabecera, 
-    parse_dates=["fecha"])
-
-df = df.drop("unamed1", axis = 1)
-df = df.drop("unamed2", axis = 1)
-
-# Corregir los tipos de datos de las columnas
-tipos = {
-    'distrito': 'category',
-    'tipo_accidente': 'category',
-    'tiempo': 'category',
-    'vehiculo': 'category',
-    'persona': 'category',
-    'edad': 'category',
-    'sexo': 'category'
-}
-
-df = df.astype(tipos)
-
-# Eliminar nulos en 'numero' y 'distrito'
-df = df.dropna(subset=['numero', 'distrito'])
-
-# Crear una categoría "Desconocido" para nulos en 'sexo' y 'estado_metereológico'
-
-df["sexo"] = df.sexo.cat.add_categories('Desconocido')
-df["tiempo"] = df.tiempo.cat.add_categories('Desconocido')
-
-for column in ['sexo', 'tiempo']:
-    df[column].fillna('Desconocido', inplace=True)
-
-# Sustituir nulos en 'lesividad' con cero
-df['lesividad'].fillna(0, inplace=True)
+df = load_accidents(ruta_csv)
 
 # Visualizar el DataFrame resultante
 print(df.head())
@@ -222,6 +185,9 @@ crosstab_lesividad_mean = df.pivot_table(values='lesividad', index='vehiculo', c
 # Displaying the result using the print function
 print(crosstab_lesividad_mean)
 
+# NOTA: tabla_dinamica(df, 'vehiculo', 'tipo_accidente', 'lesividad', 'mean', fill_value = -999) de business_analytics_agregados da la misma tabla más rápido,
+# y tabla_cruzada(df['vehiculo'], df['tipo_accidente'], margins = True, margins_name = 'Total') la del ejercicio anterior.
+
 # EJERCICIO 17: Para cada combinación entre el tipo de vehículo y el tipo de accidente saca el mínimo, la media y el máximo de lesividad.
 
 # Calculate the min, mean, and max lesividad for each combination of 'vehiculo' and 'tipo_accidente'
@@ -303,6 +269,9 @@ cubo.reset_index(inplace=True)
 
 print(cubo)
 
+# NOTA: el mismo cubo se puede precalcular sin melt (que multiplica por 6 los registros) con la clase Cubo de business_analytics_cubos:
+# Cubo(df, ['tipo_accidente','tiempo','vehiculo','persona','edad','sexo'], 'lesividad').minicubo(estadisticos = {'conteo': 'filas', 'suma_lesividad': 'sum', 'media_lesividad': 'mean'})
+
 # Por ejemplo, para la edad "DE 0 A 5 AÑOS", el número total de registros es de 238, con una lesividad total de 1586 y una lesividad media de aproximadamente 6.66.
 
 # Vemos en el cubo que cuando el estado_metereologico es LLuvia intensa la lesividad media es de 6.76 y ha habido 294 accidentes.
@@ -373,6 +342,9 @@ filtered_cubo = cubo[cubo['value'].isin(selected_conditions)]
 estimated_lesividad = filtered_cubo['media_lesividad'].mean()
 print(estimated_lesividad)
 
+# NOTA: para puntuar muchos escenarios a la vez se puede usar el scorecard de la clase Cubo, que recibe un dataframe con una fila por escenario:
+# Cubo(df, ['tiempo','edad','vehiculo'], 'lesividad').scorecard().score(pd.DataFrame({'tiempo': ['Nevando'], 'edad': ['DE 10 A 14 AÑOS'], 'vehiculo': ['Ciclomotor']}))
+
 # Ahora vamos a utilizar el método query en los siguientes ejercicios
 
 print(df)
@@ -415,6 +387,9 @@ lesividad_media = df['lesividad'].mean()
 accidentes_below_mean_lesividad = df.query(f"lesividad < {lesividad_media}")
 print(accidentes_below_mean_lesividad)
 
+# NOTA: con la arroba (df.query("lesividad < @lesividad_media")) el texto de la consulta no cambia aunque cambie la media,
+# así que cached_query() de business_analytics_cache_consultas puede reutilizar el plan ya analizado.
+
 # EJERCICIO 30: Sobre la consulta anterior haz que muestre solo las variables tipo_accidente y lesividad.
 
 # Extract only 'tipo_accidente' and 'lesividad' columns from the previous result using the query method
@@ -0,0 +1,396 @@
+# CUBOS
+
+# El minicubo de las consultas interactivas se construye pasando a transaccional las dimensiones (melt) y agregando por variable y valor.
+# Tiene dos problemas cuando los datos crecen:
+
+# - el melt multiplica los registros por el número de dimensiones (4 dimensiones = 4 veces el dataset en memoria)
+# - cada vez que queremos otra vista (otra métrica, un cruce de dos dimensiones, un filtro) hay que volver a hacerlo todo
+
+# Un cubo "de verdad" precalcula las métricas para todos los cruces de dimensiones (hasta un orden dado) y luego solo consulta.
+
+# CÓMO SE CONSTRUYE
+
+# - Cada dimensión se codifica una sola vez como enteros (pd.factorize)
+# - Para cada combinación de dimensiones (Country, Sector, Country x Sector...) guardamos en un array con una celda por cruce:
+#   número de registros, y por cada métrica conteo, suma y suma de cuadrados
+# - Con eso sale todo lo demás: media = suma / conteo, varianza a partir de la suma de cuadrados...
+
+# Para la varianza las sumas se guardan restando a cada métrica una constante (su media al construir el cubo), así no pierde precisión.
+# Pero sumar después conteo * constante no devuelve exactamente la suma (7224.999999999996 en vez de 7225),
+# así que la suma de verdad se guarda aparte, sin desplazar, y en las métricas enteras se devuelve como entero igual que groupby().sum().
+
+# CÓMO SE CONSULTA
+
+# - celda({'Country': 'Uganda', 'Sector': 'Food'}): las métricas de un cruce concreto, accediendo directamente a su posición en el array
+# - tabla(['Sector'], filtros = {'Status': 'paid'}): todas las celdas de una combinación (slice, dice y roll-up), sin volver a los datos
+# - minicubo(): la misma tabla por variable y valor que construíamos con melt y groupby
+# - pivot_table('Country', 'Sector'): la tabla dinámica de dos dimensiones
+
+# MANTENIMIENTO INCREMENTAL
+
+# Conteos, sumas y sumas de cuadrados se pueden sumar y restar, así que cuando llegan préstamos nuevos no hace falta reconstruir el cubo:
+
+# - append(nuevos): suma el lote a las celdas que le corresponden
+# - retract(antiguos): lo resta, p.e. la versión anterior de un préstamo que ha pasado a Status 'paid'
+# - update(antes, despues): las dos cosas a la vez
+
+# SCORECARD
+
+# En el risk scorecard estimábamos la métrica de un perfil (p.e. un 'Beauty Salon' en 'Uganda' que será 'paid') como la media
+# de las medias de sus valores en el minicubo, filtrando el minicubo perfil a perfil.
+# Scorecard hace lo mismo para muchos perfiles a la vez: busca la media de cada valor de forma vectorizada y las promedia por perfil.
+
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+# Estadísticos que se pueden pedir al cubo
+ESTADISTICOS_CUBO = ['filas','count','sum','mean','var','std']
+
+
+def _como_lista(x):
+    return [x] if isinstance(x, str) else list(x)
+
+
+def _sumar(array, posicion, pesos, signo):
+    # Lotes pequeños: np.add.at solo toca las celdas del lote. Lotes grandes: bincount sobre todo el array, que es más rápido
+    plano = array.reshape(-1)
+    if len(posicion) < plano.size:
+        np.add.at(plano, posicion, signo if pesos is None else signo * pesos)
+    else:
+        plano += signo * np.bincount(posicion, weights = pesos, minlength = plano.size).astype(plano.dtype)
+
+
+class Cubo:
+    """Cubo OLAP en memoria: conteos, sumas y sumas de cuadrados precalculados para cada cruce de dimensiones.
+
+    Parámetros más importantes:
+
+    - df: dataframe de origen
+    - dimensiones: variables de análisis (vistas)
+    - metricas: variables numéricas a agregar
+    - orden: número máximo de dimensiones que se cruzan (1 equivale al minicubo, 2 añade todos los cruces de dos dimensiones...)
+
+    Por ejemplo:
+
+    cubo = Cubo(df, ['Country','Sector','Activity','Status'], 'Funded Amount', orden = 2)
+    cubo.tabla(['Sector'], filtros = {'Country': 'Uganda'})
+    """
+
+    def __init__(self, df, dimensiones, metricas, orden = 1):
+        self.dimensiones = _como_lista(dimensiones)
+        self.metricas = _como_lista(metricas)
+        self.orden = min(orden, len(self.dimensiones))
+
+        self.categorias = {}
+        self._posiciones = {}
+        for dimension in self.dimensiones:
+            unicos = pd.Index(list(pd.Series(df[dimension].unique()).dropna().sort_values()))
+            self.categorias[dimension] = unicos
+            self._posiciones[dimension] = {valor: k for k, valor in enumerate(unicos)}
+
+        self.desplazamiento = {m: float(np.nan_to_num(df[m].mean())) for m in self.metricas}
+        self.enteras = {m: pd.api.types.is_integer_dtype(df[m].dtype) or pd.api.types.is_bool_dtype(df[m].dtype) for m in self.metricas}
+
+        # Una entrada por combinación de dimensiones (la vacía es el total)
+        self.celdas = {}
+        for k in range(self.orden + 1):
+            for combinacion in itertools.combinations(self.dimensiones, k):
+                self.celdas[combinacion] = self._celdas_vacias(combinacion)
+
+        self._acumular(df, 1)
+
+    # Construcción
+
+    def _forma(self, combinacion):
+        return tuple(len(self.categorias[d]) for d in combinacion)
+
+    def _celdas_vacias(self, combinacion):
+        forma = self._forma(combinacion)
+        celdas = {'filas': np.zeros(forma, dtype = 'int64')}
+        for metrica in self.metricas:
+            celdas[(metrica, 'count')] = np.zeros(forma, dtype = 'int64')
+            celdas[(metrica, 'total')] = np.zeros(forma, dtype = 'float64')
+            celdas[(metrica, 'sum')] = np.zeros(forma, dtype = 'float64')
+            celdas[(metrica, 'sumsq')] = np.zeros(forma, dtype = 'float64')
+        return celdas
+
+    def _codificar(self, df):
+        # Códigos enteros de cada dimensión (-1 para los nulos y los valores que no están en el cubo)
+        codigos = {}
+        for dimension in self.dimensiones:
+            codigos[dimension] = self.categorias[dimension].get_indexer(df[dimension])
+        return codigos
+
+    def _acumular(self, df, signo):
+        codigos = self._codificar(df)
+        metricas = {m: df[m].to_numpy(dtype = 'float64', na_value = np.nan) - self.desplazamiento[m] for m in self.metricas}
+
+        for combinacion, celdas in self.celdas.items():
+            forma = self._forma(combinacion)
+            tamano = int(np.prod(forma))
+            if combinacion:
+                # Como en groupby, los registros con nulos en alguna de las dimensiones no entran en la combinación
+                validos = np.logical_and.reduce([codigos[d] >= 0 for d in combinacion])
+                posicion = np.ravel_multi_index([codigos[d][validos] for d in combinacion], forma)
+            else:
+                validos = np.ones(len(df), dtype = bool)
+                posicion = np.zeros(len(df), dtype = 'int64')
+
+            _sumar(celdas['filas'], posicion, None, signo)
+            for metrica, valores in metricas.items():
+                valores = valores[validos]
+                con_dato = ~np.isnan(valores)
+                en, valores = posicion[con_dato], valores[con_dato]
+                _sumar(celdas[(metrica, 'count')], en, None, signo)
+                _sumar(celdas[(metrica, 'total')], en, valores + self.desplazamiento[metrica], signo)
+                _sumar(celdas[(metrica, 'sum')], en, valores, signo)
+                _sumar(celdas[(metrica, 'sumsq')], en, valores ** 2, signo)
+
+    def _ampliar_categorias(self, df):
+        # Los valores nuevos se añaden al final de cada dimensión y los arrays crecen con celdas a cero
+        for eje, dimension in enumerate(self.dimensiones):
+            valores = pd.Series(df[dimension].unique()).dropna()
+            nuevos = valores[self.categorias[dimension].get_indexer(valores) == -1]
+            if len(nuevos) == 0:
+                continue
+            self.categorias[dimension] = self.categorias[dimension].append(pd.Index(list(nuevos)))
+            self._posiciones[dimension] = {valor: k for k, valor in enumerate(self.categorias[dimension])}
+            for combinacion, celdas in self.celdas.items():
+                if dimension in combinacion:
+                    relleno = [(0, 0)] * len(combinacion)
+                    relleno[combinacion.index(dimension)] = (0, len(nuevos))
+                    for clave in celdas:
+                        celdas[clave] = np.pad(celdas[clave], relleno)
+
+    # Mantenimiento incremental
+
+    def append(self, df_nuevo):
+        """Suma al cubo un lote de registros nuevos. El coste depende del tamaño del lote, no del histórico."""
+        self._ampliar_categorias(df_nuevo)
+        self._acumular(df_nuevo, 1)
+        return self
+
+    def retract(self, df_antiguo):
+        """Resta del cubo un lote de registros que ya estaban en él (p.e. la versión anterior de préstamos que han cambiado de Status)."""
+        for dimension in self.dimensiones:
+            valores = df_antiguo[dimension].dropna()
+            if (self.categorias[dimension].get_indexer(valores) == -1).any():
+                raise ValueError(f'El lote tiene valores de {dimension} que no están en el cubo')
+        self._acumular(df_antiguo, -1)
+        if any((celdas['filas'] < 0).any() for celdas in self.celdas.values()):
+            self._acumular(df_antiguo, 1)
+            raise ValueError('El lote tiene registros que no estaban en el cubo')
+        return self
+
+    def update(self, antes, despues):
+        """Sustituye unos registros por su nueva versión: retract(antes) + append(despues)."""
+        return self.retract(antes).append(despues)
+
+    # Consultas
+
+    def _combinacion(self, dimensiones):
+        desconocidas = set(dimensiones) - set(self.dimensiones)
+        if desconocidas:
+            raise KeyError(f'Dimensiones que no están en el cubo: {sorted(desconocidas)}')
+        combinacion = tuple(d for d in self.dimensiones if d in dimensiones)
+        if combinacion not in self.celdas:
+            raise KeyError(f'El cubo solo tiene cruces de hasta {self.orden} dimensiones')
+        return combinacion
+
+    def _metrica(self, metrica):
+        if metrica is None:
+            return self.metricas[0]
+        if metrica not in self.metricas:
+            raise KeyError(f'{metrica} no es una métrica del cubo')
+        return metrica
+
+    def _estadisticos(self, celdas, metrica, estadisticos):
+        # celdas: arrays (o escalares) de filas, count, total, sum y sumsq de una misma selección
+        conteo = celdas[(metrica, 'count')]
+        suma = celdas[(metrica, 'sum')]
+        con_datos = np.where(conteo > 0, conteo, np.nan)
+        media = suma / con_datos
+        grados = np.where(conteo > 1, conteo - 1, np.nan)
+        varianza = (celdas[(metrica, 'sumsq')] - suma * media) / grados
+        # Lo que quede por debajo del error de redondeo de la suma de cuadrados es varianza 0 (p.e. grupos con un solo valor)
+        varianza = np.where(varianza > 1e-12 * celdas[(metrica, 'sumsq')] / grados, varianza, np.where(np.isnan(varianza), np.nan, 0.0))
+        calculos = {'filas': lambda: celdas['filas'],
+                    'count': lambda: conteo,
+                    'sum': lambda: self._suma(celdas[(metrica, 'total')], conteo, metrica),
+                    'mean': lambda: media + self.desplazamiento[metrica],
+                    'var': lambda: varianza,
+                    'std': lambda: np.sqrt(varianza)}
+        return {nombre: calculos[estadistico]() for nombre, estadistico in estadisticos.items()}
+
+    def _suma(self, total, conteo, metrica):
+        total = np.where(conteo > 0, total, 0.0)
+        return np.rint(total).astype('int64') if self.enteras[metrica] else total
+
+    @staticmethod
+    def _nombrar(estadisticos):
+        # Acepta una lista de ESTADISTICOS_CUBO o un diccionario nombre -> estadístico (p.e. {'conteo': 'count', 'media': 'mean'})
+        if isinstance(estadisticos, str):
+            estadisticos = [estadisticos]
+        if not isinstance(estadisticos, dict):
+            estadisticos = {e: e for e in estadisticos}
+        desconocidos = set(estadisticos.values()) - set(ESTADISTICOS_CUBO)
+        if desconocidos:
+            raise ValueError(f'Estadísticos no soportados: {sorted(desconocidos)}')
+        return estadisticos
+
+    def celda(self, valores, metrica = None, estadisticos = ESTADISTICOS_CUBO):
+        """Métricas de un cruce concreto, p.e. cubo.celda({'Country': 'Uganda', 'Sector': 'Food'}).
+
+        Si algún valor no está en el cubo devuelve la celda vacía (0 registros).
+        """
+        combinacion = self._combinacion(valores)
+        metrica = self._metrica(metrica)
+        posicion = tuple(self._posiciones[d].get(valores[d], -1) for d in combinacion)
+        if any(p < 0 for p in posicion):
+            elegidas = {clave: np.zeros((), dtype = array.dtype) for clave, array in self.celdas[combinacion].items()}
+        else:
+            elegidas = {clave: array[posicion] for clave, array in self.celdas[combinacion].items()}
+        resultado = self._estadisticos(elegidas, metrica, self._nombrar(estadisticos))
+        return pd.Series({nombre: np.asarray(valor).item() for nombre, valor in resultado.items()}, name = metrica)
+
+    def tabla(self, dimensiones, metrica = None, estadisticos = ('count','mean'), filtros = None):
+        """Equivalente a df.loc[filtros].groupby(dimensiones)[metrica].agg(estadisticos), leído del cubo.
+
+        - dimensiones: variables de agrupación (una lista vacía da el total)
+        - estadisticos: lista de ESTADISTICOS_CUBO o diccionario nombre -> estadístico
+        - filtros: diccionario dimensión -> valor (dice). Las dimensiones que no aparecen se agregan (roll-up)
+        """
+        dimensiones = _como_lista(dimensiones)
+        filtros = filtros or {}
+        combinacion = self._combinacion(set(dimensiones) | set(filtros))
+        metrica = self._metrica(metrica)
+        estadisticos = self._nombrar(estadisticos)
+
+        # Fijamos las dimensiones filtradas y dejamos los ejes de las de agrupación, en el orden pedido
+        seleccion = tuple(self._posiciones[d].get(filtros[d], -1) if d in filtros else slice(None) for d in combinacion)
+        ejes = [d for d in combinacion if d not in filtros]
+        orden_ejes = [ejes.index(d) for d in dimensiones]
+        celdas = {}
+        for clave, array in self.celdas[combinacion].items():
+            if any(isinstance(s, int) and s < 0 for s in seleccion):
+                array = np.zeros(tuple(len(self.categorias[d]) for d in ejes), dtype = array.dtype)
+            else:
+                array = array[seleccion]
+            celdas[clave] = np.transpose(array, orden_ejes).ravel()
+
+        resultado = pd.DataFrame(self._estadisticos(celdas, metrica, estadisticos))
+        if not dimensiones:
+            return resultado.iloc[0].rename(metrica)
+        if len(dimensiones) == 1:
+            indice = self.categorias[dimensiones[0]].rename(dimensiones[0])
+        else:
+            indice = pd.MultiIndex.from_product([self.categorias[d] for d in dimensiones], names = dimensiones)
+        resultado.index = indice
+        # Como en groupby, solo los cruces que aparecen en los datos
+        return resultado.loc[celdas['filas'] > 0].sort_index()
+
+    def minicubo(self, metrica = None, estadisticos = None):
+        """La tabla del minicubo: métricas por variable y valor, como con melt() + groupby(['variable','value']).
+
+        Por defecto con las columnas conteo y media del curso.
+        """
+        if estadisticos is None:
+            estadisticos = {'conteo': 'count', 'media': 'mean'}
+        if self.orden < 1:
+            raise KeyError('El cubo no tiene las dimensiones por separado (orden 0)')
+        partes = {d: self.tabla([d], metrica, estadisticos) for d in self.dimensiones}
+        resultado = pd.concat(partes, names = ['variable','value']).sort_index(level = 0, sort_remaining = False)
+        return resultado
+
+    def pivot_table(self, index, columns, metrica = None, estadistico = 'mean'):
+        """Equivalente a df.pivot_table(values = metrica, index = index, columns = columns, aggfunc = estadistico), leído del cubo."""
+        tabla = self.tabla([index, columns], metrica, {estadistico: estadistico})[estadistico]
+        return tabla.unstack(columns)
+
+    def scorecard(self, metrica = None, ponderado = False):
+        """Estimador de la métrica para perfiles (combinaciones de valores de las dimensiones), ver Scorecard."""
+        return Scorecard(self, metrica, ponderado)
+
+    # Persistencia
+
+    def guardar(self, ruta):
+        """Guarda el cubo en disco (se escribe en un temporal y se renombra, como las fotos de load_kiva)."""
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok = True)
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        pd.to_pickle(self, temporal)
+        os.replace(temporal, ruta)
+
+    @staticmethod
+    def cargar(ruta):
+        """Recupera un cubo guardado con guardar()."""
+        cubo = pd.read_pickle(ruta)
+        if not isinstance(cubo, Cubo):
+            raise TypeError(f'{ruta} no contiene un Cubo')
+        return cubo
+
+
+class Scorecard:
+    """Estima una métrica para muchos perfiles a la vez como la media de las medias de sus valores en el cubo.
+
+    Parámetros más importantes:
+
+    - cubo: el Cubo del que salen las medias por valor (se toma una foto, no cambia si después se actualiza el cubo)
+    - metrica: la métrica a estimar (por defecto la primera del cubo)
+    - ponderado: si True pondera la media de cada valor por su número de registros, en lugar de dar el mismo peso a todas
+
+    Por ejemplo:
+
+    perfiles = pd.DataFrame({'Activity': ['Beauty Salon','Farming'], 'Country': ['Uganda','Kenya'], 'Status': ['paid','paid']})
+    cubo.scorecard().score(perfiles)
+    """
+
+    def __init__(self, cubo, metrica = None, ponderado = False):
+        self.metrica = cubo._metrica(metrica)
+        self.ponderado = ponderado
+        self.categorias, self.medias, self.conteos = {}, {}, {}
+        for dimension in cubo.dimensiones:
+            celdas = {clave: array for clave, array in cubo.celdas[(dimension,)].items()}
+            estadisticos = cubo._estadisticos(celdas, self.metrica, {'count': 'count', 'mean': 'mean'})
+            self.categorias[dimension] = cubo.categorias[dimension]
+            self.medias[dimension] = np.append(estadisticos['mean'], np.nan) # la última posición es para valores desconocidos
+            self.conteos[dimension] = np.append(estadisticos['count'], 0)
+
+    def score(self, perfiles):
+        """Estimación para cada fila de perfiles (un dataframe con una columna por dimensión).
+
+        Las dimensiones que no estén en perfiles, los nulos y los valores que no están en el cubo no cuentan para la media.
+        """
+        dimensiones = [d for d in perfiles.columns if d in self.categorias]
+        if not dimensiones:
+            raise KeyError('perfiles no tiene ninguna dimensión del cubo')
+        medias = np.empty((len(perfiles), len(dimensiones)))
+        pesos = np.empty((len(perfiles), len(dimensiones)))
+        for k, dimension in enumerate(dimensiones):
+            codigos = self.categorias[dimension].get_indexer(perfiles[dimension])
+            medias[:, k] = self.medias[dimension][codigos] # -1 cae en la última posición: nan
+            pesos[:, k] = self.conteos[dimension][codigos]
+        if not self.ponderado:
+            pesos = (pesos > 0).astype('float64')
+        pesos[np.isnan(medias)] = 0
+        total = pesos.sum(axis = 1)
+        with np.errstate(invalid = 'ignore'):
+            estimacion = np.nansum(medias * pesos, axis = 1) / np.where(total > 0, total, np.nan)
+        return pd.Series(estimacion, index = perfiles.index, name = self.metrica)
+
+    def score_values(self, valores):
+        """Estimación de un solo perfil dado como lista de valores sin nombre de dimensión, como en el scorecard del curso
+        (minicubo.loc[minicubo.value.isin(criterios)].media.mean()): cuenta cada valor en todas las dimensiones en las que aparezca.
+        """
+        medias, pesos = [], []
+        for dimension, categorias in self.categorias.items():
+            posiciones = categorias.get_indexer(pd.Index(list(valores)).unique())
+            posiciones = posiciones[posiciones >= 0]
+            medias.extend(self.medias[dimension][posiciones])
+            pesos.extend(self.conteos[dimension][posiciones])
+        medias, pesos = np.array(medias, dtype = 'float64'), np.array(pesos, dtype = 'float64')
+        pesos = pesos if self.ponderado else (pesos > 0).astype('float64')
+        pesos[np.isnan(medias)] = 0
+        return float(np.nansum(medias * pesos) / pesos.sum()) if pesos.sum() > 0 else np.nan
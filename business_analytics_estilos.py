@@ -0,0 +1,294 @@
+# ESTILOS VECTORIZADOS
+
+# df.style.highlight_max(), bar() o applymap(mayor_que) son muy cómodos para tablas pequeñas, pero con tablas grandes no escalan:
+
+# - applymap llama a la función una vez por celda, en Python
+# - al renderizar se genera el HTML de todas las filas, con un id y una regla CSS propia por cada celda con estilo,
+#   así que una tabla de 100.000 filas tarda minutos y el HTML ocupa cientos de MB
+
+# EstiloVectorizado calcula los estilos por columnas con NumPy y los guarda como un código entero por celda:
+
+# - highlight_max/min/null y bar son comparaciones y operaciones sobre arrays enteros
+# - where() expresa reglas como mayor_que como una condición sobre la columna: where(lambda x: x > 400, 'background-color: lightgreen', 'color: red')
+# - map() admite funciones por celda como mayor_que, pero las llama una sola vez por valor distinto
+# - cada combinación distinta de estilos es una clase CSS, y las celdas solo llevan su clase
+
+# Y al renderizar solo se genera el HTML de las filas que se van a ver: una ventana (to_html(inicio, filas)),
+# páginas (paginas() y guardar_html()) o, en un notebook, las primeras FILAS_VISIBLES.
+
+import html
+import os
+import uuid
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Filas que se muestran en un notebook y filas por página al guardar
+FILAS_VISIBLES = 60
+FILAS_POR_PAGINA = 1000
+
+# Las barras se dibujan con una precisión de una décima de punto porcentual, así hay como mucho 1001 estilos de barra distintos
+_DECIMAS = 10
+
+
+def _propiedades(css):
+    # 'background-color: yellow;' y 'background-color: yellow' son el mismo estilo
+    return css.strip().rstrip(';').strip() if css else ''
+
+
+class EstiloVectorizado:
+    """Reglas de estilo sobre un dataframe evaluadas por columnas y HTML solo de las filas visibles.
+
+    Parámetros más importantes:
+
+    - df: el dataframe
+    - precision: decimales con los que se muestran los números decimales (como en df.style, 6 por defecto)
+    - na_rep: cómo se muestran los nulos
+
+    Los métodos de reglas devuelven el propio objeto, así que se encadenan como los de df.style:
+
+    EstiloVectorizado(tabla).highlight_max().highlight_min(color = 'red')
+    EstiloVectorizado(df2[['Funded Amount']]).where(lambda x: x > 400, 'background-color: lightgreen', 'color: red')
+    """
+
+    def __init__(self, df, precision = 6, na_rep = 'nan'):
+        self.df = df
+        self.precision, self.na_rep = precision, na_rep
+        self._reglas = []
+        self._calculado = None
+
+    # Reglas
+
+    def _posiciones(self, subset, numericas = False):
+        if subset is None:
+            columnas = self.df.select_dtypes(['number','bool']).columns if numericas else self.df.columns
+        else:
+            columnas = [subset] if isinstance(subset, str) or not pd.api.types.is_list_like(subset) else subset
+        return self.df.columns.get_indexer_for(columnas)
+
+    def _anadir(self, subset, regla, numericas = False):
+        # regla(bloque) -> (códigos enteros de forma bloque.shape, -1 sin estilo, y la tupla de estilos a los que apuntan)
+        posiciones = self._posiciones(subset, numericas)
+        if (posiciones < 0).any():
+            raise KeyError(f'{subset} no son columnas del dataframe')
+        self._reglas.append((posiciones, regla))
+        self._calculado = None
+        return self
+
+    @staticmethod
+    def _numeros(bloque):
+        return bloque.to_numpy(dtype = 'float64', na_value = np.nan)
+
+    @staticmethod
+    def _extremo(valores, funcion, axis):
+        if valores.size == 0: # sin filas o sin columnas no hay extremo: nan no es igual a nada, así que ninguna celda lleva estilo
+            return np.full([1 if axis in (None, eje) else n for eje, n in enumerate(valores.shape)], np.nan) if axis is not None else np.nan
+        with warnings.catch_warnings(): # columnas o filas enteramente nulas
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return funcion(valores, axis = axis, keepdims = axis is not None)
+
+    def _resaltar_extremo(self, funcion, color, subset, axis, props):
+        props = props or f'background-color: {color};'
+
+        def regla(bloque):
+            valores = self._numeros(bloque)
+            return np.where(valores == self._extremo(valores, funcion, axis), 0, -1), (props,)
+        return self._anadir(subset, regla, numericas = True)
+
+    def highlight_max(self, color = 'yellow', subset = None, axis = 0, props = None):
+        """Resalta el máximo de cada columna (axis = 0), de cada fila (axis = 1) o de toda la tabla (axis = None)."""
+        return self._resaltar_extremo(np.nanmax, color, subset, axis, props)
+
+    def highlight_min(self, color = 'yellow', subset = None, axis = 0, props = None):
+        """Resalta el mínimo de cada columna (axis = 0), de cada fila (axis = 1) o de toda la tabla (axis = None)."""
+        return self._resaltar_extremo(np.nanmin, color, subset, axis, props)
+
+    def highlight_null(self, color = 'red', subset = None, props = None):
+        """Resalta los nulos."""
+        props = props or f'background-color: {color};'
+        return self._anadir(subset, lambda bloque: (np.where(bloque.isna().to_numpy(), 0, -1), (props,)))
+
+    def bar(self, subset = None, axis = 0, color = '#d65f5f', width = 100, vmin = None, vmax = None):
+        """Barras proporcionales al valor (como df.style.bar con align = 'mid'): desde el cero hasta el valor.
+
+        - width: porcentaje de la celda que ocupa la barra del valor más grande
+        - vmin, vmax: límites de la escala (por defecto el mínimo y el máximo de cada columna, fila o tabla según axis)
+        """
+        def regla(bloque):
+            valores = self._numeros(bloque)
+            minimo = self._extremo(valores, np.nanmin, axis) if vmin is None else vmin
+            maximo = self._extremo(valores, np.nanmax, axis) if vmax is None else vmax
+            minimo, maximo = np.minimum(minimo, 0), np.maximum(maximo, 0)
+            rango = np.where(maximo > minimo, maximo - minimo, 1)
+            cero = (0 - minimo) / rango * width
+            nulos = np.isnan(valores)
+            valor = np.clip(np.where(nulos, 0 - minimo, valores - minimo) / rango, 0, 1) * width
+            desde = np.rint(np.minimum(cero, valor) * _DECIMAS).astype('int64')
+            hasta = np.rint(np.maximum(cero, valor) * _DECIMAS).astype('int64')
+
+            # Los estilos distintos son las parejas (desde, hasta) distintas, y solo para esas se genera el CSS
+            pareja = np.where(nulos, -1, desde * (width * _DECIMAS + 1) + hasta)
+            codigos, parejas = pd.factorize(pareja.ravel())
+            estilos = []
+            for p in parejas:
+                i, d = divmod(int(p), width * _DECIMAS + 1)
+                i, d = i / _DECIMAS, d / _DECIMAS
+                estilos.append(f'width: 10em; background: linear-gradient(90deg, transparent {i:.1f}%, {color} {i:.1f}%, '
+                               f'{color} {d:.1f}%, transparent {d:.1f}%);' if p >= 0 else '')
+            return codigos.reshape(valores.shape), tuple(estilos)
+        return self._anadir(subset, regla, numericas = True)
+
+    def where(self, condicion, estilo, otro = None, subset = None):
+        """Aplica estilo donde se cumple la condición y otro (si se indica) donde no.
+
+        condicion recibe cada columna (una Series) y devuelve un array de booleanos, p.e. lambda x: x > 400.
+        Es la forma vectorizada de applymap con funciones como mayor_que.
+        """
+        def regla(bloque):
+            # Los nulos de las condiciones con tipos nullable (pd.NA) cuentan como que no se cumple
+            cumple = np.column_stack([pd.array(condicion(bloque.iloc[:, j]), dtype = 'boolean').to_numpy(dtype = bool, na_value = False)
+                                      for j in range(bloque.shape[1])])
+            return np.where(cumple, 0, 1 if otro else -1), (estilo, otro)
+        return self._anadir(subset, regla)
+
+    def map(self, funcion, subset = None):
+        """Como df.style.map (applymap) pero llamando a funcion una sola vez por cada valor distinto de cada columna."""
+        def regla(bloque):
+            codigos = np.empty(bloque.shape, dtype = 'int64')
+            estilos = {}
+            for j in range(bloque.shape[1]):
+                valores, unicos = pd.factorize(bloque.iloc[:, j], use_na_sentinel = False)
+                por_valor = np.array([estilos.setdefault(_propiedades(funcion(v)), len(estilos)) for v in unicos], dtype = 'int64')
+                codigos[:, j] = por_valor[valores]
+            return codigos, tuple(estilos) # los estilos vacíos ('' o None) se quedan sin estilo
+        return self._anadir(subset, regla)
+
+    applymap = map
+
+    # Cálculo de los estilos
+
+    def _calcular(self):
+        # Clase de estilo de cada celda (-1 sin estilo) y CSS de cada clase
+        if self._calculado is not None:
+            return self._calculado
+
+        n, m = self.df.shape
+        piezas = {}
+        combinadas = [None] * m # por columna: códigos de la combinación de estilos de cada celda y piezas de cada combinación
+        for posiciones, regla in self._reglas:
+            codigos, estilos = regla(self.df.iloc[:, posiciones])
+            ids = np.array([piezas.setdefault(_propiedades(e), len(piezas)) if _propiedades(e) else -1 for e in estilos] + [-1])
+            for j, columna in enumerate(posiciones):
+                nuevos = ids[codigos[:, j]] # el -1 de los códigos toma el último, que es -1
+                if combinadas[columna] is None:
+                    combinadas[columna] = (np.zeros(n, dtype = 'int64'), [()])
+                anteriores, combinaciones = combinadas[columna]
+                # Cada combinación (anterior, pieza nueva) pasa a ser un código nuevo, sin que los códigos crezcan
+                codigos_nuevos, parejas = pd.factorize(anteriores * (len(piezas) + 1) + nuevos + 1)
+                combinaciones = [combinaciones[p // (len(piezas) + 1)] + ((p % (len(piezas) + 1) - 1,) if p % (len(piezas) + 1) else ())
+                                 for p in parejas]
+                combinadas[columna] = (codigos_nuevos, combinaciones)
+
+        textos = list(piezas)
+        clases = np.full((n, m), -1, dtype = 'int32')
+        css = {}
+        for columna, combinacion in enumerate(combinadas):
+            if combinacion is None:
+                continue
+            codigos, combinaciones = combinacion
+            por_combinacion = np.array([css.setdefault('; '.join(textos[p] for p in c), len(css)) if c else -1
+                                        for c in combinaciones], dtype = 'int32')
+            clases[:, columna] = por_combinacion[codigos]
+        self._calculado = clases, list(css)
+        return self._calculado
+
+    def css(self):
+        """DataFrame con el CSS de cada celda ('' si no tiene estilo), como el que devuelven las funciones de df.style.apply."""
+        clases, css = self._calcular()
+        textos = np.array(css + [''], dtype = object)
+        return pd.DataFrame(textos[clases], index = self.df.index, columns = self.df.columns)
+
+    def to_styler(self):
+        """df.style con los estilos ya calculados, aplicados de una vez (necesita jinja2 para renderizar)."""
+        return self.df.style.apply(lambda _: self.css(), axis = None)
+
+    # HTML
+
+    def _formatear(self, serie):
+        if pd.api.types.is_float_dtype(serie.dtype):
+            formato = lambda v: f'{v:.{self.precision}f}'
+        else:
+            formato = str
+        return [self.na_rep if nulo else html.escape(formato(v)) for v, nulo in zip(serie.tolist(), serie.isna().tolist())]
+
+    def _cabecera(self):
+        columnas = self.df.columns
+        niveles = [columnas.get_level_values(k) for k in range(columnas.nlevels)]
+        nombres = columnas.names
+        filas = []
+        for nivel, nombre in zip(niveles, nombres):
+            celdas = ''.join(f'<th class="col_heading">{html.escape(str(c))}</th>' for c in nivel)
+            filas.append(f'<tr><th class="index_name">{html.escape(str(nombre)) if nombre is not None else ""}</th>'
+                         + '<th></th>' * (self.df.index.nlevels - 1) + celdas + '</tr>')
+        if any(nombre is not None for nombre in self.df.index.names):
+            filas.append('<tr>' + ''.join(f'<th class="index_name">{html.escape(str(n)) if n is not None else ""}</th>'
+                                          for n in self.df.index.names) + '<th></th>' * self.df.shape[1] + '</tr>')
+        return '<thead>' + ''.join(filas) + '</thead>'
+
+    def to_html(self, inicio = 0, filas = None, table_id = None):
+        """HTML de la tabla con solo las filas desde inicio (todas si filas es None).
+
+        Las celdas con estilo llevan una clase CSS por combinación de estilos en lugar de una regla por celda.
+        """
+        clases, css = self._calcular()
+        fin = self.df.shape[0] if filas is None else min(self.df.shape[0], inicio + filas)
+        visible = self.df.iloc[inicio:fin]
+        clases = clases[inicio:fin]
+        table_id = table_id or f'T_{uuid.uuid4().hex[:8]}'
+
+        textos = [self._formatear(visible.iloc[:, j]) for j in range(visible.shape[1])]
+        indice = [self._formatear(pd.Series(visible.index.get_level_values(k))) for k in range(visible.index.nlevels)]
+        etiquetas = [f'<td class="c{k}">' for k in range(len(css))] + ['<td>'] # la clase -1 toma la última, sin estilo
+
+        cuerpo = []
+        for i in range(len(visible)):
+            cabecera = ''.join(f'<th class="row_heading">{nivel[i]}</th>' for nivel in indice)
+            celdas = ''.join(etiquetas[clase] + texto + '</td>' for clase, texto in zip(clases[i].tolist(), (t[i] for t in textos)))
+            cuerpo.append(f'<tr>{cabecera}{celdas}</tr>')
+
+        usadas = np.unique(clases) # solo las reglas de las clases que aparecen en estas filas
+        estilos = '\n'.join(f'#{table_id} td.c{k} {{{css[k]}}}' for k in usadas[usadas >= 0].tolist())
+        return (f'<style type="text/css">\n{estilos}\n</style>\n<table id="{table_id}">\n{self._cabecera()}\n'
+                '<tbody>\n' + '\n'.join(cuerpo) + '\n</tbody>\n</table>\n')
+
+    def paginas(self, filas_por_pagina = FILAS_POR_PAGINA):
+        """Genera el HTML de cada página de filas_por_pagina filas (se renderiza cada una solo cuando se pide)."""
+        for inicio in range(0, max(len(self.df), 1), filas_por_pagina):
+            yield self.to_html(inicio, filas_por_pagina)
+
+    def guardar_html(self, ruta, filas_por_pagina = None):
+        """Guarda la tabla en ruta o, con filas_por_pagina, en ruta_0001.html, ruta_0002.html... enlazadas entre sí.
+
+        Devuelve la lista de archivos escritos.
+        """
+        if filas_por_pagina is None:
+            with open(ruta, 'w', encoding = 'utf-8') as archivo:
+                archivo.write(self.to_html())
+            return [ruta]
+
+        base, extension = os.path.splitext(ruta)
+        total = max(1, -(-len(self.df) // filas_por_pagina))
+        rutas = [f'{base}_{k + 1:04d}{extension or ".html"}' for k in range(total)]
+        for k, (destino, pagina) in enumerate(zip(rutas, self.paginas(filas_por_pagina))):
+            enlaces = [f'<a href="{os.path.basename(rutas[k - 1])}">anterior</a>' if k > 0 else '',
+                       f'página {k + 1} de {total}',
+                       f'<a href="{os.path.basename(rutas[k + 1])}">siguiente</a>' if k + 1 < total else '']
+            with open(destino, 'w', encoding = 'utf-8') as archivo:
+                archivo.write(pagina + '<p>' + ' '.join(e for e in enlaces if e) + '</p>\n')
+        return rutas
+
+    def _repr_html_(self):
+        # En un notebook solo se renderizan las primeras FILAS_VISIBLES filas
+        pie = f'<p>{min(FILAS_VISIBLES, len(self.df))} de {len(self.df)} filas</p>\n' if len(self.df) > FILAS_VISIBLES else ''
+        return self.to_html(0, FILAS_VISIBLES) + pie
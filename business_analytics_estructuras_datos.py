@@ -11,13 +11,14 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from business_analytics_carga import load_kiva
+
 # %matplotlib inline. Es para decirle cómo tiene que sacar los gráficos.
 # En este caso significa que los saque como gráficos estáticos integrados en el propio notebook (de tal forma que se guarde y distribuya más fácilmente).
 
 pd.options.display.min_rows = 6
 
-df = pd.read_csv('../../00_DATASETS/DataSetKivaCreditScoring.csv', sep = ';', index_col = 'id',
-                parse_dates = ['Funded Date','Paid Date'])
+df = load_kiva('../../00_DATASETS/DataSetKivaCreditScoring.csv')
 print(df)
 print(df.head())
 print(df.info())
@@ -38,6 +39,12 @@ print(df.info())
 
 red = df[['Funded Date','Country','Sector','Funded Amount']].copy()
 
+# NOTA: cuando solo vamos a necesitar unas pocas variables podemos evitar cargar el resto (sobre todo Name y Use, que son textos largos).
+# lazy_kiva() apunta las columnas que usamos y solo lee esas al materializar el resultado con collect():
+
+# from business_analytics_carga_perezosa import lazy_kiva
+# red = lazy_kiva('../../00_DATASETS/DataSetKivaCreditScoring.csv')[['Funded Date','Country','Sector','Funded Amount']].collect()
+
 # Simplificamos la fecha quitándole la parte de la hora
 red['Funded Date'] = red['Funded Date'].dt.date
 
@@ -43,25 +43,8 @@ print(df.info())
 
 # Otra manera de hacerlo manual es:
 
-# Define a function to clean column names
-def clean_column_names(df):
-    df.columns = df.columns.str.lower()  # make lower case
-    df.columns = df.columns.str.replace(' ', '_')  # replace spaces with underscores
-    df.columns = df.columns.str.replace('(', '')  # remove left parenthesis
-    df.columns = df.columns.str.replace(')', '')  # remove right parenthesis
-    df.columns = df.columns.str.replace('-', '')  # remove hyphen
-    df.columns = df.columns.str.replace('á', 'a')  # replace accented a with regular a
-    df.columns = df.columns.str.replace('é', 'e')  # replace accented e with regular e
-    df.columns = df.columns.str.replace('í', 'i')  # replace accented i with regular i
-    df.columns = df.columns.str.replace('ó', 'o')  # replace accented o with regular o
-    df.columns = df.columns.str.replace('ú', 'u')  # replace accented u with regular u
-    df.columns = df.columns.str.replace('%', 'percent')  # replace % with percent
-    df.columns = df.columns.str.replace('–', '')  # replace en dash with nothing
-    df.columns = df.columns.str.replace('ó', 'o')  # replace accented o with regular o
-    df.columns = df.columns.str.replace('í', 'i')  # replace accented i with regular i
-    df.columns = df.columns.str.replace('ó', 'o')  # replace accented o with regular o
-    df.columns = df.columns.str.replace('ú', 'u')  # replace accented u with regular u
-    return df
+# Usamos la misma clean_column_names() que en el módulo de variables (está en business_analytics_carga).
+from business_analytics_carga import clean_column_names
 
 # Clean the column names
 df = clean_column_names(df)
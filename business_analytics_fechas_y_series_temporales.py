@@ -12,13 +12,14 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import scipy.stats as sp
 
+from business_analytics_carga import load_kiva
+
 # %matplotlib inline. Es para decirle cómo tiene que sacar los gráficos.
 # En este caso significa que los saque como gráficos estáticos integrados en el propio notebook (de tal forma que se guarde y distribuya más fácilmente).
 
 pd.options.display.min_rows = 6
 
-df = pd.read_csv('DataSetKivaCreditScoring.csv', sep = ';', index_col = 'id',
-                parse_dates = ['Funded Date','Paid Date'])
+df = load_kiva('DataSetKivaCreditScoring.csv')
 print(df)
 print(df.head())
 print(df.info())
@@ -231,8 +232,9 @@ print(df3.index.ceil('H')) # hacia arriba
 # La mejor forma de entender la funcionalidad es ir viendo ejemplos.
 # Para ellos vamos a crear una versión simplificada de nuestro df.
 
-dfs = pd.read_csv('DataSetKivaCreditScoring.csv', sep = ';', index_col = 'Funded Date',
-                parse_dates = ['Funded Date'],usecols = ['Funded Date','Country','Loan Amount'])
+# load_kiva() también admite elegir el índice y leer solo las columnas que necesitamos
+
+dfs = load_kiva(columns = ['Funded Date','Country','Loan Amount'], index_col = 'Funded Date')
 
 print(dfs.head(3))
 
@@ -257,6 +259,12 @@ print(dfs.loc['2007-03-01':'2007-03-15'])
 # Podemos dejar abierta una parte
 print(dfs.loc['2007-03-01':])
 
+# TÉCNICA PRO: con históricos grandes es mejor no cargarlo todo para luego quedarnos con un periodo.
+# load_kiva_range() guarda Kiva partido por año y mes y solo lee las particiones del periodo pedido (los límites funcionan igual que en loc).
+
+# from business_analytics_carga import load_kiva_range
+# load_kiva_range('2007-03-01','2007-03-15', columns = ['Country','Loan Amount'], index_col = 'Funded Date')
+
 # Otra cosa curiosa es que la sintaxis del slice funciona para la parte de las fechas (como acabamos de ver) pero no funciona para la parte de las horas.
 # Para las horas tendremos que usar el método .between_time()
 
@@ -287,11 +295,12 @@ print(df.loc[df['Funded Date'].between('2007-03-01','2007-03-15')])
 
 # Para ilustrar bien esta operación vamos a usar el dataset del IBEX:
 
-ibex = pd.read_csv('Historico_IBEX35_Diario.csv',
-                   decimal = ',', thousands = '.',
-                   parse_dates = ['Fecha'],
-                   index_col = 'Fecha',
-                   infer_datetime_format=True).sort_index()
+# Lo cargamos con load_ibex35(), que interpreta el formato dd.mm.aaaa de la fecha, los separadores españoles, el sufijo M del volumen y el % de la variación.
+# Nos lo devuelve con la fecha como índice y ya ordenado en ascendente.
+
+from business_analytics_carga import load_ibex35
+
+ibex = load_ibex35('Historico_IBEX35_Diario.csv')
 
 print(ibex)
 
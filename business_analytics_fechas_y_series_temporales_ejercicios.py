@@ -35,6 +35,9 @@ df['var'] = df['var'].str.replace(',', '.').str.replace('%', '').astype('float')
 # Mostrando las primeras filas del DataFrame limpio
 print(df.head())
 
+# NOTA: load_ibex35() de business_analytics_carga hace toda esta limpieza (y la de la fecha que vemos a continuación) en una sola lectura.
+# Aquí la hacemos a mano porque es justo lo que queremos practicar.
+
 # EJERCICIO 1: Comprueba si el tipo de la variable fecha ya es un datetime64.
 
 fecha_data_type = df['Fecha'].dtype
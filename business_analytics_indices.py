@@ -0,0 +1,323 @@
+# ÍNDICES SECUNDARIOS
+
+# En las consultas interactivas filtramos una y otra vez por las mismas dimensiones:
+# df.Country.isin(paises_de_interes), ~isin(...), `Country Code` in ["UG","GZ"], Sector == "Food"...
+# Cada uno de esos filtros recorre la columna entera comparando textos.
+
+# Si el dataframe se queda en memoria y se consulta muchas veces compensa precalcular índices, igual que hacen las bases de datos.
+
+# ÍNDICES BITMAP PARA DIMENSIONES
+
+# Para cada valor distinto de una dimensión guardamos en qué filas aparece. Hay dos formas de guardarlo, y usamos la que ocupe menos:
+
+# - densa: un bit por fila (un array de bytes empaquetado con np.packbits), para valores frecuentes
+# - dispersa: la lista ordenada de posiciones de las filas (int32), para valores raros
+
+# Los filtros se combinan con &, | y ~ operando directamente sobre esos bits o posiciones, sin volver a mirar los datos.
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_BITMAP = ['Country','Country Code','Sector','Activity','Status','Delinquent']
+
+# Bits a 1 en cada valor de byte, para contar filas sin desempaquetar
+_BITS_POR_BYTE = np.array([bin(b).count('1') for b in range(256)], dtype = np.uint8)
+
+# Una lista de posiciones int32 ocupa menos que el bitmap cuando el valor aparece en menos de 1 de cada 32 filas
+_DENSIDAD_MINIMA = 1 / 32
+
+
+class Bitmap:
+    """Conjunto de filas resultado de un filtro del índice. Se combina con &, | y ~.
+
+    - mask(): vector booleano, para usar con df.loc[...]
+    - positions(): posiciones de las filas, para usar con df.iloc[...]
+    - count(): número de filas
+    """
+
+    __slots__ = ('n', 'bits', 'posiciones')
+
+    def __init__(self, n, bits = None, posiciones = None):
+        self.n = n
+        self.bits = bits
+        self.posiciones = posiciones
+
+    @classmethod
+    def desde_posiciones(cls, n, posiciones):
+        posiciones = np.asarray(posiciones, dtype = np.int32)
+        if len(posiciones) >= n * _DENSIDAD_MINIMA:
+            return cls(n, bits = _empaquetar(n, posiciones))
+        return cls(n, posiciones = posiciones)
+
+    @property
+    def es_denso(self):
+        return self.bits is not None
+
+    def _denso(self):
+        return self.bits if self.es_denso else _empaquetar(self.n, self.posiciones)
+
+    def __and__(self, otro):
+        if self.es_denso and otro.es_denso:
+            return Bitmap(self.n, bits = self.bits & otro.bits)
+        if not self.es_denso and not otro.es_denso:
+            return Bitmap(self.n, posiciones = np.intersect1d(self.posiciones, otro.posiciones, assume_unique = True))
+        disperso, denso = (self, otro) if not self.es_denso else (otro, self)
+        posiciones = disperso.posiciones
+        return Bitmap(self.n, posiciones = posiciones[_contiene(denso.bits, posiciones)])
+
+    def __or__(self, otro):
+        if not self.es_denso and not otro.es_denso:
+            return Bitmap.desde_posiciones(self.n, np.union1d(self.posiciones, otro.posiciones))
+        if self.es_denso and otro.es_denso:
+            return Bitmap(self.n, bits = self.bits | otro.bits)
+        disperso, denso = (self, otro) if not self.es_denso else (otro, self)
+        bits = denso.bits.copy()
+        _activar(bits, disperso.posiciones)
+        return Bitmap(self.n, bits = bits)
+
+    def __invert__(self):
+        bits = ~self._denso()
+        sobrantes = len(bits) * 8 - self.n
+        if sobrantes:
+            bits[-1] &= np.uint8((0xFF << sobrantes) & 0xFF)
+        return Bitmap(self.n, bits = bits)
+
+    def __sub__(self, otro):
+        return self & ~otro
+
+    def count(self):
+        return int(_BITS_POR_BYTE[self.bits].sum()) if self.es_denso else len(self.posiciones)
+
+    def positions(self):
+        if not self.es_denso:
+            return self.posiciones
+        return np.flatnonzero(np.unpackbits(self.bits, count = self.n))
+
+    def mask(self):
+        if self.es_denso:
+            return np.unpackbits(self.bits, count = self.n).astype(bool)
+        mascara = np.zeros(self.n, dtype = bool)
+        mascara[self.posiciones] = True
+        return mascara
+
+    def __len__(self):
+        return self.count()
+
+    def __repr__(self):
+        return f'Bitmap({self.count()} de {self.n} filas, {"denso" if self.es_denso else "disperso"})'
+
+
+def _empaquetar(n, posiciones):
+    mascara = np.zeros(n, dtype = bool)
+    mascara[posiciones] = True
+    return np.packbits(mascara)
+
+
+def _contiene(bits, posiciones):
+    # np.packbits guarda el primer elemento en el bit más alto de cada byte
+    return (bits[posiciones >> 3] >> (7 - (posiciones & 7)).astype(np.uint8)) & 1 == 1
+
+
+def _activar(bits, posiciones):
+    np.bitwise_or.at(bits, posiciones >> 3, (0x80 >> (posiciones & 7)).astype(np.uint8))
+
+
+class BitmapIndex:
+    """Índice bitmap sobre las dimensiones de un dataframe que se queda en memoria.
+
+    Parámetros más importantes:
+
+    - df: el dataframe a indexar (las posiciones de los filtros se refieren a su orden de filas)
+    - columnas: dimensiones a indexar, por defecto COLUMNAS_BITMAP
+
+    Por ejemplo, el equivalente de df.loc[df.Country.isin(paises_de_interes) & (df.Sector != 'Food')] sería:
+
+    indice = BitmapIndex(df)
+    indice.select(df, indice.isin('Country', paises_de_interes) & ~indice.eq('Sector', 'Food'))
+    """
+
+    def __init__(self, df, columnas = COLUMNAS_BITMAP):
+        self.n = len(df)
+        self.columnas = [c for c in columnas if c in df.columns]
+        self.valores = {}
+        for columna in self.columnas:
+            self.valores[columna] = self._indexar(df[columna])
+
+    def _indexar(self, serie):
+        # Una sola ordenación por código nos da las posiciones de todos los valores a la vez
+        codigos, unicos = pd.factorize(serie)
+        orden = np.argsort(codigos, kind = 'stable').astype(np.int32)
+        cortes = np.searchsorted(codigos[orden], np.arange(len(unicos) + 1))
+        return {valor: Bitmap.desde_posiciones(self.n, orden[cortes[k]:cortes[k + 1]])
+                for k, valor in enumerate(unicos)}
+
+    def _vacio(self):
+        return Bitmap(self.n, posiciones = np.empty(0, dtype = np.int32))
+
+    def eq(self, columna, valor):
+        """Filas donde columna == valor."""
+        if columna not in self.valores:
+            raise KeyError(f'{columna} no está indexada')
+        return self.valores[columna].get(valor, self._vacio())
+
+    def ne(self, columna, valor):
+        """Filas donde columna != valor (igual que en pandas, incluye los nulos)."""
+        return ~self.eq(columna, valor)
+
+    def isin(self, columna, valores):
+        """Filas donde columna está en la lista de valores."""
+        resultado = self._vacio()
+        for valor in valores:
+            resultado = resultado | self.eq(columna, valor)
+        return resultado
+
+    def notin(self, columna, valores):
+        """Filas donde columna NO está en la lista de valores (el ~isin de pandas)."""
+        return ~self.isin(columna, valores)
+
+    def select(self, df, filtro):
+        """Aplica el filtro al dataframe indexado."""
+        if len(df) != self.n:
+            raise ValueError('El dataframe no tiene las mismas filas que cuando se creó el índice')
+        return df.iloc[filtro.positions()]
+
+    def memory_usage(self):
+        """Bytes que ocupa el índice por columna."""
+        return pd.Series({columna: sum((b.bits if b.es_denso else b.posiciones).nbytes for b in valores.values())
+                          for columna, valores in self.valores.items()})
+
+
+# ÍNDICE ORDENADO PARA IMPORTES
+
+# Los filtros por rango (df['Loan Amount'].between(1000,2000), 1000 < `Funded Amount` < 2000, `Funded Amount` > @media)
+# también recorren la columna entera cada vez, y nlargest/nsmallest la vuelven a ordenar.
+
+# Si guardamos una vez la permutación que ordena la columna (las posiciones de las filas de menor a mayor importe),
+# cualquier rango se resuelve con dos búsquedas binarias (np.searchsorted) y los N mayores o menores son directamente el principio o el final.
+
+# Cuando llegan registros nuevos no hace falta reordenar todo: se ordenan solo los nuevos y se intercalan con los que ya había.
+
+COLUMNAS_RANGO = ['Loan Amount','Funded Amount','Paid Amount']
+
+
+class SortedIndex:
+    """Índice ordenado sobre variables numéricas de un dataframe que se queda en memoria.
+
+    Parámetros más importantes:
+
+    - df: el dataframe a indexar (las posiciones se refieren a su orden de filas)
+    - columnas: variables a indexar, por defecto COLUMNAS_RANGO
+
+    Los nulos se guardan aparte: between() y las comparaciones no los devuelven, y nlargest()/nsmallest() solo los añaden al final
+    si se piden más filas que valores hay, igual que pandas.
+    Los filtros devuelven un Bitmap, así que se pueden combinar con los de BitmapIndex:
+
+    rangos = SortedIndex(df)
+    rangos.select(df, rangos.between('Loan Amount', 1000, 2000) & indice.eq('Sector', 'Food'))
+    """
+
+    def __init__(self, df, columnas = COLUMNAS_RANGO):
+        self.n = 0
+        self.valores = {}
+        self.posiciones = {}
+        self.nulos = {}
+        self.columnas = [c for c in columnas if c in df.columns]
+        for columna in self.columnas:
+            self.valores[columna] = np.empty(0, dtype = 'float64')
+            self.posiciones[columna] = np.empty(0, dtype = np.int64)
+            self.nulos[columna] = np.empty(0, dtype = np.int64)
+        self.append(df)
+
+    @staticmethod
+    def _ordenar(serie, desplazamiento):
+        valores = serie.to_numpy(dtype = 'float64', na_value = np.nan)
+        nulos = np.isnan(valores)
+        posiciones = np.flatnonzero(~nulos)
+        orden = np.argsort(valores[posiciones], kind = 'stable')
+        return valores[posiciones][orden], posiciones[orden] + desplazamiento, np.flatnonzero(nulos) + desplazamiento
+
+    def append(self, df_nuevo):
+        """Añade al índice las filas de df_nuevo, que se suponen concatenadas al final del dataframe indexado."""
+        for columna in self.columnas:
+            nuevos, posiciones, nulos = self._ordenar(df_nuevo[columna], self.n)
+            self.nulos[columna] = np.concatenate([self.nulos[columna], nulos])
+            # side = 'right': ante empates las filas antiguas (posiciones menores) quedan delante
+            huecos = np.searchsorted(self.valores[columna], nuevos, side = 'right')
+            self.valores[columna] = np.insert(self.valores[columna], huecos, nuevos)
+            self.posiciones[columna] = np.insert(self.posiciones[columna], huecos, posiciones)
+        self.n += len(df_nuevo)
+        return self
+
+    def _columna(self, columna):
+        if columna not in self.valores:
+            raise KeyError(f'{columna} no está indexada')
+        return self.valores[columna], self.posiciones[columna]
+
+    def _rango(self, columna, desde, hasta):
+        return Bitmap.desde_posiciones(self.n, np.sort(self._columna(columna)[1][desde:hasta]))
+
+    def between(self, columna, izquierda, derecha, inclusive = 'both'):
+        """Filas con izquierda <= columna <= derecha (inclusive: 'both', 'neither', 'left' o 'right', como Series.between)."""
+        if inclusive not in ('both','neither','left','right'):
+            raise ValueError("inclusive debe ser 'both', 'neither', 'left' o 'right'")
+        valores = self._columna(columna)[0]
+        desde = np.searchsorted(valores, izquierda, side = 'left' if inclusive in ('both','left') else 'right')
+        hasta = np.searchsorted(valores, derecha, side = 'right' if inclusive in ('both','right') else 'left')
+        return self._rango(columna, desde, max(desde, hasta))
+
+    def gt(self, columna, valor):
+        return self._rango(columna, np.searchsorted(self._columna(columna)[0], valor, side = 'right'), None)
+
+    def ge(self, columna, valor):
+        return self._rango(columna, np.searchsorted(self._columna(columna)[0], valor, side = 'left'), None)
+
+    def lt(self, columna, valor):
+        return self._rango(columna, 0, np.searchsorted(self._columna(columna)[0], valor, side = 'left'))
+
+    def le(self, columna, valor):
+        return self._rango(columna, 0, np.searchsorted(self._columna(columna)[0], valor, side = 'right'))
+
+    def nsmallest(self, df, n, columna):
+        """Igual que df.nsmallest(n, columna) (keep = 'first'), sin ordenar."""
+        posiciones = self._columna(columna)[1]
+        return df.iloc[np.concatenate([posiciones[:n], self.nulos[columna][:max(0, n - len(posiciones))]])]
+
+    def nlargest(self, df, n, columna):
+        """Igual que df.nlargest(n, columna) (keep = 'first'), sin ordenar."""
+        valores, posiciones = self._columna(columna)
+        if n <= 0 or len(valores) == 0:
+            return df.iloc[self.nulos[columna][:max(0, n)]]
+        sobrantes = self.nulos[columna][:max(0, n - len(valores))]
+        n = min(n, len(valores))
+        # Los mayores que el n-ésimo entran todos; del n-ésimo, como en pandas, las primeras filas en aparecer
+        corte = valores[-n]
+        mayores = np.searchsorted(valores, corte, side = 'right')
+        empatados = np.searchsorted(valores, corte, side = 'left')
+        elegidas = np.concatenate([posiciones[mayores:], posiciones[empatados:empatados + n - (len(valores) - mayores)]])
+        orden = np.lexsort((elegidas, -np.concatenate([valores[mayores:], np.full(len(elegidas) - (len(valores) - mayores), corte)])))
+        return df.iloc[np.concatenate([elegidas[orden], sobrantes])]
+
+    def select(self, df, filtro):
+        """Aplica el filtro al dataframe indexado."""
+        if len(df) != self.n:
+            raise ValueError('El dataframe no tiene las mismas filas que el índice')
+        return df.iloc[filtro.positions()]
+
+    def guardar(self, ruta):
+        """Guarda el índice en un archivo .npz para no tener que reordenar en la siguiente sesión."""
+        np.savez(ruta, n = self.n, columnas = np.array(self.columnas),
+                 **{f'valores_{k}': v for k, v in enumerate(self.valores.values())},
+                 **{f'posiciones_{k}': p for k, p in enumerate(self.posiciones.values())},
+                 **{f'nulos_{k}': p for k, p in enumerate(self.nulos.values())})
+
+    @classmethod
+    def cargar(cls, ruta):
+        """Recupera un índice guardado con guardar()."""
+        with np.load(ruta) as datos:
+            indice = cls.__new__(cls)
+            indice.n = int(datos['n'])
+            indice.columnas = datos['columnas'].tolist()
+            indice.valores = {c: datos[f'valores_{k}'] for k, c in enumerate(indice.columnas)}
+            indice.posiciones = {c: datos[f'posiciones_{k}'] for k, c in enumerate(indice.columnas)}
+            indice.nulos = {c: datos[f'nulos_{k}'] for k, c in enumerate(indice.columnas)}
+        return indice
@@ -0,0 +1,482 @@
+print("******************")
+print("BUSINESS ANALYTICS")
+print("******************")
+
+print("*****************************")
+print("SERVIDOR LOCAL DE CONSULTAS")
+print("*****************************")
+
+# Cada script interactivo carga el CSV, lanza una consulta, la imprime y termina: cada pregunta paga la carga completa.
+# Este servidor carga los datasets una sola vez y los deja en memoria junto con todo lo que se puede precalcular:
+
+# - los índices bitmap de las dimensiones y los índices ordenados de los importes (ver business_analytics_indices)
+# - la factorización de las variables de agrupación (Agrupaciones, ver business_analytics_agregados)
+# - una caché con las respuestas ya calculadas, que se descarta si el dataframe cambia (CacheResultados)
+
+# Las consultas de business_analytics_consultas_interactivas.py llegan como peticiones HTTP (por TCP o por un socket Unix):
+
+# GET  /datasets                  datasets cargados, con sus filas y los tipos de sus columnas
+# GET  /metricas                  peticiones, errores, rechazadas y latencias (p50, p95, p99 y máxima) por operación
+# POST /<dataset>/<operacion>     con los parámetros de la operación en un JSON, por ejemplo en /kiva/crosstab:
+#                                 {"index": "Country", "columns": "Sector", "normalize": "index"}
+
+# Operaciones (ver OPERACIONES):
+
+# - query: {"expr": "`Funded Amount` > @media", "params": {"media": 1000}}, como df.query()
+# - filtro: {"isin": {"Country": [...]}, "eq": {"Sector": "Food"}, "between": {"Loan Amount": [1000, 2000]}}, con los índices
+# - nlargest / nsmallest: {"n": 10, "column": "Funded Amount"}
+# - value_counts: {"column": "Country", "normalize": false}
+# - groupby: {"by": "Sector", "agg": {"media": ["Funded Amount", "mean"]}} o {"by": "Sector", "funciones": ["count","mean"]},
+#   que sin "columns" agrega todas las variables numéricas
+# - crosstab: {"index": "Country", "columns": "Sector", "values": ..., "aggfunc": ..., "normalize": ..., "margins": ...}
+# - pivot_table: {"index": "Country", "columns": "Sector", "values": "Funded Amount", "aggfunc": "mean", "margins": ...}
+
+# Todas admiten además "limit" (número máximo de filas) y las que devuelven una tabla "columns_out" (columnas a devolver).
+
+# La respuesta es JSON (orient = 'split') o, si se pide con Accept: application/vnd.apache.arrow.stream o con ?formato=arrow,
+# un stream de Arrow IPC que el front-end puede leer sin parsear texto.
+# Cada respuesta lleva la cabecera Server-Timing con lo que ha tardado y X-Cache con hit o miss.
+
+# Para que un pico de peticiones no deje sin memoria ni bloquee el servidor hay un límite de consultas a la vez
+# y una cola máxima: el resto se rechaza con 503 y Retry-After. Las consultas que tardan demasiado devuelven 504.
+
+# NOTA: las consultas se ejecutan en hilos para no bloquear el bucle de asyncio, pero pandas apenas suelta el GIL,
+# así que cada dataset se consulta de una en una (con un cerrojo, que además protege sus cachés).
+
+# NOTA: query evalúa expresiones como df.query(), así que el servidor escucha por defecto solo en 127.0.0.1.
+
+# Uso: python business_analytics_servidor.py [--puerto 8765] [--socket ruta] [dataset ...]
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+from pandas.errors import UndefinedVariableError
+
+from business_analytics_agregados import Agrupaciones
+from business_analytics_cache_consultas import CacheResultados, cached_query, compilar_consulta
+from business_analytics_carga import load_accidents, load_kiva
+from business_analytics_indices import COLUMNAS_BITMAP, COLUMNAS_RANGO, BitmapIndex, SortedIndex
+
+try:
+    import pyarrow as pa
+except ImportError: # sin pyarrow solo se responde en JSON
+    pa = None
+
+HOST = '127.0.0.1'
+PUERTO = 8765
+
+# Datasets que se pueden servir y cómo se cargan
+CARGADORES = {'kiva': lambda: load_kiva(optimizar = True),
+              'accidentes': load_accidents}
+
+# Consultas que se ejecutan a la vez y cuántas más pueden esperar en cola antes de rechazar con 503
+MAX_CONCURRENTES = 4
+MAX_COLA = 64
+
+# Segundos que puede tardar una consulta antes de devolver 504
+TIMEOUT = 30
+
+# Tamaño máximo del cuerpo de una petición (los parámetros son un JSON pequeño)
+MAX_CUERPO = 1024 ** 2
+
+# Latencias que se guardan por operación para calcular los percentiles
+VENTANA_METRICAS = 1000
+
+TIPO_JSON = 'application/json'
+TIPO_ARROW = 'application/vnd.apache.arrow.stream'
+
+_MOTIVOS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 406: 'Not Acceptable',
+            413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+class ErrorHTTP(Exception):
+    """Error que se devuelve al cliente con su código HTTP."""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+# DATASETS RESIDENTES
+
+class Dataset:
+    """Un dataset en memoria con sus índices, sus agrupaciones y su caché de respuestas.
+
+    Parámetros más importantes:
+
+    - df: el dataframe
+    - dimensiones: variables para los índices bitmap, por defecto las de COLUMNAS_BITMAP y las category
+    - importes: variables numéricas para los índices ordenados, por defecto las de COLUMNAS_RANGO
+    """
+
+    def __init__(self, df, dimensiones = None, importes = None):
+        self.df = df
+        if dimensiones is None:
+            dimensiones = [c for c in df.columns if c in COLUMNAS_BITMAP or isinstance(df[c].dtype, pd.CategoricalDtype)]
+        if importes is None:
+            importes = [c for c in COLUMNAS_RANGO if c in df.columns]
+        self.bitmap = BitmapIndex(df, dimensiones)
+        self.rangos = SortedIndex(df, importes)
+        self.agrupaciones = Agrupaciones(df)
+        self.cache = CacheResultados(df)
+        self.cerrojo = threading.Lock()
+
+    def describir(self):
+        return {'filas': len(self.df), 'columnas': {c: str(t) for c, t in self.df.dtypes.items()},
+                'indice': self.df.index.name, 'dimensiones': self.bitmap.columnas, 'importes': self.rangos.columnas}
+
+
+def cargar_datasets(nombres = None):
+    """Diccionario nombre -> Dataset con los datasets de CARGADORES (todos por defecto) cuyo archivo exista."""
+    datasets = {}
+    for nombre in nombres or CARGADORES:
+        if nombre not in CARGADORES:
+            raise ValueError(f'{nombre} no es un dataset conocido: {list(CARGADORES)}')
+        inicio = time.perf_counter()
+        try:
+            df = CARGADORES[nombre]()
+        except FileNotFoundError as error:
+            print(f'{nombre}: no se carga, no se encuentra {error.filename}')
+            continue
+        datasets[nombre] = Dataset(df)
+        print(f'{nombre}: {len(df)} filas cargadas e indexadas en {time.perf_counter() - inicio:.1f} s')
+    return datasets
+
+
+# OPERACIONES
+
+# Cada operación recibe el Dataset y los parámetros del JSON con su nombre: un parámetro desconocido es un TypeError (400).
+
+def _query(dataset, expr, params = None):
+    params = params or {}
+    faltan = compilar_consulta(expr).parametros - set(params)
+    if faltan: # no buscar las variables que falten entre las del servidor, como haría df.query()
+        raise UndefinedVariableError(sorted(faltan)[0], is_local = True)
+    return cached_query(dataset.df, expr, **params)
+
+
+_FILTROS_BITMAP = ('eq','ne','isin','notin')
+
+
+def _filtro(dataset, eq = None, ne = None, isin = None, notin = None, between = None, gt = None, ge = None, lt = None, le = None):
+    condiciones = dict(eq = eq, ne = ne, isin = isin, notin = notin, gt = gt, ge = ge, lt = lt, le = le)
+    filtro = None
+    for operador, columnas in condiciones.items():
+        indice = dataset.bitmap if operador in _FILTROS_BITMAP else dataset.rangos
+        for columna, valor in (columnas or {}).items():
+            condicion = getattr(indice, operador)(columna, valor)
+            filtro = condicion if filtro is None else filtro & condicion
+    for columna, limites in (between or {}).items():
+        condicion = dataset.rangos.between(columna, *limites)
+        filtro = condicion if filtro is None else filtro & condicion
+    return dataset.df if filtro is None else dataset.bitmap.select(dataset.df, filtro)
+
+
+def _nlargest(dataset, n, column):
+    return dataset.rangos.nlargest(dataset.df, n, column)
+
+
+def _nsmallest(dataset, n, column):
+    return dataset.rangos.nsmallest(dataset.df, n, column)
+
+
+def _value_counts(dataset, column, normalize = False, dropna = True):
+    return dataset.df[column].value_counts(normalize = normalize, dropna = dropna)
+
+
+def _groupby(dataset, by, funciones = None, columns = None, agg = None):
+    if funciones is not None and columns is None: # como groupby().agg(['count','mean']), que solo tiene sentido en las numéricas
+        claves = [by] if isinstance(by, str) else list(by)
+        columns = [c for c in dataset.df.select_dtypes('number').columns if c not in claves]
+    nombradas = {nombre: tuple(agregacion) for nombre, agregacion in (agg or {}).items()}
+    return dataset.agrupaciones.agg(by, funciones, columns, **nombradas)
+
+
+def _crosstab(dataset, index, columns, values = None, aggfunc = None, normalize = False, margins = False, margins_name = 'All'):
+    return dataset.agrupaciones.crosstab(index, columns, values, aggfunc, normalize, margins, margins_name)
+
+
+def _pivot_table(dataset, index, columns, values, aggfunc = 'mean', fill_value = None, margins = False, margins_name = 'All'):
+    return dataset.agrupaciones.pivot_table(index, columns, values, aggfunc, fill_value, margins, margins_name)
+
+
+OPERACIONES = {'query': _query,
+               'filtro': _filtro,
+               'nlargest': _nlargest,
+               'nsmallest': _nsmallest,
+               'value_counts': _value_counts,
+               'groupby': _groupby,
+               'crosstab': _crosstab,
+               'pivot_table': _pivot_table}
+
+
+# CODIFICACIÓN DE LAS RESPUESTAS
+
+def _como_tabla(resultado):
+    if isinstance(resultado, pd.Series):
+        return resultado.to_frame(resultado.name if resultado.name is not None else 'valor')
+    if isinstance(resultado, pd.DataFrame):
+        return resultado
+    return pd.DataFrame({'valor': [resultado]})
+
+
+def _nombre_columna(nombre):
+    return ' | '.join(map(str, nombre)) if isinstance(nombre, tuple) else str(nombre)
+
+
+def codificar(resultado, formato = 'json'):
+    """Bytes de la respuesta: JSON con orient = 'split' o un stream de Arrow IPC con el índice como columnas."""
+    tabla = _como_tabla(resultado)
+    if formato == 'json':
+        return tabla.to_json(orient = 'split', date_format = 'iso').encode()
+
+    # Arrow solo admite nombres de columna de texto y de un nivel (crosstab y pivot_table devuelven columnas MultiIndex)
+    tabla = tabla.set_axis([_nombre_columna(c) for c in tabla.columns], axis = 1)
+    tabla = pa.Table.from_pandas(tabla, preserve_index = True)
+    destino = pa.BufferOutputStream()
+    with pa.ipc.new_stream(destino, tabla.schema) as escritor:
+        escritor.write_table(tabla)
+    return destino.getvalue().to_pybytes()
+
+
+def _recortar(resultado, columnas, limite):
+    if columnas is not None:
+        if not isinstance(resultado, pd.DataFrame):
+            raise ValueError('columns_out solo se puede usar en operaciones que devuelven una tabla')
+        resultado = resultado[columnas]
+    if limite is not None:
+        resultado = resultado.head(limite)
+    return resultado
+
+
+# MÉTRICAS
+
+class Metricas:
+    """Peticiones, errores, aciertos de caché y latencias de las últimas VENTANA_METRICAS peticiones de cada operación."""
+
+    def __init__(self, ventana = VENTANA_METRICAS):
+        self.ventana = ventana
+        self.inicio = time.time()
+        self.rechazadas = 0
+        self.en_curso = 0
+        self.peticiones = collections.Counter()
+        self.errores = collections.Counter()
+        self.aciertos = collections.Counter()
+        self.latencias = collections.defaultdict(lambda: collections.deque(maxlen = self.ventana))
+
+    def anotar(self, operacion, segundos, error = False, acierto = False):
+        self.peticiones[operacion] += 1
+        self.errores[operacion] += error
+        self.aciertos[operacion] += acierto
+        self.latencias[operacion].append(segundos * 1000)
+
+    def resumen(self):
+        operaciones = {}
+        for operacion, latencias in self.latencias.items():
+            p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+            operaciones[operacion] = {'peticiones': self.peticiones[operacion], 'errores': self.errores[operacion],
+                                      'aciertos_cache': self.aciertos[operacion], 'p50_ms': round(p50, 3),
+                                      'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3), 'max_ms': round(max(latencias), 3)}
+        return {'segundos_activo': round(time.time() - self.inicio), 'peticiones': sum(self.peticiones.values()),
+                'errores': sum(self.errores.values()), 'rechazadas': self.rechazadas, 'en_curso': self.en_curso,
+                'operaciones': operaciones}
+
+
+# SERVIDOR HTTP
+
+async def _leer_peticion(lector):
+    # Método, ruta, cabeceras (en minúsculas) y cuerpo de la siguiente petición, o None si el cliente ha cerrado la conexión
+    linea = await lector.readline()
+    if not linea.strip():
+        return None
+    metodo, ruta, _ = linea.decode('latin-1').split(' ', 2)
+    cabeceras = {}
+    while (linea := await lector.readline()) not in (b'\r\n', b'\n', b''):
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        cabeceras[nombre.strip().lower()] = valor.strip()
+    longitud = int(cabeceras.get('content-length', 0))
+    if longitud > MAX_CUERPO:
+        raise ErrorHTTP(413, f'el cuerpo no puede pasar de {MAX_CUERPO} bytes')
+    cuerpo = await lector.readexactly(longitud) if longitud else b''
+    return metodo.upper(), ruta, cabeceras, cuerpo
+
+
+def _respuesta(estado, tipo, datos, cabeceras = None, mantener = True):
+    lineas = [f'HTTP/1.1 {estado} {_MOTIVOS.get(estado, "")}', f'Content-Type: {tipo}', f'Content-Length: {len(datos)}',
+              'Connection: ' + ('keep-alive' if mantener else 'close')]
+    lineas += [f'{nombre}: {valor}' for nombre, valor in (cabeceras or {}).items()]
+    return ('\r\n'.join(lineas) + '\r\n\r\n').encode('latin-1') + datos
+
+
+def _error(estado, mensaje):
+    return estado, TIPO_JSON, json.dumps({'error': mensaje}).encode(), {}
+
+
+class ServidorConsultas:
+    """Servidor HTTP de consultas sobre datasets residentes.
+
+    Parámetros más importantes:
+
+    - datasets: diccionario nombre -> Dataset (ver cargar_datasets)
+    - max_concurrentes: consultas que se ejecutan a la vez
+    - max_cola: consultas que pueden esperar turno; a partir de ahí se responde 503
+    - timeout: segundos que puede tardar una consulta antes de responder 504 (sigue contando como en curso hasta que acaba)
+
+    Por ejemplo:
+
+    servidor = ServidorConsultas(cargar_datasets(['kiva']))
+    asyncio.run(servidor.servir(puerto = 8765))
+    """
+
+    def __init__(self, datasets, max_concurrentes = MAX_CONCURRENTES, max_cola = MAX_COLA, timeout = TIMEOUT):
+        self.datasets = datasets
+        self.max_concurrentes, self.max_cola, self.timeout = max_concurrentes, max_cola, timeout
+        self.metricas = Metricas()
+        self._hilos = concurrent.futures.ThreadPoolExecutor(max_concurrentes, thread_name_prefix = 'consulta')
+        self._semaforo = None
+        self._pendientes = 0
+
+    async def servir(self, host = HOST, puerto = PUERTO, socket = None):
+        """Atiende peticiones por TCP en host:puerto o, si se indica, por el socket Unix de esa ruta."""
+        self._semaforo = asyncio.Semaphore(self.max_concurrentes)
+        if socket is not None:
+            servidor = await asyncio.start_unix_server(self._atender, path = socket)
+        else:
+            servidor = await asyncio.start_server(self._atender, host, puerto)
+        direcciones = ', '.join(str(s.getsockname()) for s in servidor.sockets)
+        print(f'Escuchando en {direcciones} con {list(self.datasets)}')
+        async with servidor:
+            await servidor.serve_forever()
+
+    async def _atender(self, lector, escritor):
+        # Una conexión puede traer varias peticiones seguidas (keep-alive), así el front-end no paga una conexión por consulta
+        try:
+            while True:
+                try:
+                    peticion = await _leer_peticion(lector)
+                    if peticion is None:
+                        break
+                    metodo, ruta, cabeceras, cuerpo = peticion
+                    mantener = cabeceras.get('connection', '').lower() != 'close'
+                    estado, tipo, datos, extra = await self._responder(metodo, ruta, cabeceras, cuerpo)
+                except ErrorHTTP as error:
+                    mantener = False
+                    estado, tipo, datos, extra = _error(error.estado, str(error))
+                except ValueError:
+                    mantener = False
+                    estado, tipo, datos, extra = _error(400, 'petición HTTP mal formada')
+                escritor.write(_respuesta(estado, tipo, datos, extra, mantener))
+                await escritor.drain()
+                if not mantener:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _responder(self, metodo, ruta, cabeceras, cuerpo):
+        url = urllib.parse.urlsplit(ruta)
+        partes = [p for p in url.path.split('/') if p]
+        if partes in (['datasets'], ['metricas']):
+            if metodo != 'GET':
+                return _error(405, f'/{partes[0]} solo admite GET')
+            contenido = ({nombre: d.describir() for nombre, d in self.datasets.items()} if partes == ['datasets']
+                         else self.metricas.resumen())
+            return 200, TIPO_JSON, json.dumps(contenido).encode(), {}
+
+        if len(partes) != 2:
+            return _error(404, f'{url.path} no existe: usa /datasets, /metricas o /<dataset>/<operacion>')
+        nombre, operacion = partes
+        if nombre not in self.datasets:
+            return _error(404, f'{nombre} no es un dataset cargado: {list(self.datasets)}')
+        if operacion not in OPERACIONES:
+            return _error(404, f'{operacion} no es una operación: {list(OPERACIONES)}')
+        if metodo != 'POST':
+            return _error(405, 'las operaciones se piden con POST')
+
+        formato = urllib.parse.parse_qs(url.query).get('formato', ['arrow' if TIPO_ARROW in cabeceras.get('accept', '') else 'json'])[0]
+        if formato not in ('json','arrow') or (formato == 'arrow' and pa is None):
+            return _error(406, f'formato {formato} no disponible')
+        try:
+            parametros = json.loads(cuerpo or b'{}')
+        except json.JSONDecodeError as error:
+            return _error(400, f'el cuerpo no es un JSON válido: {error}')
+        if not isinstance(parametros, dict):
+            return _error(400, 'el cuerpo tiene que ser un objeto JSON con los parámetros de la operación')
+        return await self._ejecutar(self.datasets[nombre], operacion, parametros, formato)
+
+    async def _ejecutar(self, dataset, operacion, parametros, formato):
+        if self._pendientes >= self.max_concurrentes + self.max_cola:
+            self.metricas.rechazadas += 1
+            estado, tipo, datos, _ = _error(503, 'demasiadas consultas en curso, vuelve a intentarlo')
+            return estado, tipo, datos, {'Retry-After': '1'}
+
+        inicio = time.perf_counter()
+        self._pendientes += 1
+        try:
+            await self._semaforo.acquire()
+        except BaseException:
+            self._pendientes -= 1
+            raise
+        # El hilo no se puede interrumpir: aunque se responda 504, la consulta sigue ocupando su hueco
+        # (semáforo, en_curso y cola) hasta que termina de verdad, y así el 503 refleja el trabajo real
+        self.metricas.en_curso += 1
+        tarea = asyncio.get_running_loop().run_in_executor(self._hilos, self._calcular, dataset, operacion, parametros, formato)
+        tarea.add_done_callback(self._liberar)
+        error, acierto = True, False
+        try:
+            datos, acierto = await asyncio.wait_for(asyncio.shield(tarea), self.timeout)
+            error = False
+            estado, tipo, extra = 200, TIPO_ARROW if formato == 'arrow' else TIPO_JSON, {}
+        except asyncio.TimeoutError:
+            estado, tipo, datos, extra = _error(504, f'la consulta ha tardado más de {self.timeout} s')
+        except (KeyError, ValueError, TypeError, IndexError, SyntaxError, UndefinedVariableError) as problema:
+            estado, tipo, datos, extra = _error(400, f'{type(problema).__name__}: {problema}')
+        except Exception as problema:
+            estado, tipo, datos, extra = _error(500, f'{type(problema).__name__}: {problema}')
+
+        segundos = time.perf_counter() - inicio
+        self.metricas.anotar(operacion, segundos, error, acierto)
+        extra.update({'Server-Timing': f'total;dur={segundos * 1000:.3f}', 'X-Cache': 'hit' if acierto else 'miss'})
+        return estado, tipo, datos, extra
+
+    def _liberar(self, tarea):
+        # Se llama en el bucle de eventos cuando el hilo termina, haya llegado a tiempo o no
+        self._semaforo.release()
+        self.metricas.en_curso -= 1
+        self._pendientes -= 1
+        if not tarea.cancelled():
+            tarea.exception() # si nadie la esperaba (504), que asyncio no avise de una excepción sin recoger
+
+    def _calcular(self, dataset, operacion, parametros, formato):
+        # Se guardan directamente los bytes de la respuesta: un acierto no vuelve a codificar nada
+        parametros = dict(parametros)
+        columnas, limite = parametros.pop('columns_out', None), parametros.pop('limit', None)
+        clave = (operacion, json.dumps(parametros, sort_keys = True), columnas and tuple(columnas), limite, formato)
+        calcular = lambda df: codificar(_recortar(OPERACIONES[operacion](dataset, **parametros), columnas, limite), formato)
+        with dataset.cerrojo:
+            aciertos = dataset.cache.aciertos
+            datos = dataset.cache.obtener(clave, calcular)
+            return datos, dataset.cache.aciertos > aciertos
+
+
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser(description = 'Servidor local de consultas sobre los datasets del curso')
+    argumentos.add_argument('datasets', nargs = '*', help = f'datasets a cargar (por defecto todos: {list(CARGADORES)})')
+    argumentos.add_argument('--host', default = HOST)
+    argumentos.add_argument('--puerto', type = int, default = PUERTO)
+    argumentos.add_argument('--socket', help = 'ruta de un socket Unix en lugar de TCP')
+    argumentos.add_argument('--max-concurrentes', type = int, default = MAX_CONCURRENTES)
+    argumentos.add_argument('--max-cola', type = int, default = MAX_COLA)
+    argumentos = argumentos.parse_args()
+
+    servidor = ServidorConsultas(cargar_datasets(argumentos.datasets), argumentos.max_concurrentes, argumentos.max_cola)
+    asyncio.run(servidor.servir(argumentos.host, argumentos.puerto, argumentos.socket))
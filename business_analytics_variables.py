@@ -31,13 +31,14 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from business_analytics_carga import load_kiva
+
 # %matplotlib inline. Es para decirle cómo tiene que sacar los gráficos.
 # En este caso significa que los saque como gráficos estáticos integrados en el propio notebook (de tal forma que se guarde y distribuya más fácilmente).
 
 pd.options.display.min_rows = 6
 
-df = pd.read_csv('../00_DATASETS/DataSetKivaCreditScoring.csv', sep = ';', index_col = 'id',
-                parse_dates = ['Funded Date','Paid Date'])
+df = load_kiva('../00_DATASETS/DataSetKivaCreditScoring.csv')
 print(df)
 print(df.head())
 print(df.info())
@@ -320,6 +321,12 @@ print(df.groupby(['Country','Sector']).apply(mas_antiguas))
 
 print(df.groupby(['Country','Sector'])['Funded Date'].apply(lambda grupo: grupo.nsmallest(2)))
 
+# Aun así apply() recorre los grupos uno a uno. nsmallest_por_grupo() da el mismo resultado ordenando todos los grupos de una vez,
+# lo que se nota mucho cuando hay miles de grupos.
+
+# from business_analytics_agregados import nsmallest_por_grupo
+# print(nsmallest_por_grupo(df, ['Country','Sector'], 'Funded Date', 2))
+
 # TRUCO: Como vemos, cuando usamos más de una variable en el groupby nos genera un multiíndice.
 # Esto a veces puede ser molesto. Podemos evitarlo con el parámetro as_index = False, que nos pasará el multiíndice a columnas normales del dataframe.
 
@@ -43,25 +43,9 @@ print(df.info())
 
 # Otra manera de hacerlo manual es:
 
-# Define a function to clean column names
-def clean_column_names(df):
-    df.columns = df.columns.str.lower()  # make lower case
-    df.columns = df.columns.str.replace(' ', '_')  # replace spaces with underscores
-    df.columns = df.columns.str.replace('(', '')  # remove left parenthesis
-    df.columns = df.columns.str.replace(')', '')  # remove right parenthesis
-    df.columns = df.columns.str.replace('-', '')  # remove hyphen
-    df.columns = df.columns.str.replace('á', 'a')  # replace accented a with regular a
-    df.columns = df.columns.str.replace('é', 'e')  # replace accented e with regular e
-    df.columns = df.columns.str.replace('í', 'i')  # replace accented i with regular i
-    df.columns = df.columns.str.replace('ó', 'o')  # replace accented o with regular o
-    df.columns = df.columns.str.replace('ú', 'u')  # replace accented u with regular u
-    df.columns = df.columns.str.replace('%', 'percent')  # replace % with percent
-    df.columns = df.columns.str.replace('–', '')  # replace en dash with nothing
-    df.columns = df.columns.str.replace('ó', 'o')  # replace accented o with regular o
-    df.columns = df.columns.str.replace('í', 'i')  # replace accented i with regular i
-    df.columns = df.columns.str.replace('ó', 'o')  # replace accented o with regular o
-    df.columns = df.columns.str.replace('ú', 'u')  # replace accented u with regular u
-    return df
+# clean_column_names() está en business_analytics_carga: pasa a minúsculas, cambia espacios por _, quita paréntesis, guiones y tildes, y cambia % por percent.
+# Lo hace en una sola pasada y recuerda la traducción de cada cabecera, así que volver a cargar el mismo archivo no repite el trabajo.
+from business_analytics_carga import clean_column_names
 
 # Clean the column names
 df = clean_column_names(df)
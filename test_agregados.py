@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from business_analytics_agregados import describe_por_bloques, tabla_cruzada, tabla_dinamica
+
+
+@pytest.fixture
+def df():
+    # Como load_kiva(optimizar = True): importes en int32 y float32, y un cruce sin registros
+    aleatorio = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({'Sector': pd.Categorical(aleatorio.choice(['Food', 'Retail', 'Arts', 'Health'], n)),
+                       'Status': pd.Categorical(aleatorio.choice(['paid', 'defaulted', 'refunded'], n)),
+                       'Funded Amount': aleatorio.integers(25, 5000, n).astype('int32'),
+                       'Loan Amount': aleatorio.integers(0, 2**30, n).astype('int32'), # sus sumas no caben en int32
+                       'Paid Amount': aleatorio.normal(1000, 300, n).astype('float32'),
+                       'Lender Count': aleatorio.integers(0, 200, n).astype('uint8')})
+    df = df[~((df['Sector'] == 'Arts') & (df['Status'] == 'refunded'))].copy()
+    df.loc[df.index[:20], 'Paid Amount'] = np.nan
+    return df
+
+
+VALORES = ['Funded Amount', 'Loan Amount', 'Paid Amount', 'Lender Count',
+           ['Funded Amount', 'Paid Amount'], ['Funded Amount', 'Loan Amount', 'Lender Count']]
+
+
+@pytest.mark.parametrize('values', VALORES)
+@pytest.mark.parametrize('aggfunc', ['sum', 'mean', 'count', ['sum', 'count']])
+@pytest.mark.parametrize('fill_value', [None, 0])
+@pytest.mark.parametrize('margins', [False, True])
+def test_tabla_dinamica_como_pivot_table(df, values, aggfunc, fill_value, margins):
+    esperado = df.pivot_table(index = 'Sector', columns = 'Status', values = values, aggfunc = aggfunc,
+                              fill_value = fill_value, margins = margins, observed = True)
+    resultado = tabla_dinamica(df, 'Sector', 'Status', values, aggfunc, fill_value, margins)
+    pd.testing.assert_frame_equal(resultado, esperado, check_exact = False, check_index_type = False, check_column_type = False)
+
+
+@pytest.mark.parametrize('values', ['Funded Amount', 'Paid Amount', 'Lender Count'])
+@pytest.mark.parametrize('aggfunc', ['sum', 'mean', 'count'])
+@pytest.mark.parametrize('margins', [False, True])
+@pytest.mark.parametrize('normalize', [False, 'index', 'all'])
+def test_tabla_cruzada_como_crosstab(df, values, aggfunc, margins, normalize):
+    esperado = pd.crosstab(df['Sector'], df['Status'], df[values], aggfunc = aggfunc, margins = margins, normalize = normalize)
+    resultado = tabla_cruzada(df['Sector'], df['Status'], df[values], aggfunc, normalize, margins)
+    pd.testing.assert_frame_equal(resultado, esperado, check_exact = False, check_index_type = False, check_column_type = False)
+
+
+def test_describe_por_bloques(tmp_path):
+    aleatorio = np.random.default_rng(0)
+    n = 3000
+    df = pd.DataFrame({'Sector': aleatorio.choice(['Food', 'Retail', 'Arts'], n),
+                       'Loan Amount': aleatorio.integers(1, 80, n) * 25,
+                       'Paid Amount': aleatorio.normal(1000, 300, n)})
+    ruta = tmp_path / 'prestamos.csv'
+    df.to_csv(ruta, sep = ';', index = False)
+
+    esperado = df.groupby('Sector')['Loan Amount'].describe()
+    pd.testing.assert_frame_equal(describe_por_bloques(ruta, 'Sector', 'Loan Amount', chunksize = 500), esperado)
+
+    # Variable continua: los cuartiles no se guardan, el resto sí
+    with pytest.warns(UserWarning, match = 'cuartiles'):
+        resultado = describe_por_bloques(ruta, 'Sector', 'Paid Amount', chunksize = 500, max_frecuencias = 1000)
+    esperado = df.groupby('Sector')['Paid Amount'].describe()
+    assert resultado[['25%', '50%', '75%']].isna().all().all()
+    pd.testing.assert_frame_equal(resultado.drop(columns = ['25%', '50%', '75%']), esperado.drop(columns = ['25%', '50%', '75%']))
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import business_analytics_cache_consultas
+from business_analytics_cache_consultas import CacheResultados, cached_query, compilar_consulta
+
+
+@pytest.fixture
+def df():
+    aleatorio = np.random.default_rng(0)
+    n = 1000
+    return pd.DataFrame({'Country': aleatorio.choice(np.array(['Kenya', 'Uganda', 'Peru', None], dtype = object), n),
+                         'Sector': pd.Categorical(aleatorio.choice(['Food', 'Retail', 'Arts'], n)),
+                         'Loan Amount': aleatorio.choice([500, 1000, 1500, 2000], n).astype('float64')})
+
+
+CONSULTAS_LISTAS = ['Country == ["Kenya","Uganda"]',
+                    'Country != ["Kenya","Uganda"]',
+                    '["Kenya","Uganda"] == Country',
+                    '["Kenya","Uganda"] != Country',
+                    'Country == ("Kenya","Uganda")',
+                    'Sector == ["Food"] and `Loan Amount` == [500, 1000]',
+                    'Country == @paises',
+                    'Country != @paises',
+                    'Country == @pais',
+                    '`Loan Amount` > 600 & Sector != ["Arts"]']
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS_LISTAS)
+def test_igual_a_lista_como_df_query(df, consulta):
+    paises, pais = ['Kenya', 'Uganda'], 'Peru'
+    esperado = df.query(consulta, local_dict = {'paises': paises, 'pais': pais})
+    pd.testing.assert_frame_equal(cached_query(df, consulta, paises = paises, pais = pais), esperado)
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS_LISTAS)
+def test_filtro_arrow_con_listas(df, consulta, tmp_path):
+    # El filtro de Arrow puede dejar pasar filas de más, pero nunca dejar fuera las que cumplen la consulta
+    parametros = {'paises': ['Kenya', 'Uganda'], 'pais': 'Peru'}
+    ruta = tmp_path / 'datos.parquet'
+    df.to_parquet(ruta)
+    plan = compilar_consulta(consulta)
+    filtro = plan.filtro_arrow(pq.read_schema(ruta), parametros)
+    assert filtro is not None
+    leido = pd.read_parquet(ruta, filters = filtro)
+    assert len(leido) == len(df.query(consulta, local_dict = parametros)) # las listas se traducen enteras
+    esperado = df.query(consulta, local_dict = parametros)
+    pd.testing.assert_frame_equal(cached_query(leido, consulta, **parametros).reset_index(drop = True),
+                                  esperado.reset_index(drop = True))
+
+
+def test_cache_resultados_descarta_al_cambiar(df):
+    cache = CacheResultados(df)
+    media = lambda d: d['Loan Amount'].mean()
+    assert cache.obtener('media', media) == cache.obtener('media', media)
+    assert (cache.aciertos, cache.fallos) == (1, 1)
+    df.loc[0, 'Loan Amount'] = 1e6
+    assert cache.obtener('media', media) == df['Loan Amount'].mean()
+    assert cache.version == 1
+
+
+def test_cache_resultados_sin_copy_on_write_no_guarda(df, monkeypatch):
+    monkeypatch.setattr(business_analytics_cache_consultas, '_copy_on_write', lambda: False)
+    cache = CacheResultados(df)
+    media = lambda d: d['Loan Amount'].mean()
+    cache.obtener('media', media)
+    df.loc[0, 'Loan Amount'] = 1e6
+    assert cache.obtener('media', media) == df['Loan Amount'].mean()
+    assert (len(cache), cache.aciertos, cache.fallos) == (0, 0, 2)
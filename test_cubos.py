@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from business_analytics_cubos import Cubo
+
+
+def test_sumas_como_groupby():
+    aleatorio = np.random.default_rng(0)
+    n = 5000
+    df = pd.DataFrame({'Sector': aleatorio.choice(['Food', 'Retail', 'Arts'], n),
+                       'Status': aleatorio.choice(['paid', 'defaulted'], n),
+                       'Funded Amount': aleatorio.integers(25, 10000, n) * 25,
+                       'Loan Amount': aleatorio.normal(1000, 300, n)})
+    for metrica in ['Funded Amount', 'Loan Amount']:
+        cubo = Cubo(df.iloc[:3000], ['Sector', 'Status'], metrica, orden = 2).append(df.iloc[3000:])
+        tabla = cubo.tabla(['Sector', 'Status'], estadisticos = ['sum', 'var'])
+        esperado = df.groupby(['Sector', 'Status'])[metrica].agg(['sum', 'var'])
+        if metrica == 'Funded Amount':
+            pd.testing.assert_series_equal(tabla['sum'], esperado['sum'])
+        else:
+            pd.testing.assert_series_equal(tabla['sum'], esperado['sum'], rtol = 1e-12)
+        pd.testing.assert_series_equal(tabla['var'], esperado['var'], rtol = 1e-9)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from business_analytics_estilos import EstiloVectorizado
+
+
+VACIOS = [pd.DataFrame({'Funded Amount': pd.Series([], dtype = 'float64'), 'Lender Count': pd.Series([], dtype = 'int64')}),
+          pd.DataFrame(index = range(3)),
+          pd.DataFrame()]
+
+
+@pytest.mark.parametrize('df', VACIOS)
+@pytest.mark.parametrize('axis', [0, 1, None])
+def test_dataframe_vacio_sin_estilos(df, axis):
+    estilo = EstiloVectorizado(df).highlight_max(axis = axis).highlight_min(axis = axis).bar(axis = axis)
+    css = estilo.css()
+    assert css.shape == df.shape
+    assert '<table' in estilo.to_html()
+
+
+def test_extremos_y_barras():
+    df = pd.DataFrame({'a': [1.0, 3.0, None], 'b': [2, 2, 5]})
+    css = EstiloVectorizado(df).highlight_max(color = 'yellow').highlight_min(color = 'red').css()
+    assert css.loc[1, 'a'] == 'background-color: yellow' and css.loc[0, 'a'] == 'background-color: red'
+    assert css.loc[2, 'a'] == ''
+    assert css.loc[2, 'b'] == 'background-color: yellow' and css.loc[0, 'b'] == css.loc[1, 'b'] == 'background-color: red'
+
+
+def test_pagina_solo_con_su_css():
+    df = pd.DataFrame({'a': np.arange(5000, dtype = 'float64'), 'b': np.arange(5000) % 7})
+    estilo = EstiloVectorizado(df).highlight_max().bar()
+    clases, css = estilo._calcular()
+    pagina = estilo.to_html(0, 10, table_id = 'T')
+    reglas = [linea for linea in pagina.split('</style>')[0].splitlines() if linea.startswith('#T td.c')]
+    usadas = set(np.unique(clases[:10]).tolist()) - {-1}
+    assert len(reglas) == len(usadas) < len(css)
+    assert all(f'td.c{k} ' in ''.join(reglas) for k in usadas)
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import business_analytics_servidor
+from business_analytics_servidor import Dataset, ServidorConsultas
+
+
+@pytest.fixture
+def datasets():
+    aleatorio = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({'Country': pd.Categorical(aleatorio.choice(['Kenya', 'Uganda', 'Peru'], n)),
+                       'Sector': pd.Categorical(aleatorio.choice(['Food', 'Retail', 'Arts'], n)),
+                       'Funded Amount': aleatorio.integers(1, 80, n).astype('int32') * 25,
+                       'Loan Amount': aleatorio.integers(1, 80, n).astype('float32') * 25})
+    return {'kiva': Dataset(df)}
+
+
+@pytest.fixture
+def lenta(monkeypatch):
+    def _lenta(dataset, segundos):
+        time.sleep(segundos)
+        return {'segundos': segundos}
+    monkeypatch.setitem(business_analytics_servidor.OPERACIONES, 'lenta', _lenta)
+
+
+async def _pedir(socket, metodo, ruta, parametros = None):
+    lector, escritor = await asyncio.open_unix_connection(socket)
+    cuerpo = b'' if parametros is None else json.dumps(parametros).encode()
+    escritor.write(f'{metodo} {ruta} HTTP/1.1\r\nContent-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n'.encode() + cuerpo)
+    await escritor.drain()
+    respuesta = await lector.read()
+    escritor.close()
+    cabecera, _, datos = respuesta.partition(b'\r\n\r\n')
+    return int(cabecera.split()[1]), json.loads(datos) if datos else None
+
+
+def _con_servidor(servidor, socket, peticiones):
+    # Arranca el servidor en el socket Unix, lanza las peticiones a la vez y devuelve (estado, datos) de cada una
+    async def principal():
+        tarea = asyncio.create_task(servidor.servir(socket = socket))
+        while not os.path.exists(socket):
+            await asyncio.sleep(0.01)
+        try:
+            return await asyncio.gather(*(_pedir(socket, *peticion) for peticion in peticiones))
+        finally:
+            tarea.cancel()
+    return asyncio.run(principal())
+
+
+def test_respuestas(datasets, tmp_path):
+    socket = str(tmp_path / 'servidor.sock')
+    respuestas = _con_servidor(ServidorConsultas(datasets), socket, [
+        ('POST', '/kiva/groupby', {'by': 'Sector', 'funciones': ['count', 'mean']}),
+        ('POST', '/kiva/value_counts', {'column': 'Country', 'limit': 2}),
+        ('POST', '/kiva/value_counts', {'column': 'Country', 'columns_out': ['count']}),
+        ('POST', '/kiva/query', {'expr': '`Funded Amount` > @media'}),
+        ('POST', '/kiva/no_existe', {}),
+        ('POST', '/otro/query', {'expr': 'Sector == "Food"'})])
+    (estado, groupby), (estado_conteo, conteo), *errores = respuestas
+    assert estado == 200
+    assert groupby['columns'] == [['Funded Amount', 'count'], ['Funded Amount', 'mean'], ['Loan Amount', 'count'], ['Loan Amount', 'mean']]
+    assert estado_conteo == 200 and len(conteo['data']) == 2
+    assert [estado for estado, _ in errores] == [400, 400, 404, 404]
+
+
+def test_rechazadas_y_timeout(datasets, tmp_path, lenta):
+    socket = str(tmp_path / 'servidor.sock')
+    servidor = ServidorConsultas(datasets, max_concurrentes = 1, max_cola = 1, timeout = 0.3)
+    # Parámetros distintos para que la que espera en cola no salga de la caché
+    respuestas = _con_servidor(servidor, socket, [('POST', '/kiva/lenta', {'segundos': 0.6 + k / 100}) for k in range(3)])
+    assert sorted(estado for estado, _ in respuestas) == [503, 504, 504]
+    assert servidor.metricas.rechazadas == 1